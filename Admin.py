@@ -0,0 +1,200 @@
+import streamlit as st
+import pandas as pd
+from streamlit_option_menu import option_menu
+import Analytics
+import Archive
+import Changelog
+import Database
+import Jobs
+import Tracing
+import Queries
+import Replica
+import Writer
+
+
+def app():
+    if not Database.is_admin(st.session_state.get("username")):
+        st.error("This page is only available to administrators.")
+        return
+
+    st.subheader("Admin", divider='red')
+
+    selected = option_menu(
+        menu_title=None,
+        options=["Query Trace", "Named Queries", "Reruns", "Archive", "Change Log", "Advisers", "Analytics Export"],
+        icons=["speedometer2", "list-ol", "stopwatch", "archive", "journal-text", "people", "box-arrow-up-right"],
+        orientation="horizontal",
+    )
+
+    if selected == "Query Trace":
+        st.header("Query Trace")
+
+        col1, col2 = st.columns(2)
+        tracing_enabled = col1.toggle("Record queries", value=Tracing.enabled)
+        Tracing.enabled = tracing_enabled
+        if col2.button("Reset trace"):
+            Tracing.reset()
+
+        stats_df = pd.DataFrame(Tracing.query_stats())
+        if stats_df.empty:
+            st.info("No queries recorded yet. Browse the other pages and come back.")
+            return
+
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Statements", int(stats_df['Calls'].sum()))
+        col2.metric("Query shapes", len(stats_df))
+        col3.metric("Total time (ms)", round(stats_df['TotalMs'].sum(), 1))
+
+        # Query shapes repeated many times within a single page rerun
+        n_plus_one_df = stats_df[stats_df['NPlusOne']]
+        if not n_plus_one_df.empty:
+            st.subheader("Possible N+1 queries")
+            st.caption(f"Issued {Tracing.N_PLUS_ONE_THRESHOLD} or more times by the same function in one rerun.")
+            st.dataframe(n_plus_one_df[['Query', 'Callers', 'MaxPerRun', 'Calls', 'TotalMs']], hide_index=True)
+
+        st.subheader("Per query shape")
+        st.dataframe(stats_df, hide_index=True)
+
+        st.subheader("Recent statements")
+        st.dataframe(pd.DataFrame(Tracing.recent_queries()), hide_index=True)
+
+    elif selected == "Named Queries":
+        st.header("Named Queries")
+        st.caption("Calls through the Queries registry since server start, slowest in total first.")
+        if st.button("Reset counters"):
+            Queries.reset()
+
+        named_df = pd.DataFrame(Queries.stats())
+        if named_df.empty:
+            st.info("No named queries run yet.")
+        else:
+            st.dataframe(named_df, hide_index=True)
+
+        st.subheader("Write queue")
+        st.caption(f"Page writes committed by the writer thread in groups of up to {Writer.MAX_GROUP_SIZE}, "
+                   f"collected for {Writer.GROUP_COMMIT_MS:g} ms.")
+        writer_stats = Writer.stats()
+        columns = st.columns(len(writer_stats))
+        for column, (label, value) in zip(columns, writer_stats.items()):
+            column.metric(label, value)
+
+        st.subheader("Read replica")
+        st.caption("Copy of the database the dashboards and reports read from, see Replica.py.")
+        st.dataframe([Replica.status()], hide_index=True)
+
+    elif selected == "Reruns":
+        st.header("Page Reruns")
+
+        st.subheader("Rerun timing since server start")
+        rerun_df = pd.DataFrame(Tracing.rerun_stats())
+        if rerun_df.empty:
+            st.info("No page reruns recorded yet.")
+        else:
+            st.dataframe(rerun_df, hide_index=True)
+
+        st.subheader("Slow reruns")
+        st.caption(f"Reruns taking {Tracing.SLOW_RERUN_MS:.0f} ms or longer, newest first. "
+                   f"The log keeps the latest {Tracing.RERUN_LOG_ROWS} entries.")
+        slow_df = pd.DataFrame(Tracing.slow_reruns(Database.connect()))
+        if slow_df.empty:
+            st.info("No slow reruns logged.")
+        else:
+            st.dataframe(slow_df, hide_index=True)
+
+    elif selected == "Archive":
+        st.header("Archive")
+        st.caption(f"Students whose last academic record is {', '.join(Archive.CLOSED_STATUSES)} are moved with all "
+                   f"their records to {Archive.archive_path()}. The trends, the adviser report and grade slips "
+                   f"still include them.")
+
+        archive_status = Archive.status()
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Live students", archive_status["LiveStudents"])
+        col2.metric("Live course assignments", archive_status["LiveCourses"])
+        col3.metric("Archived students", archive_status["ArchivedStudents"])
+        col4.metric("Archived course assignments", archive_status["ArchivedCourses"])
+
+        before_year = st.number_input("Archive students closed before the academic year starting in",
+                                      min_value=1900, max_value=2100, step=1, value=Archive.default_before_year())
+        vacuum = st.checkbox("Shrink the database file afterwards (blocks data entry while it runs)")
+        col1, col2 = st.columns(2)
+        if col1.button("Preview"):
+            counts = Archive.run(int(before_year), dry_run=True)
+            st.dataframe([{"Table": table, "Rows to move": count} for table, count in counts.items()], hide_index=True)
+        if col2.button("Archive now", type="primary"):
+            job_id = Jobs.enqueue("archive", {"before_year": int(before_year), "vacuum": vacuum},
+                                  created_by=st.session_state.get("username"), max_attempts=1)
+            st.success(f"Archiving queued as job #{job_id}.")
+        Jobs.render_jobs(kind="archive", key="archive_jobs")
+
+    elif selected == "Change Log":
+        st.header("Change Log")
+        st.caption(f"Every insert, update and delete of the student records, kept for {Changelog.RETENTION_DAYS} days. "
+                   f"Updates show the changed columns as [old, new].")
+
+        st.subheader("Consumers")
+        consumers_df = pd.DataFrame(Changelog.status())
+        if consumers_df.empty:
+            st.info("No summary has read the change log yet.")
+        else:
+            st.dataframe(consumers_df, hide_index=True)
+
+        student_id = st.text_input("Student ID", placeholder="All students")
+        if student_id:
+            changes = Changelog.history(student_id.strip())
+        else:
+            changes = Changelog.changes(max(Changelog.latest() - 200, 0))[::-1]
+        changes_df = pd.DataFrame(changes)
+        if changes_df.empty:
+            st.info("No changes recorded.")
+        else:
+            changes_df["Changes"] = changes_df["Changes"].astype(str)
+            st.dataframe(changes_df, hide_index=True)
+
+    elif selected == "Advisers":
+        st.header("Adviser Assignments")
+        st.caption("The students each adviser sees in the student lists, directories and dashboards. "
+                   "Advisers can still switch to the department-wide view in the sidebar.")
+        st.dataframe(Queries.read_sql("adviser_student_counts", categorize=False), hide_index=True)
+
+        advisers = [row[0] for row in Queries.fetchall("adviser_names")]
+        selected_adviser = st.selectbox("Adviser", [""] + advisers)
+        if selected_adviser:
+            students = sorted(Queries.fetchall("student_names"), key=lambda student: student[1])
+            labels = {student_id: f"{name} ({student_id})" for student_id, name in students}
+            assigned = {row[0] for row in Queries.fetchall("adviser_student_ids", (selected_adviser,))} & labels.keys()
+            selected_ids = st.multiselect("Assigned students", options=list(labels),
+                                          default=[student_id for student_id in labels if student_id in assigned],
+                                          format_func=labels.get, key=f"assigned_{selected_adviser}")
+            if st.button("Save assignments"):
+                added = [student_id for student_id in selected_ids if student_id not in assigned]
+                removed = [student_id for student_id in assigned if student_id not in selected_ids]
+                statements = [("adviser_student_insert", (selected_adviser, student_id)) for student_id in added]
+                statements += [("adviser_student_delete", (selected_adviser, student_id)) for student_id in removed]
+                if statements:
+                    Writer.write_many(statements)
+                st.success(f"Saved: {len(added)} added, {len(removed)} removed.")
+
+    elif selected == "Analytics Export":
+        st.header("Analytics Export")
+        st.caption(f"Parquet files of the student records for analysis outside the app, in {Analytics.export_dir()}, "
+                   f"partitioned by academic year and program. Each export rewrites only the partitions of the "
+                   f"students changed since the last one.")
+
+        manifest = Analytics.read_manifest(Analytics.export_dir())
+        if manifest is None:
+            st.info("Not exported yet.")
+        else:
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Exported at", manifest["ExportedAt"])
+            col2.metric("Up to change", manifest["ChangeID"])
+            col3.metric("Changes since", Changelog.latest() - manifest["ChangeID"])
+            st.dataframe([{"Dataset": dataset, "Partitions written last time": count}
+                          for dataset, count in manifest["Partitions"].items()], hide_index=True)
+
+        full = st.checkbox("Rewrite every partition")
+        if st.button("Export now", type="primary"):
+            job_id = Jobs.enqueue("analytics_export", {"full": full},
+                                  created_by=st.session_state.get("username"), max_attempts=1)
+            st.success(f"Analytics export queued as job #{job_id}.")
+        Jobs.render_jobs(kind="analytics_export", key="analytics_jobs")
@@ -0,0 +1,316 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from urllib.parse import quote, unquote
+import Archive
+import Changelog
+import Database
+import Metrics  # noqa: F401  registers the term_gpa changelog consumer
+
+# Parquet snapshot of the student records for the institutional research team, so
+# their pandas/Arrow scripts read columnar files instead of querying the live
+# database. Each dataset is a hive partitioned directory,
+#
+#     <out>/courseassignment/AcademicYear=2023-2024/Program=BS Statistics/part-0.parquet
+#
+# (student by Program only), which pyarrow.dataset / pandas.read_parquet load with
+# the partition columns restored and filters on them skipping whole directories.
+# Archived students are included (the history_* views, see Archive.py); the term
+# GPAs come from the term_gpa summary table, so they cover the live students.
+#
+# Exports are incremental: _manifest.json in <out> keeps the ChangeID of the change
+# log (see Changelog.py) the files are current to, and the next run only rewrites the
+# partitions of the students changed since then. Without a manifest, after a change
+# of course units or when the log was pruned past the watermark everything is
+# rewritten. Runs as a job from the Admin page (see Jobs.JOB_KINDS) or from the
+# command line:
+#
+#     python Analytics.py --out analytics/
+#     python Analytics.py --full
+
+CONSUMER = "analytics_export"
+MANIFEST = "_manifest.json"
+PART_FILE = "part-0.parquet"
+# Hive's directory name for a NULL partition value, also pyarrow's default
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+# Columns with a type other than string in the Parquet files
+COLUMN_TYPES = {"RecordID": "int64", "EnrollID": "int64", "TermKey": "int64", "YearLevel": "int32",
+                "Units": "float64", "GPA": "float64", "CGPA": "float64"}
+
+# Dataset -> (query of the rows, TermKey expression of the academic year, or None
+# for a dataset partitioned by Program only). The queries select AcademicYear and
+# Program for the partition, they are not stored in the files. Contact details
+# of students and guardians are left out.
+DATASETS = {
+    "student": ("""
+        SELECT s.StudentID, s.Name, s.Sex, s.Gender, s.Religion, s.Region, s.Province, s.Municipality, s.Barangay,
+               s.Track, s.Program
+        FROM history_student s""", None),
+    "academicrecords": ("""
+        SELECT ar.RecordID, ar.StudentID, s.Program, ar.AcademicYear, ar.YearLevel, ar.Semester, ar.ScholasticStatus,
+               ar.ScholarshipStatus, ar.TermKey
+        FROM history_academicrecords ar
+        JOIN history_student s ON s.StudentID = ar.StudentID""", "ar.TermKey"),
+    "courseassignment": ("""
+        SELECT ca.EnrollID, ca.StudentID, s.Program, ca.AcademicYear, ca.YearLevel, ca.Semester, ca.CourseCode,
+               p.Units, ca.Grade, ca.FinalGrade, ca.GradeStatus, ca.TermKey
+        FROM history_courseassignment ca
+        JOIN history_student s ON s.StudentID = ca.StudentID
+        LEFT JOIN prospectus p ON p.CourseCode = ca.CourseCode""", "ca.TermKey"),
+    # The academic year of a term GPA is the latest one the student took courses of
+    # that year level and semester in
+    "term_gpa": ("""
+        SELECT g.StudentID, s.Program, t.AcademicYear, g.YearLevel, sc.Label AS Semester, g.GPA, g.CGPA
+        FROM term_gpa g
+        JOIN student s ON s.StudentID = g.StudentID
+        LEFT JOIN semestercode sc ON sc.Code = g.SemesterCode
+        LEFT JOIN term t ON t.TermKey = (
+            SELECT MAX(ca.TermKey) FROM courseassignment_base ca
+            WHERE ca.StudentID = g.StudentID AND ca.YearLevel = g.YearLevel AND ca.SemesterCode = g.SemesterCode)""",
+                 "t.TermKey"),
+}
+
+
+# <db>_analytics next to the live database unless STUDENTMONITOR_ANALYTICS_DIR says otherwise
+def export_dir():
+    return os.environ.get("STUDENTMONITOR_ANALYTICS_DIR") or os.path.splitext(Database.DB_PATH)[0] + "_analytics"
+
+
+def read_manifest(out):
+    try:
+        with open(os.path.join(out, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _partition_dir(out, dataset, key):
+    parts = [out, dataset]
+    if DATASETS[dataset][1] is not None:
+        year, program = key
+        parts.append("AcademicYear=" + (NULL_PARTITION if year is None else quote(year, safe=" ")))
+    else:
+        program, = key
+    parts.append("Program=" + quote(program, safe=" "))
+    return os.path.join(*parts)
+
+
+# Partition keys that have a file in out, so partitions that lost all rows are removed
+def _written_partitions(out, dataset):
+    keys = set()
+    root = os.path.join(out, dataset)
+    for path, _, files in os.walk(root):
+        if PART_FILE not in files:
+            continue
+        values = dict(part.split("=", 1) for part in os.path.relpath(path, root).split(os.sep))
+        program = unquote(values["Program"])
+        if DATASETS[dataset][1] is None:
+            keys.add((program,))
+        else:
+            year = values["AcademicYear"]
+            keys.add((None if year == NULL_PARTITION else unquote(year), program))
+    return keys
+
+
+def _current_partitions(conn, dataset):
+    query, term = DATASETS[dataset]
+    columns = "Program" if term is None else "AcademicYear, Program"
+    return set(conn.execute(f"SELECT DISTINCT {columns} FROM ({query})").fetchall())
+
+
+# Partitions that can hold rows of the given students, now or before the changes:
+# their academic years with their current and earlier programs
+def _student_partitions(conn, student_ids, changes):
+    programs = {}
+    years = {}
+    for change in changes:
+        old = change["Changes"] or {}
+        if change["Operation"] == "U":
+            old = {column: values[0] for column, values in old.items()}
+        student_id = change["StudentID"]
+        if change["TableName"] == "student" and old.get("Program"):
+            programs.setdefault(student_id, set()).add(old["Program"])
+        if old.get("TermKey") is not None:
+            row = conn.execute("SELECT AcademicYear FROM term WHERE TermKey = ?", (old["TermKey"],)).fetchone()
+            if row:
+                years.setdefault(student_id, set()).add(row[0])
+
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS analytics_students (StudentID TEXT PRIMARY KEY)")
+    conn.execute("DELETE FROM temp.analytics_students")
+    conn.executemany("INSERT OR IGNORE INTO temp.analytics_students (StudentID) VALUES (?)",
+                     [(student_id,) for student_id in student_ids])
+    selected = "StudentID IN (SELECT StudentID FROM temp.analytics_students)"
+    for student_id, program in conn.execute(f"SELECT StudentID, Program FROM history_student WHERE {selected}"):
+        programs.setdefault(student_id, set()).add(program)
+    for table in ("history_academicrecords", "history_courseassignment"):
+        for student_id, year in conn.execute(f"SELECT DISTINCT StudentID, AcademicYear FROM {table} WHERE {selected}"):
+            years.setdefault(student_id, set()).add(year)
+
+    student_keys = set()
+    term_keys = set()
+    for student_id, student_programs in programs.items():
+        student_keys.update((program,) for program in student_programs)
+        term_keys.update((year, program) for year in years.get(student_id, ()) for program in student_programs)
+    return student_keys, term_keys
+
+
+def _rows(conn, dataset, key):
+    query, term = DATASETS[dataset]
+    if term is None:
+        return conn.execute(query + " WHERE s.Program = ?", key)
+    year, program = key
+    if year is None:
+        return conn.execute(query + f" WHERE {term} IS NULL AND s.Program = ?", (program,))
+    row = conn.execute("SELECT MIN(TermKey) / 100 FROM term WHERE AcademicYear = ?", (year,)).fetchone()
+    first = row[0] * 100 if row and row[0] is not None else 0
+    # The academic year column too, spellings sharing a start year share TermKeys
+    return conn.execute(query + f" WHERE {term} BETWEEN ? AND ? AND AcademicYear = ? AND s.Program = ?",
+                        (first, first + 99, year, program))
+
+
+# Rewrites one partition file, or removes it when the partition has no rows left.
+# Returns the number of rows written.
+def _write_partition(conn, out, dataset, key):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    cur = _rows(conn, dataset, key)
+    names = [column[0] for column in cur.description]
+    rows = cur.fetchall()
+    directory = _partition_dir(out, dataset, key)
+    path = os.path.join(directory, PART_FILE)
+    if not rows:
+        if os.path.exists(path):
+            os.remove(path)
+        return 0
+
+    arrays = {}
+    for index, name in enumerate(names):
+        if name in ("AcademicYear", "Program"):
+            continue
+        values = [row[index] for row in rows]
+        kind = COLUMN_TYPES.get(name, "string")
+        if kind == "string":
+            values = [None if value is None else str(value) for value in values]
+        elif kind == "int32":
+            values = [None if value in (None, "") else int(value) for value in values]
+        arrays[name] = pa.array(values, type=getattr(pa, kind)())
+    os.makedirs(directory, exist_ok=True)
+    # Written next to the old file and swapped in, readers never see half a file
+    pq.write_table(pa.table(arrays), path + ".tmp")
+    os.replace(path + ".tmp", path)
+    return len(rows)
+
+
+# Brings the Parquet files in out up to date. Returns {dataset: partitions written}.
+def run(out=None, full=False, progress=None):
+    out = out or export_dir()
+    # term_gpa must include the latest grade changes
+    Changelog.run_consumers()
+    manifest = read_manifest(out)
+
+    conn = Database.open_connection()
+    try:
+        Archive.attach(conn)
+        conn.isolation_level = None
+        # One snapshot for every file of the export
+        conn.execute("BEGIN")
+        watermark = latest = Changelog.latest(conn)
+        if manifest is not None and not full:
+            watermark = manifest["ChangeID"]
+            first = conn.execute("SELECT MIN(ChangeID) FROM changelog").fetchone()[0]
+            # Log reset or pruned past the watermark, the changes in between are lost
+            full = watermark > latest or (first is not None and first > watermark + 1)
+        else:
+            full = True
+
+        plan = {}
+        if full:
+            for dataset in DATASETS:
+                plan[dataset] = _current_partitions(conn, dataset) | _written_partitions(out, dataset)
+        else:
+            changes = Changelog.changes(watermark, conn=conn)
+            if any(change["TableName"] == "prospectus_base" for change in changes):
+                # Units changed for every student taking the course
+                for dataset in DATASETS:
+                    plan[dataset] = _current_partitions(conn, dataset) | _written_partitions(out, dataset)
+            else:
+                student_ids = {change["StudentID"] for change in changes if change["StudentID"]}
+                student_keys, term_keys = _student_partitions(conn, student_ids, changes)
+                for dataset in DATASETS:
+                    plan[dataset] = student_keys if DATASETS[dataset][1] is None else term_keys
+
+        total = sum(len(keys) for keys in plan.values())
+        done = 0
+        counts = {}
+        for dataset, keys in plan.items():
+            counts[dataset] = 0
+            for key in sorted(keys, key=lambda key: tuple("" if value is None else value for value in key)):
+                _write_partition(conn, out, dataset, key)
+                counts[dataset] += 1
+                done += 1
+                if progress:
+                    progress(done, total)
+        conn.execute("ROLLBACK")
+
+        with open(os.path.join(out, MANIFEST) + ".tmp", "w") as f:
+            json.dump({"ChangeID": latest, "ExportedAt": time.strftime("%Y-%m-%d %H:%M:%S"), "Full": full,
+                       "Partitions": counts}, f, indent=2)
+        os.replace(os.path.join(out, MANIFEST) + ".tmp", os.path.join(out, MANIFEST))
+        # Listed with the change log consumers, which also keeps prune() from
+        # dropping changes this export has not read yet
+        conn.execute("INSERT INTO changelog_consumer (Name, Watermark, UpdatedAt) VALUES (?, ?, ?) "
+                     "ON CONFLICT (Name) DO UPDATE SET Watermark = excluded.Watermark, UpdatedAt = excluded.UpdatedAt",
+                     (CONSUMER, latest, time.strftime("%Y-%m-%d %H:%M:%S")))
+    finally:
+        conn.close()
+    return counts
+
+
+# Removes the export and its watermark, the next run writes everything again
+def reset(out=None):
+    out = out or export_dir()
+    shutil.rmtree(out, ignore_errors=True)
+    conn = Database.open_connection()
+    try:
+        conn.execute("DELETE FROM changelog_consumer WHERE Name = ?", (CONSUMER,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+# Job entry point, see Jobs.JOB_KINDS
+def analytics_job(job, full=False):
+    job.progress(0.02, "Reading the changes since the last export")
+
+    def progress(done, total):
+        job.progress(0.05 + 0.9 * done / total, f"Wrote {done} of {total} partitions")
+
+    os.makedirs(export_dir(), exist_ok=True)
+    run(full=full, progress=progress)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the student records as partitioned Parquet files.")
+    parser.add_argument("--out", help="export directory (default: next to the database)")
+    parser.add_argument("--full", action="store_true", help="rewrite every partition instead of the changed ones")
+    parser.add_argument("--db", help=f"database file (default: {Database.DB_PATH})")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        Database.DB_PATH = args.db
+    out = args.out or export_dir()
+    os.makedirs(out, exist_ok=True)
+    counts = run(out, full=args.full)
+    for dataset, count in counts.items():
+        print(f"{dataset:<18} {count:>6} partitions written", file=sys.stderr)
+    print(f"Exported to {out} up to change {read_manifest(out)['ChangeID']}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+import time
+import Database
+import Replica
+
+# Hot/cold split of the student records. A student whose latest academic record
+# closed them (CLOSED_STATUSES) in an academic year that started more than
+# RETENTION_YEARS ago is moved, with their academic records, course assignments and
+# promotions, to an archive database next to the live one. The archive holds only
+# those tables, the code and term tables and the coded views over them, created from
+# the live definitions without triggers (rows there are never edited, so there is no
+# changelog to keep). It gets the code and term rows of the live database before any
+# student rows, so moved rows keep their TermKeys and codes. The live database
+# then only holds the students the day-to-day pages work with and stays small
+# enough to stay in the page cache.
+#
+# Reports over past academic years (the rates on the Trends tab and in the adviser
+# report, the year list, grade slips) read the history_<table> views instead, the
+# union of both databases. attach() creates them on a connection; the read replica
+# connections (Replica.connect) always have them.
+#
+# Runs as a job from the Admin page (see Jobs.JOB_KINDS) or from the command line:
+#
+#     python Archive.py --dry-run
+#     python Archive.py --before-year 2022 --vacuum
+
+RETENTION_YEARS = int(os.environ.get("STUDENTMONITOR_ARCHIVE_AFTER_YEARS", "2"))
+CLOSED_STATUSES = ("Graduate", "Dropped", "Withdrawn")
+# Rows moved with an archived student, all keyed by StudentID
+STUDENT_TABLES = ("student", "academicrecords_base", "courseassignment_base", "promotion_base")
+# Tables and views that get a history_<name> view
+HISTORY_TABLES = STUDENT_TABLES + ("academicrecords", "courseassignment", "promotion")
+# Everything the archive file holds
+ARCHIVE_TABLES = tuple(Database.CODE_TABLES) + ("term",) + HISTORY_TABLES
+
+# Archive files that already have the current schema, checked once per process
+_ready = set()
+_ready_lock = threading.Lock()
+
+# Students whose latest academic record is closed and older than the cutoff TermKey
+_CLOSED_STUDENTS = f"""
+    SELECT ar.StudentID FROM main.academicrecords_base ar
+    WHERE ar.TermKey = (SELECT MAX(TermKey) FROM main.academicrecords_base WHERE StudentID = ar.StudentID)
+      AND ar.ScholasticStatus IN ({", ".join("?" * len(CLOSED_STATUSES))}) AND ar.TermKey < ?"""
+
+
+# Next to the live database unless STUDENTMONITOR_ARCHIVE_DB says otherwise.
+# Looked up on every call, scripts may point Database.DB_PATH elsewhere.
+def archive_path():
+    return os.environ.get("STUDENTMONITOR_ARCHIVE_DB") or os.path.splitext(Database.DB_PATH)[0] + ".archive.db"
+
+
+# Creates the tables, indexes and views of ARCHIVE_TABLES in the archive file as
+# source (a live or replica connection) defines them. Triggers, and the other tables
+# that earlier versions created with the whole live schema, are dropped.
+def _ensure_archive(source, path):
+    with _ready_lock:
+        if path in _ready:
+            return
+        names = ", ".join("?" * len(ARCHIVE_TABLES))
+        definitions = source.execute(
+            f"SELECT name, sql FROM main.sqlite_master WHERE tbl_name IN ({names}) AND type != 'trigger' "
+            f"AND sql IS NOT NULL ORDER BY type = 'view', type = 'index'", ARCHIVE_TABLES).fetchall()
+        conn = sqlite3.connect(path, factory=Database.TracingConnection)
+        try:
+            Database.apply_storage_profile(conn)
+            existing = conn.execute("SELECT type, name, tbl_name FROM sqlite_master").fetchall()
+            for kind, name, table in existing:
+                if kind == "trigger" or (kind in ("table", "view") and table not in ARCHIVE_TABLES
+                                         and not name.startswith("sqlite_")):
+                    conn.execute(f"DROP {kind.upper()} IF EXISTS {name}")
+            present = {name for _, name, _ in existing}
+            for name, sql in definitions:
+                if name not in present:
+                    conn.execute(sql)
+            conn.commit()
+        finally:
+            conn.close()
+        _ready.add(path)
+
+
+def _columns(conn, schema, table):
+    return [row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})").fetchall()]
+
+
+# Attaches the archive to conn as "archive" and creates the TEMP history_* views.
+# Does nothing if it is attached already. Must run outside a transaction.
+def attach(conn, path=None):
+    if any(row[1] == "archive" for row in conn.execute("PRAGMA database_list").fetchall()):
+        return conn
+    path = path or archive_path()
+    _ensure_archive(conn, path)
+    conn.execute("ATTACH DATABASE ? AS archive", (path,))
+    for table in HISTORY_TABLES:
+        # Named columns, a live table created by an older version may list them in another order
+        names = ", ".join(_columns(conn, "archive", table))
+        conn.execute(f"CREATE TEMP VIEW IF NOT EXISTS history_{table} AS "
+                     f"SELECT {names} FROM main.{table} UNION ALL SELECT {names} FROM archive.{table}")
+    return conn
+
+
+# First academic year that is kept in the live database by default
+def default_before_year():
+    return time.localtime().tm_year - RETENTION_YEARS
+
+
+# Moves the students closed before the academic year starting in before_year to the
+# archive, all in one transaction. Returns the number of rows per table. With
+# dry_run nothing is moved, the counts are what would be.
+def run(before_year=None, dry_run=False, vacuum=False):
+    if before_year is None:
+        before_year = default_before_year()
+    conn = Database.open_connection()
+    try:
+        attach(conn)
+        conn.isolation_level = None
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS archive_students (StudentID TEXT PRIMARY KEY)")
+        # Locks both databases, no page can write a row for a student being moved
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM temp.archive_students")
+            conn.execute("INSERT INTO temp.archive_students " + _CLOSED_STUDENTS, CLOSED_STATUSES + (before_year * 100,))
+            selected = "StudentID IN (SELECT StudentID FROM temp.archive_students)"
+            counts = {table: conn.execute(f"SELECT COUNT(*) FROM main.{table} WHERE {selected}").fetchone()[0]
+                      for table in STUDENT_TABLES}
+            if dry_run or not counts["student"]:
+                conn.execute("ROLLBACK")
+                return counts
+
+            for table in tuple(Database.CODE_TABLES) + ("term",):
+                names = ", ".join(_columns(conn, "archive", table))
+                conn.execute(f"INSERT OR IGNORE INTO archive.{table} ({names}) SELECT {names} FROM main.{table}")
+            for table in STUDENT_TABLES:
+                names = ", ".join(_columns(conn, "archive", table))
+                # OR REPLACE: rows left behind by an interrupted run are overwritten, not duplicated
+                conn.execute(f"INSERT OR REPLACE INTO archive.{table} ({names}) "
+                             f"SELECT {names} FROM main.{table} WHERE {selected}")
+                conn.execute(f"DELETE FROM main.{table} WHERE {selected}")
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        if vacuum:
+            # Give the freed pages back to the file system
+            conn.execute("VACUUM main")
+    finally:
+        conn.close()
+
+    if Replica.ENABLED:
+        # The replica still has the moved students, the history views would count them twice
+        Replica.refresh()
+    return counts
+
+
+# Students and course assignments in the live database and in the archive
+def status():
+    conn = Replica.connect()
+    result = {"Path": archive_path(), "RetentionYears": RETENTION_YEARS, "DefaultBeforeYear": default_before_year()}
+    for schema, label in (("main", "Live"), ("archive", "Archived")):
+        for table, name in (("student", "Students"), ("courseassignment_base", "Courses")):
+            result[f"{label}{name}"] = conn.execute(f"SELECT COUNT(*) FROM {schema}.{table}").fetchone()[0]
+    return result
+
+
+# Job entry point, see Jobs.JOB_KINDS
+def archive_job(job, before_year=None, vacuum=False):
+    job.progress(0.1, "Moving closed students to the archive")
+    run(before_year, vacuum=vacuum)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move graduated, dropped and withdrawn students to the archive database.")
+    parser.add_argument("--before-year", type=int,
+                        help=f"archive students closed before the academic year starting in this year "
+                             f"(default: this year minus {RETENTION_YEARS})")
+    parser.add_argument("--dry-run", action="store_true", help="only count the rows that would be moved")
+    parser.add_argument("--vacuum", action="store_true", help="shrink the live database file afterwards")
+    parser.add_argument("--db", help=f"database file (default: {Database.DB_PATH})")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        Database.DB_PATH = args.db
+    counts = run(args.before_year, dry_run=args.dry_run, vacuum=args.vacuum)
+    verb = "Would move" if args.dry_run else "Moved"
+    for table, count in counts.items():
+        print(f"{verb} {count} rows of {table} to {archive_path()}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
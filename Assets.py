@@ -0,0 +1,42 @@
+import hashlib
+import os
+import streamlit as st
+
+# Static files offered for download in the app. They are read once per version of
+# the file (the cache key includes its size and modification time) and handed to
+# st.download_button, which Streamlit serves from its media endpoint by URL instead
+# of inlining the bytes into the page like a base64 data: link would.
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Asset name -> (file name in the app directory, MIME type)
+ASSETS = {
+    "user_guide": ("User Guide.pdf", "application/pdf"),
+}
+
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def _load(path, size, mtime_ns):
+    with open(path, "rb") as f:
+        data = f.read()
+    return data, hashlib.sha256(data).hexdigest()
+
+
+# Returns (bytes, sha256 hex digest) of a registered asset
+def load(name):
+    file_name, _ = ASSETS[name]
+    path = os.path.join(APP_DIR, file_name)
+    stat = os.stat(path)
+    return _load(path, stat.st_size, stat.st_mtime_ns)
+
+
+def download_button(name, label, key=None):
+    file_name, mime = ASSETS[name]
+    try:
+        data, digest = load(name)
+    except OSError as e:
+        st.error(f"Error loading {file_name}: {str(e)}")
+        return False
+    # The content hash in the key gives a new widget when the file changes
+    return st.download_button(label=label, data=data, file_name=file_name, mime=mime,
+                              key=key or f"asset_{name}_{digest[:12]}")
@@ -0,0 +1,166 @@
+import json
+import os
+import threading
+import time
+import Database
+
+# Change data capture for the student records. Triggers on the tables in
+# Database.CHANGELOG_TABLES append one row per inserted, updated or deleted row to
+# the changelog table. Summary tables and caches register a consumer here and, on
+# each run_consumers(), get only the changes after their watermark (the last
+# ChangeID they applied), so keeping them current costs in proportion to the edits
+# instead of to the size of the database. A consumer without a watermark, or one
+# that fell more than REBUILD_AFTER changes behind, is rebuilt from scratch instead.
+# The log doubles as an audit trail of grade changes (history()), rows are kept for
+# RETENTION_DAYS once every consumer has applied them.
+
+RETENTION_DAYS = int(os.environ.get("STUDENTMONITOR_CHANGELOG_DAYS", "365"))
+REBUILD_AFTER = int(os.environ.get("STUDENTMONITOR_CHANGELOG_REBUILD_AFTER", "50000"))
+
+# name -> (apply(conn, changes), rebuild(conn), tables or None for all)
+_consumers = {}
+_run_lock = threading.Lock()
+
+
+def _now():
+    return time.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _change(row):
+    change_id, table, operation, row_key, student_id, changes, changed_at = row
+    return {"ChangeID": change_id, "TableName": table, "Operation": operation, "RowKey": row_key,
+            "StudentID": student_id, "Changes": json.loads(changes) if changes else None, "ChangedAt": changed_at}
+
+
+def latest(conn=None):
+    conn = conn or Database.connect()
+    return conn.execute("SELECT COALESCE(MAX(ChangeID), 0) FROM changelog").fetchone()[0]
+
+
+# Changes after the given ChangeID, oldest first, optionally of some tables only
+def changes(after=0, tables=None, limit=None, conn=None):
+    conn = conn or Database.connect()
+    query = "SELECT ChangeID, TableName, Operation, RowKey, StudentID, Changes, ChangedAt FROM changelog WHERE ChangeID > ?"
+    params = [after]
+    if tables:
+        query += f" AND TableName IN ({', '.join('?' * len(tables))})"
+        params += list(tables)
+    query += " ORDER BY ChangeID"
+    if limit:
+        query += " LIMIT ?"
+        params.append(limit)
+    return [_change(row) for row in conn.execute(query, params).fetchall()]
+
+
+def watermark(name, conn=None):
+    conn = conn or Database.connect()
+    row = conn.execute("SELECT Watermark FROM changelog_consumer WHERE Name = ?", (name,)).fetchone()
+    return row[0] if row else None
+
+
+# Registers a consumer for run_consumers(). apply(conn, changes) gets the changes of
+# the given tables after the consumer's watermark, rebuild(conn) recomputes
+# everything. Both run in the transaction that moves the watermark.
+def register(name, apply, rebuild, tables=None):
+    _consumers[name] = (apply, rebuild, tuple(tables) if tables else None)
+
+
+# Brings one consumer up to date. Returns the number of changes applied, or None
+# when it was rebuilt.
+def consume(conn, name):
+    apply, rebuild, tables = _consumers[name]
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        mark = watermark(name, conn)
+        last = latest(conn)
+        if mark is not None and mark == last:
+            conn.rollback()
+            return 0
+        # A watermark past the end means the log was reset
+        if mark is None or mark > last or last - mark > REBUILD_AFTER:
+            rebuild(conn)
+            applied = None
+        else:
+            batch = changes(mark, tables, conn=conn)
+            if batch:
+                apply(conn, batch)
+            applied = len(batch)
+        conn.execute("INSERT INTO changelog_consumer (Name, Watermark, UpdatedAt) VALUES (?, ?, ?) "
+                     "ON CONFLICT (Name) DO UPDATE SET Watermark = excluded.Watermark, UpdatedAt = excluded.UpdatedAt",
+                     (name, last, _now()))
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return applied
+
+
+# Brings every registered consumer up to date and drops log rows that are old and
+# applied by all of them. Called before each read replica refresh (see Replica.py).
+def run_consumers():
+    if not _consumers:
+        return
+    with _run_lock:
+        conn = Database.open_connection()
+        try:
+            for name in list(_consumers):
+                try:
+                    consume(conn, name)
+                except Exception as e:
+                    print(f"Error applying changes to {name}: {str(e)}")
+            prune(conn)
+        finally:
+            conn.close()
+
+
+# Deletes the log rows older than RETENTION_DAYS that every consumer has applied
+def prune(conn):
+    applied = conn.execute("SELECT MIN(Watermark) FROM changelog_consumer").fetchone()[0]
+    if applied is None:
+        applied = latest(conn)
+    # ChangeIDs grow with time, the old rows are the ones before the first recent one
+    conn.execute("""
+        DELETE FROM changelog WHERE ChangeID <= ? AND ChangeID < COALESCE(
+            (SELECT ChangeID FROM changelog WHERE ChangedAt >= datetime('now', 'localtime', ?) ORDER BY ChangeID LIMIT 1),
+            ? + 1)""", (applied, f"-{RETENTION_DAYS} days", applied))
+    conn.commit()
+
+
+# Audit trail: the recorded changes of one student, newest first. Grade codes in
+# course assignment changes are shown as their labels.
+def history(student_id, tables=None, limit=200, conn=None):
+    conn = conn or Database.connect()
+    query = ("SELECT ChangeID, TableName, Operation, RowKey, StudentID, Changes, ChangedAt FROM changelog "
+             "WHERE StudentID = ?")
+    params = [student_id]
+    if tables:
+        query += f" AND TableName IN ({', '.join('?' * len(tables))})"
+        params += list(tables)
+    query += " ORDER BY ChangeID DESC LIMIT ?"
+    params.append(limit)
+    labels = {}
+    for table in Database.CODE_TABLES:
+        labels[table] = dict(conn.execute(f"SELECT Code, Label FROM {table}").fetchall())
+    coded = {"GradeCode": "gradecode", "FinalGradeCode": "gradecode", "GradeStatusCode": "gradestatuscode",
+             "SemesterCode": "semestercode"}
+    result = []
+    for row in conn.execute(query, params).fetchall():
+        change = _change(row)
+        for column, values in (change["Changes"] or {}).items():
+            if column in coded:
+                table = labels[coded[column]]
+                if isinstance(values, list):
+                    change["Changes"][column] = [table.get(value, value) for value in values]
+                else:
+                    change["Changes"][column] = table.get(values, values)
+        result.append(change)
+    return result
+
+
+# Consumers and how far behind the log they are, for the Admin page
+def status(conn=None):
+    conn = conn or Database.connect()
+    last = latest(conn)
+    rows = conn.execute("SELECT Name, Watermark, UpdatedAt FROM changelog_consumer ORDER BY Name").fetchall()
+    return [{"Consumer": name, "Watermark": mark, "Behind": last - mark, "UpdatedAt": updated_at}
+            for name, mark, updated_at in rows]
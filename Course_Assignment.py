@@ -1,72 +1,38 @@
 import streamlit as st
-import calendar
+import sqlite3
 from datetime import datetime
 import pandas as pd
-import numpy as np
 from streamlit_option_menu import option_menu
-import pickle
-from pathlib import Path
-import streamlit_authenticator as stauth
-from streamlit_pandas_profiling import st_profile_report
-import sqlite3
+import Exports
+import Queries
+import Scope
+import Writer
 import plotly.express as px
-import re
-
 
-conn = sqlite3.connect('studentmonitor.db', check_same_thread=False)
-cur = conn.cursor()
 
 def app():
+    # False (nothing written) if the student already has the course in that term
     def addCourseAssignment(StudentID, CourseCode, Grade, FinalGrade, GradeStatus, AcademicYear, YearLevel, Semester):
-        cur.execute(
-            """CREATE TABLE IF NOT EXISTS courseassignment (
-                EnrollID INTEGER PRIMARY KEY AUTOINCREMENT,
-                StudentID TEXT NOT NULL,
-                CourseCode TEXT NOT NULL,
-                Grade TEXT,
-                FinalGrade TEXT,
-                GradeStatus TEXT,
-                AcademicYear TEXT,
-                YearLevel TEXT,
-                Semester TEXT,
-                FOREIGN KEY(StudentID) REFERENCES student(StudentID),
-                FOREIGN KEY(CourseCode) REFERENCES prospectus(CourseCode)
-            )"""
-        )
-
-        cur.execute(
-        "SELECT * FROM courseassignment WHERE StudentID = ? AND CourseCode = ? AND AcademicYear = ? AND YearLevel = ? AND Semester = ?",
-        (StudentID, CourseCode, AcademicYear, YearLevel, Semester)
-        )
-        if cur.fetchone() is None:
-            cur.execute(
-                "INSERT INTO courseassignment (StudentID, CourseCode, Grade, FinalGrade, GradeStatus, AcademicYear, YearLevel, Semester) VALUES (?,?,?,?,?,?,?,?)",
-                (StudentID, CourseCode, Grade, FinalGrade, GradeStatus, AcademicYear, YearLevel, Semester)
-            )
-            conn.commit()
-            return True
-        return False
-
-    # Function to delete course assignment
-    def deleteCourseAssignment(StudentID, CourseCode):
-        cur.execute("DELETE FROM courseassignment WHERE StudentID = ? AND CourseCode = ?", (StudentID, CourseCode))
-        conn.commit()
-
-    # Function to update course assignment
-    def updateCourseAssignment(StudentID, CourseCode, YearLevel, Semester):
-        cur.execute(
-            """UPDATE courseassignment 
-            SET YearLevel = ?,Semester = ?
-            WHERE StudentID = ? AND CourseCode = ?""",
-            (YearLevel, Semester, StudentID, CourseCode)
-        )
-        conn.commit()
+        return Writer.write(
+            "course_assignment_insert",
+            (StudentID, CourseCode, Grade, FinalGrade, GradeStatus, AcademicYear, YearLevel, Semester)
+        ) > 0
+
+    # Assignments are changed by EnrollID, so only the selected attempt of a retaken course is touched
+    def deleteCourseAssignment(EnrollID):
+        Writer.write("course_assignment_delete", (int(EnrollID),))
+
+    # Function to update course assignment, False if the student already has the course in that semester
+    def updateCourseAssignment(EnrollID, YearLevel, Semester):
+        try:
+            Writer.write("course_assignment_set_term", (Semester, YearLevel, int(EnrollID)))
+        except sqlite3.IntegrityError:
+            return False
+        return True
 
     # Function to fetch courses based on selected YearLevel and Semester
     def fetch_courses(selected_year, selected_semester):
-        cur.execute("SELECT CourseCode, CourseDesc FROM prospectus WHERE YearLevel = ? AND Semester = ?", 
-                    (selected_year, selected_semester))
-        courses = cur.fetchall()
+        courses = Queries.fetchall("prospectus_courses_of_term", (selected_year, selected_semester))
         course_descriptions = {course[0]: course[1] for course in courses}
         return course_descriptions
 
@@ -82,8 +48,7 @@ def app():
     
 
     # Fetching student IDs and names
-    cur.execute("SELECT StudentID, Name FROM student")
-    students = cur.fetchall()
+    students = Scope.fetchall("student_names")
     # Sort students by name
     students.sort(key=lambda student: student[1])
 
@@ -99,8 +64,7 @@ def app():
     school_year = [f"{current_year-3}-{current_year-2}",f"{current_year-2}-{current_year-1}",f"{current_year-1}-{current_year}", f"{current_year}-{current_year+1}", f"{current_year+1}-{current_year+2}"]
 
     # Fetch all courses from the prospectus table
-    cur.execute("SELECT CourseCode, CourseDesc FROM prospectus")
-    all_courses = cur.fetchall()
+    all_courses = Queries.fetchall("prospectus_courses")
     all_courses_codes = [course[0] for course in all_courses]
     all_course_descriptions = {course[0]: course[1] for course in all_courses}
     
@@ -124,10 +88,7 @@ def app():
 
         if sub_selected == "Assign Course":
             st.header("Assign Course")
-            course = pd.read_sql_query(
-                "SELECT p.CourseCode, p.CourseDesc, p.YearLevel, p.Semester "
-                "FROM prospectus p", conn)
-            
+
             col1, col2 = st.columns(2)
             selected_year = col1.selectbox("Select Year Level:", year_levels, key="year")
             selected_semester = col2.selectbox("Select Semester:", semesters, key="sem")
@@ -165,8 +126,7 @@ def app():
                     for selected_course_code in selected_course_codes:
                     
                         # Check for prerequisites and corequisites
-                        cur.execute("SELECT Prerequisite, Corequisite FROM requisite WHERE CourseCode = ?", (selected_course_code,))
-                        requisite = cur.fetchone()
+                        requisite = Queries.fetchone("requisite_of_course", (selected_course_code,))
                         prereq_met = True
                         coreq_met = True
 
@@ -177,11 +137,7 @@ def app():
                             if prereq:
                                 prereq_courses = prereq.split(', ')
                                 for prereq_course in prereq_courses:
-                                    cur.execute(
-                                        "SELECT * FROM courseassignment WHERE StudentID = ? AND CourseCode = ? ",
-                                        (selected_student_id, prereq_course)
-                                    )
-                                    if cur.fetchone() is None:
+                                    if Queries.fetchone("course_taken", (selected_student_id, prereq_course)) is None:
                                         prereq_met = False
                                         course_desc = course_descriptions[prereq_course]
                                         error_messages.append(f"Prerequisite '{course_desc}' not taken.")
@@ -209,19 +165,13 @@ def app():
 
         elif sub_selected == "Manage Assignments":
             st.header("Manage Course Assignments")
-            assignments = pd.read_sql_query(
-                "SELECT ca.StudentID, ca.CourseCode, ca.Semester, ca.YearLevel, ca.AcademicYear "
-                "FROM courseassignment ca "
-                "ORDER BY ca.YearLevel DESC, ca.Semester DESC", conn)
+            assignments = Scope.read_sql("course_assignments")
 
             # Fetch course descriptions
-            courses = pd.read_sql_query(
-                "SELECT p.CourseCode, p.CourseDesc "
-                "FROM prospectus p", conn)
+            courses = Queries.read_sql("prospectus_courses", categorize=False)
             
             # Create a mapping from CourseCode to CourseDescription
             course_mapping = dict(zip(courses['CourseCode'], courses['CourseDesc']))
-            inverse_course_mapping = {v: k for k, v in course_mapping.items()}
 
             selected_student_name = st.selectbox("Select Student:", sorted_names)
             if selected_student_name:
@@ -238,8 +188,10 @@ def app():
                 # Map course codes to course descriptions for the select box
                 student_assignments['CourseDesc'] = student_assignments['CourseCode'].map(course_mapping)
                 
-                selected_course_update = st.selectbox("Select Course Assigned:", student_assignments['CourseDesc'].unique())
-                selected_course_code = inverse_course_mapping[selected_course_update]
+                # One entry per attempt, a retaken course is listed once for every term it was taken
+                attempt_labels = {row.EnrollID: f"{row.CourseDesc} ({row.AcademicYear}, {row.Semester})"
+                                  for row in student_assignments.itertuples()}
+                selected_enroll_id = st.selectbox("Select Course Assigned:", list(attempt_labels), format_func=attempt_labels.get)
 
                 st.subheader("Update and Delete Course Assignment")
                 with st.form("Update and Delete Course Assignment", clear_on_submit=True):
@@ -247,7 +199,9 @@ def app():
                     col1, col2 = st.columns(2)
                     
                     # Retrieve semester and school year from the selected assignment
-                    selected_assignment = student_assignments[student_assignments['CourseCode'] == selected_course_code].iloc[0]
+                    selected_assignment = student_assignments[student_assignments['EnrollID'] == selected_enroll_id].iloc[0]
+                    selected_course_code = selected_assignment['CourseCode']
+                    selected_course_update = selected_assignment['CourseDesc']
                     selected_semester_update = selected_assignment['Semester']
                     selected_year_update = selected_assignment['YearLevel']
 
@@ -262,9 +216,11 @@ def app():
                         update = st.form_submit_button("Update")
                         if update:
                             if all([selected_student_id, selected_course_code, selected_year_update, selected_semester_update]):
-                                updateCourseAssignment(selected_student_id, selected_course_code, selected_year_update, selected_semester_update)
-                                st.session_state.operation_success = "Data updated successfully."
-                                st.experimental_rerun()
+                                if updateCourseAssignment(selected_enroll_id, selected_year_update, selected_semester_update):
+                                    st.session_state.operation_success = "Data updated successfully."
+                                    st.experimental_rerun()
+                                else:
+                                    st.warning("The student already has this course in that semester.")
                             else:
                                 st.warning("Please fill out all required fields.")
                                 st.experimental_rerun()
@@ -277,7 +233,7 @@ def app():
                                 def confirm_deletioncourse_dialog():
                                     st.write(f"Are you sure you want to delete this course assignment? {selected_student_id} - {selected_course_update}")
                                     if st.button("Yes"):
-                                        deleteCourseAssignment(selected_student_id, selected_course_code)
+                                        deleteCourseAssignment(selected_enroll_id)
                                         st.session_state.operation_success = "Course Assignment deleted successfully."
                                         st.experimental_dialog()
                                         st.experimental_rerun()
@@ -304,19 +260,11 @@ def app():
             st.write(f"Selected Student: {selected_student_name}")
 
             # Calculate fixed_total_units from the sum of units in the prospectus table
-            fixed_total_units_df = pd.read_sql_query(
-                "SELECT SUM(Units) as TotalUnits FROM prospectus", 
-                conn
-            )
+            fixed_total_units_df = Queries.read_sql("prospectus_total_units", categorize=False)
             fixed_total_units = fixed_total_units_df['TotalUnits'].iloc[0]
 
-            total_units_df = pd.read_sql_query(
-                "SELECT ca.StudentID, ca.CourseCode, p.CourseDesc, p.Units "
-                "FROM courseassignment ca "
-                "JOIN prospectus p ON ca.CourseCode = p.CourseCode "
-                "WHERE ca.StudentID = ?",  # Only count courses for the selected student
-                conn, params=(selected_student_id,)
-            )
+            # Only count courses for the selected student
+            total_units_df = Queries.read_sql("course_units_of_student", (selected_student_id,), categorize=False)
             if not total_units_df.empty:
                 total_units = total_units_df['Units'].sum()
                 # Data for the pie chart
@@ -335,14 +283,7 @@ def app():
             else:
                 st.warning("No course assignments found for the selected student.")
 
-            df = pd.read_sql_query(
-                "SELECT ca.StudentID, ca.CourseCode, p.CourseDesc, ca.Semester, ca.YearLevel, p.Units "
-                "FROM courseassignment ca "
-                "JOIN prospectus p ON ca.CourseCode = p.CourseCode "
-                "WHERE ca.StudentID = ? "
-                "ORDER BY ca.YearLevel DESC, ca.Semester DESC", 
-                conn, params=(selected_student_id,)
-            )
+            df = Queries.read_sql("course_directory_of_student", (selected_student_id,))
 
             if not df.empty:
                 for year in year_levels:
@@ -354,21 +295,13 @@ def app():
                             display_df = filtered_df.drop(columns=['StudentID', 'YearLevel', 'Semester'])
                             st.dataframe(display_df)
         else:
+            Exports.render("course_directory", key="course_directory_export")
+
             # Query to get counts of students per course
-            count_df = pd.read_sql_query(
-                "SELECT AcademicYear, Semester, CourseCode, COUNT(*) as Count "
-                "FROM courseassignment "
-                "WHERE AcademicYear IS NOT NULL "
-                "GROUP BY AcademicYear, Semester, CourseCode", 
-                conn
-            )
+            count_df = Scope.read_sql("course_assignment_counts", categorize=False)
 
             # Query to get total number of students
-            total_students = pd.read_sql_query(
-                "SELECT COUNT(DISTINCT StudentID) as TotalStudents "
-                "FROM courseassignment", 
-                conn
-            )['TotalStudents'].iloc[0]
+            total_students = Scope.fetchone("course_assignment_students")[0]
 
             # Get unique combinations of AcademicYear and Semester
             unique_combinations = count_df[['AcademicYear', 'Semester']].drop_duplicates()
@@ -382,13 +315,8 @@ def app():
                                     (count_df['Semester'] == semester)]
                 
                 # Query to get counts of students who have not taken each course
-                not_taken_df = pd.read_sql_query(
-                    f"SELECT CourseCode, {total_students} - COUNT(*) as NotTaken "
-                    "FROM courseassignment "
-                    f"WHERE AcademicYear = '{acad_year}' AND Semester = '{semester}' "
-                    "GROUP BY CourseCode", 
-                    conn
-                )
+                not_taken_df = Scope.read_sql("course_not_taken_of_term", (total_students, acad_year, semester),
+                                              categorize=False)
 
                 # Merge with filtered_df to include NotTaken counts
                 merged_df = pd.merge(filtered_df, not_taken_df, on='CourseCode', how='left')
@@ -0,0 +1,733 @@
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+import time
+import Tracing
+
+# Shared database connection for all pages.
+# Cursors created from it are traced (see Tracing.py) so slow or repeated
+# queries can be found from the admin page.
+
+DB_PATH = os.environ.get("STUDENTMONITOR_DB", "studentmonitor.db")
+
+# Admin rights are the IsAdmin flag of the adviser row, granted with
+# "python Database.py --grant-admin <username>". The usernames listed here cannot be
+# registered from the login screen, and accounts with these names that existed
+# before the flag was added got it then (they were the admins until that version).
+ADMIN_USERS = [name.strip() for name in os.environ.get("STUDENTMONITOR_ADMINS", "admin").split(",") if name.strip()]
+
+# Prepared statements kept per connection (sqlite3 defaults to 128). Room for every
+# entry of Queries.QUERIES plus the Metrics, Jobs and Tracing statements.
+STATEMENT_CACHE_SIZE = int(os.environ.get("STUDENTMONITOR_STATEMENT_CACHE", "256"))
+
+# Storage settings applied to every connection when it opens, picked with
+# STUDENTMONITOR_STORAGE. "wal": readers and the writer no longer block each other
+# and a commit appends to the WAL file without syncing the database (checkpoints
+# do that), with a bigger page cache and memory-mapped reads. "default": SQLite's
+# own rollback journal settings. See tools/bench_storage.py for the difference
+# under concurrent sessions.
+BUSY_TIMEOUT_MS = int(os.environ.get("STUDENTMONITOR_BUSY_TIMEOUT_MS", "5000"))
+STORAGE_PROFILES = {
+    "wal": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        # Negative cache_size is in KiB
+        "cache_size": -int(os.environ.get("STUDENTMONITOR_CACHE_KB", "32768")),
+        "mmap_size": int(os.environ.get("STUDENTMONITOR_MMAP_MB", "256")) * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": BUSY_TIMEOUT_MS,
+    },
+    "default": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "cache_size": -2000,
+        "mmap_size": 0,
+        "temp_store": "DEFAULT",
+        "busy_timeout": BUSY_TIMEOUT_MS,
+    },
+}
+STORAGE_PROFILE = os.environ.get("STUDENTMONITOR_STORAGE", "wal")
+
+# Bumped whenever migrate() has something new to do, stored in PRAGMA user_version
+SCHEMA_VERSION = 3
+
+# Choices offered by the pages, in display order
+SEMESTERS = ["1st Sem", "2nd Sem", "Summer"]
+YEAR_LEVELS = ["1", "2", "3", "4"]
+GRADES = ["1.00", "1.25", "1.50", "1.75", "2.00", "2.25", "2.50", "2.75", "3.00", "5.00", "INC", "INPROG", "P", "F", "DRP", "W"]
+GRADE_STATUSES = ["Passed", "Failed", "To be Determined", "Dropped", "Withdrawn", "Dropout"]
+
+# Lookup tables for the repeated text values. The labels above get codes 1..n in
+# that order, any other label gets the next free code the first time it is written.
+CODE_TABLES = {
+    "semestercode": SEMESTERS,
+    "gradecode": GRADES,
+    "gradestatuscode": GRADE_STATUSES,
+}
+
+# courseassignment, academicrecords, prospectus and promotion are views over *_base
+# tables that store the lookup codes, an INTEGER YearLevel and a TermKey. The views
+# keep the original column names, order and text values, and INSTEAD OF triggers
+# turn writes to them into writes to the base table, so pages can keep using the old
+# table names.
+# Column kinds: None = stored as is, "text" = INTEGER shown as TEXT, "term" = the
+# AcademicYear of the row's TermKey (see the term table), else the lookup table
+# whose Label is shown (stored as <column>Code). Views with a "term" column also get
+# TermKey as their last column, for sorting by term.
+CODED_TABLES = {
+    "academicrecords": ("academicrecords_base", "RecordID", [
+        ("RecordID", None), ("StudentID", None), ("ScholasticStatus", None), ("ScholarshipStatus", None),
+        ("AcademicYear", "term"), ("YearLevel", None), ("Semester", "semestercode"),
+    ]),
+    "prospectus": ("prospectus_base", "CourseCode", [
+        ("CourseCode", None), ("CourseDesc", None), ("Units", None), ("Semester", "semestercode"),
+        ("YearLevel", "text"), ("Classification", None),
+    ]),
+    "courseassignment": ("courseassignment_base", "EnrollID", [
+        ("EnrollID", None), ("StudentID", None), ("CourseCode", None), ("Grade", "gradecode"),
+        ("FinalGrade", "gradecode"), ("GradeStatus", "gradestatuscode"), ("AcademicYear", "term"),
+        ("YearLevel", "text"), ("Semester", "semestercode"),
+    ]),
+    "promotion": ("promotion_base", "PromotionID", [
+        ("StudentID", None), ("AcademicYear", "term"), ("Semester", "semestercode"), ("PromotionStatus", None),
+        ("PromotionID", None),
+    ]),
+}
+
+# Natural key of each coded table in view columns, backed by a UNIQUE constraint on
+# the base table (the write paths in Queries upsert on it). When an older file has
+# duplicates migrate() keeps the newest row of each key and moves the others to a
+# migration_dropped_<table> table, where they can be checked and copied back by hand.
+NATURAL_KEYS = {
+    "academicrecords": ("StudentID", "AcademicYear", "Semester"),
+    "prospectus": ("CourseCode",),
+    # One row per attempt, a retake is the same course in a later term
+    "courseassignment": ("StudentID", "CourseCode", "AcademicYear", "Semester"),
+    "promotion": ("StudentID", "AcademicYear", "Semester"),
+}
+
+# Tables whose writes are recorded in the changelog table (see Changelog.py):
+# table -> (column identifying the row, StudentID column or None). The triggers sit on
+# the base tables, so writes through the views and straight to the base tables are
+# both recorded.
+CHANGELOG_TABLES = {
+    "student": ("StudentID", "StudentID"),
+    "academicrecords_base": ("RecordID", "StudentID"),
+    "courseassignment_base": ("EnrollID", "StudentID"),
+    "prospectus_base": ("CourseCode", None),
+    "requisite": ("CourseCode", None),
+    "promotion_base": ("PromotionID", "StudentID"),
+}
+
+# TermKey of an academic year and semester: the start year of the academic year
+# times 100 plus the semester code, e.g. 202302 for 2023-2024 2nd Sem, so sorting by
+# TermKey is chronological and "up to an academic year" is a range. Spellings with
+# the same start year share a term (the first one written is shown). Academic years
+# that do not start with a four digit year get small made up years (1, 2, ...) in
+# order of first use, which sort before the real ones.
+def term_key_sql(academic_year, semester_code):
+    return (
+        f"CASE WHEN {academic_year} IS NULL THEN NULL "
+        f"WHEN {academic_year} GLOB '[0-9][0-9][0-9][0-9]*' "
+        f"THEN CAST(substr({academic_year}, 1, 4) AS INTEGER) * 100 + {semester_code} "
+        f"ELSE COALESCE((SELECT TermKey / 100 FROM term WHERE AcademicYear = {academic_year} LIMIT 1), "
+        f"(SELECT COUNT(DISTINCT AcademicYear) + 1 FROM term WHERE TermKey < 100000)) * 100 + {semester_code} END"
+    )
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS adviser (
+    UserName TEXT NOT NULL,
+    Password TEXT NOT NULL,
+    Random_authenticator TEXT NOT NULL,
+    IsAdmin INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY(UserName)
+    )""",
+    """CREATE TABLE IF NOT EXISTS student (
+    StudentID TEXT NOT NULL UNIQUE,
+    Name TEXT NOT NULL,
+    BirthDate TEXT NOT NULL,
+    Sex TEXT NOT NULL,
+    Gender TEXT NOT NULL,
+    Religion TEXT NOT NULL,
+    Region TEXT NOT NULL,
+    Province TEXT NOT NULL,
+    Municipality TEXT NOT NULL,
+    Barangay TEXT NOT NULL,
+    Track TEXT NOT NULL,
+    Program TEXT NOT NULL,
+    ContactNumber TEXT NOT NULL,
+    PGName TEXT NOT NULL,
+    PGNumber TEXT NOT NULL,
+    PRIMARY KEY(StudentID)
+    )""",
+    """CREATE TABLE IF NOT EXISTS semestercode (
+    Code INTEGER PRIMARY KEY,
+    Label TEXT NOT NULL UNIQUE
+    )""",
+    """CREATE TABLE IF NOT EXISTS gradecode (
+    Code INTEGER PRIMARY KEY,
+    Label TEXT NOT NULL UNIQUE
+    )""",
+    """CREATE TABLE IF NOT EXISTS gradestatuscode (
+    Code INTEGER PRIMARY KEY,
+    Label TEXT NOT NULL UNIQUE
+    )""",
+    # One row per academic year and semester that was ever written, see term_key_sql()
+    """CREATE TABLE IF NOT EXISTS term (
+    TermKey INTEGER PRIMARY KEY,
+    AcademicYear TEXT NOT NULL,
+    SemesterCode INTEGER NOT NULL REFERENCES semestercode(Code)
+    )""",
+    """CREATE TABLE IF NOT EXISTS academicrecords_base (
+    RecordID INTEGER PRIMARY KEY AUTOINCREMENT,
+    StudentID TEXT NOT NULL,
+    ScholasticStatus TEXT NOT NULL,
+    ScholarshipStatus TEXT,
+    TermKey INTEGER NOT NULL REFERENCES term(TermKey),
+    YearLevel INTEGER NOT NULL,
+    SemesterCode INTEGER NOT NULL REFERENCES semestercode(Code),
+    UNIQUE(StudentID, TermKey),
+    FOREIGN KEY(StudentID) REFERENCES student(StudentID)
+    )""",
+    """CREATE TABLE IF NOT EXISTS promotion_base (
+    PromotionID INTEGER PRIMARY KEY AUTOINCREMENT,
+    StudentID INTEGER,
+    TermKey INTEGER REFERENCES term(TermKey),
+    SemesterCode INTEGER REFERENCES semestercode(Code),
+    PromotionStatus TEXT,
+    UNIQUE(StudentID, TermKey)
+    )""",
+    """CREATE TABLE IF NOT EXISTS prospectus_base (
+    CourseCode TEXT NOT NULL UNIQUE,
+    CourseDesc TEXT NOT NULL,
+    Units INTEGER NOT NULL,
+    SemesterCode INTEGER NOT NULL REFERENCES semestercode(Code),
+    YearLevel INTEGER NOT NULL,
+    Classification TEXT NOT NULL,
+    PRIMARY KEY(CourseCode)
+    )""",
+    """CREATE TABLE IF NOT EXISTS requisite (
+    CourseCode TEXT,
+    Corequisite TEXT,
+    Prerequisite TEXT,
+    FOREIGN KEY(CourseCode) REFERENCES prospectus(CourseCode)
+    )""",
+    """CREATE TABLE IF NOT EXISTS courseassignment_base (
+    EnrollID INTEGER PRIMARY KEY AUTOINCREMENT,
+    StudentID TEXT NOT NULL,
+    CourseCode TEXT NOT NULL,
+    GradeCode INTEGER REFERENCES gradecode(Code),
+    FinalGradeCode INTEGER REFERENCES gradecode(Code),
+    GradeStatusCode INTEGER REFERENCES gradestatuscode(Code),
+    TermKey INTEGER REFERENCES term(TermKey),
+    YearLevel INTEGER,
+    SemesterCode INTEGER REFERENCES semestercode(Code),
+    UNIQUE(StudentID, CourseCode, TermKey),
+    FOREIGN KEY(StudentID) REFERENCES student(StudentID),
+    FOREIGN KEY(CourseCode) REFERENCES prospectus_base(CourseCode)
+    )""",
+    # Per student and per term lookups (GPA, counts, awardees)
+    "CREATE INDEX IF NOT EXISTS idx_courseassignment_student_term ON courseassignment_base (StudentID, YearLevel, SemesterCode)",
+    # Covers the per course status counts of a term (Metrics.course_status_counts), it
+    # replaces the (YearLevel, SemesterCode) index of earlier versions
+    "DROP INDEX IF EXISTS idx_courseassignment_term",
+    "CREATE INDEX IF NOT EXISTS idx_courseassignment_term_course ON courseassignment_base (YearLevel, SemesterCode, CourseCode, GradeStatusCode)",
+    "CREATE INDEX IF NOT EXISTS idx_academicrecords_term ON academicrecords_base (YearLevel, SemesterCode)",
+    "CREATE INDEX IF NOT EXISTS idx_prospectus_term ON prospectus_base (YearLevel, SemesterCode)",
+    # One requisite row per course, replaces the plain index of earlier versions
+    "DROP INDEX IF EXISTS idx_requisite_course",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_requisite_coursecode ON requisite (CourseCode)",
+    # Academic year filters (Home rates) as TermKey ranges
+    "CREATE INDEX IF NOT EXISTS idx_term_academicyear ON term (AcademicYear)",
+    "CREATE INDEX IF NOT EXISTS idx_academicrecords_termkey ON academicrecords_base (TermKey)",
+    "CREATE INDEX IF NOT EXISTS idx_courseassignment_termkey ON courseassignment_base (TermKey)",
+    "CREATE INDEX IF NOT EXISTS idx_promotion_termkey ON promotion_base (TermKey)",
+    # Students each adviser works with (Admin page), the pages start their student
+    # lists from an adviser's key range (see Queries.scoped)
+    """CREATE TABLE IF NOT EXISTS adviser_student (
+    UserName TEXT NOT NULL REFERENCES adviser(UserName),
+    StudentID TEXT NOT NULL REFERENCES student(StudentID),
+    PRIMARY KEY(UserName, StudentID)
+    )""",
+    # One row per write to a CHANGELOG_TABLES table. Operation is I, U or D. Changes
+    # is NULL for an insert, {column: [old, new]} of the changed columns for an
+    # update and the whole old row for a delete.
+    """CREATE TABLE IF NOT EXISTS changelog (
+    ChangeID INTEGER PRIMARY KEY AUTOINCREMENT,
+    TableName TEXT NOT NULL,
+    Operation TEXT NOT NULL,
+    RowKey TEXT,
+    StudentID TEXT,
+    Changes TEXT,
+    ChangedAt TEXT NOT NULL DEFAULT (datetime('now', 'localtime'))
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_changelog_row ON changelog (TableName, RowKey)",
+    "CREATE INDEX IF NOT EXISTS idx_changelog_student ON changelog (StudentID)",
+    # Last change each consumer of the changelog has applied
+    """CREATE TABLE IF NOT EXISTS changelog_consumer (
+    Name TEXT PRIMARY KEY,
+    Watermark INTEGER NOT NULL,
+    UpdatedAt TEXT NOT NULL
+    )""",
+    # GPA and CGPA of every student and term with course assignments, kept up to date
+    # from the changelog by Metrics.apply_term_gpa_changes
+    """CREATE TABLE IF NOT EXISTS term_gpa (
+    StudentID TEXT NOT NULL,
+    YearLevel INTEGER NOT NULL,
+    SemesterCode INTEGER NOT NULL,
+    GPA REAL,
+    CGPA REAL,
+    PRIMARY KEY(StudentID, YearLevel, SemesterCode)
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_term_gpa_term ON term_gpa (YearLevel, SemesterCode)",
+    # Page reruns slower than Tracing.SLOW_RERUN_MS, newest RERUN_LOG_ROWS kept
+    """CREATE TABLE IF NOT EXISTS rerunlog (
+    LogID INTEGER PRIMARY KEY AUTOINCREMENT,
+    LoggedAt TEXT NOT NULL,
+    UserName TEXT,
+    Page TEXT NOT NULL,
+    DurationMs REAL NOT NULL,
+    QueryCount INTEGER NOT NULL,
+    QueryMs REAL NOT NULL,
+    Sections TEXT,
+    WidgetState TEXT,
+    Error TEXT
+    )""",
+    # Background jobs (see Jobs.py). Result holds the bytes a job returned, ResultPath
+    # the file of a job that returned a file.
+    """CREATE TABLE IF NOT EXISTS jobs (
+    JobID INTEGER PRIMARY KEY AUTOINCREMENT,
+    Kind TEXT NOT NULL,
+    Params TEXT NOT NULL,
+    Status TEXT NOT NULL,
+    Progress REAL NOT NULL DEFAULT 0,
+    Message TEXT,
+    Attempts INTEGER NOT NULL DEFAULT 0,
+    MaxAttempts INTEGER NOT NULL DEFAULT 3,
+    NotBefore REAL NOT NULL DEFAULT 0,
+    CancelRequested INTEGER NOT NULL DEFAULT 0,
+    CreatedBy TEXT,
+    CreatedAt TEXT NOT NULL,
+    StartedAt TEXT,
+    FinishedAt TEXT,
+    Error TEXT,
+    ResultName TEXT,
+    ResultMime TEXT,
+    Result BLOB,
+    ResultPath TEXT
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (Status, NotBefore)",
+    "CREATE INDEX IF NOT EXISTS idx_jobs_createdby ON jobs (CreatedBy, JobID)",
+]
+
+# Columns added to a table after it was first created, for the files that have the
+# older table: (table, column, definition)
+ADDED_COLUMNS = [
+    ("adviser", "IsAdmin", "INTEGER NOT NULL DEFAULT 0"),
+    ("jobs", "ResultPath", "TEXT"),
+]
+
+_connection = None
+_connection_lock = threading.Lock()
+# Database files whose schema init_schema() checked in this process
+_schema_ready = set()
+_schema_lock = threading.Lock()
+
+
+class TracingCursor(sqlite3.Cursor):
+    _trace = None
+
+    def _finish(self, sql, start):
+        self._trace = Tracing.record(sql, time.perf_counter() - start)
+        # rowcount is only meaningful for INSERT/UPDATE/DELETE, SELECT rows are counted on fetch
+        if self._trace is not None and self.rowcount > 0:
+            self._trace.rows = self.rowcount
+
+    def _fetched(self, start, rows):
+        if self._trace is not None:
+            self._trace.elapsed += time.perf_counter() - start
+            self._trace.rows += rows
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._finish(sql, start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._finish(sql, start)
+
+    def executescript(self, sql_script):
+        start = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            self._finish(sql_script, start)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(start, 0 if row is None else 1)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(start, len(rows))
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(start, len(rows))
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        row = super().__next__()
+        self._fetched(start, 1)
+        return row
+
+
+class TracingConnection(sqlite3.Connection):
+    def cursor(self, factory=TracingCursor):
+        return super().cursor(factory)
+
+    # sqlite3's own Connection.execute shortcuts bypass cursor(), route them through it
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+def _coded_view_sql(view, base, key, columns):
+    selects = []
+    joins = []
+    for number, (column, kind) in enumerate(columns):
+        if kind is None:
+            selects.append(f"b.{column}")
+        elif kind == "text":
+            selects.append(f"CAST(b.{column} AS TEXT) AS {column}")
+        elif kind == "term":
+            selects.append(f"t.AcademicYear AS {column}")
+            joins.append("LEFT JOIN term t ON t.TermKey = b.TermKey")
+        else:
+            selects.append(f"l{number}.Label AS {column}")
+            joins.append(f"LEFT JOIN {kind} l{number} ON l{number}.Code = b.{column}Code")
+    has_term = any(kind == "term" for _, kind in columns)
+    if has_term:
+        selects.append("b.TermKey")
+    statements = [f"CREATE VIEW {view} AS SELECT {', '.join(selects)} FROM {base} b {' '.join(joins)}"]
+
+    # New labels get a code first, then the row is written with the codes looked up
+    add_labels = "".join(
+        f"INSERT OR IGNORE INTO {kind} (Label) SELECT NEW.{column} WHERE NEW.{column} IS NOT NULL; "
+        for column, kind in columns if kind not in (None, "text", "term")
+    )
+    semester_code = "(SELECT Code FROM semestercode WHERE Label = NEW.Semester)"
+    term_key = term_key_sql("NEW.AcademicYear", semester_code)
+    if has_term:
+        add_labels += (f"INSERT OR IGNORE INTO term (TermKey, AcademicYear, SemesterCode) "
+                       f"SELECT {term_key}, NEW.AcademicYear, {semester_code} "
+                       f"WHERE NEW.AcademicYear IS NOT NULL AND {semester_code} IS NOT NULL; ")
+    base_columns = []
+    values = []
+    for column, kind in columns:
+        if kind in (None, "text"):
+            base_columns.append(column)
+            values.append(f"NEW.{column}")
+        elif kind == "term":
+            base_columns.append("TermKey")
+            values.append(term_key)
+        else:
+            base_columns.append(f"{column}Code")
+            values.append(f"(SELECT Code FROM {kind} WHERE Label = NEW.{column})")
+    statements.append(
+        f"CREATE TRIGGER {view}_insert INSTEAD OF INSERT ON {view} BEGIN {add_labels}"
+        f"INSERT INTO {base} ({', '.join(base_columns)}) VALUES ({', '.join(values)}); END"
+    )
+    assignments = ", ".join(f"{name} = {value}" for name, value in zip(base_columns, values))
+    statements.append(
+        f"CREATE TRIGGER {view}_update INSTEAD OF UPDATE ON {view} BEGIN {add_labels}"
+        f"UPDATE {base} SET {assignments} WHERE {key} = OLD.{key}; END"
+    )
+    statements.append(
+        f"CREATE TRIGGER {view}_delete INSTEAD OF DELETE ON {view} BEGIN "
+        f"DELETE FROM {base} WHERE {key} = OLD.{key}; END"
+    )
+    if has_term:
+        # Writes straight to the base table (the upserts in Queries) only have a
+        # TermKey. A term that has no row yet gets the spelling of another semester
+        # of the same academic year, or "2023-2024" if there is none.
+        start = "NEW.TermKey / 100 * 100"
+        add_term = (f"INSERT OR IGNORE INTO term (TermKey, AcademicYear, SemesterCode) SELECT NEW.TermKey, "
+                    f"COALESCE((SELECT AcademicYear FROM term WHERE TermKey BETWEEN {start} AND {start} + 99 LIMIT 1), "
+                    f"(NEW.TermKey / 100) || '-' || (NEW.TermKey / 100 + 1)), NEW.TermKey % 100; ")
+        statements.append(f"CREATE TRIGGER {base}_term_insert AFTER INSERT ON {base} "
+                          f"WHEN NEW.TermKey IS NOT NULL BEGIN {add_term}END")
+        statements.append(f"CREATE TRIGGER {base}_term_update AFTER UPDATE OF TermKey ON {base} "
+                          f"WHEN NEW.TermKey IS NOT NULL BEGIN {add_term}END")
+    return statements
+
+
+# AFTER INSERT/UPDATE/DELETE triggers writing one changelog row per changed row.
+# Updates that change nothing (a grade saved again as it was) are not recorded.
+def _changelog_sql(conn, table, key, student):
+    columns = [row[1] for row in conn.execute(f"PRAGMA main.table_info({table})").fetchall()]
+    student_new = f"NEW.{student}" if student else "NULL"
+    student_old = f"OLD.{student}" if student else "NULL"
+    changed = " OR ".join(f"OLD.{column} IS NOT NEW.{column}" for column in columns)
+    diff = " UNION ALL ".join(
+        f"SELECT '{column}' AS Name, OLD.{column} AS Old, NEW.{column} AS New WHERE OLD.{column} IS NOT NEW.{column}"
+        for column in columns
+    )
+    old_row = ", ".join(f"'{column}', OLD.{column}" for column in columns)
+    insert = "INSERT INTO changelog (TableName, Operation, RowKey, StudentID, Changes) VALUES"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {table}_changelog_insert AFTER INSERT ON {table} BEGIN "
+        f"{insert} ('{table}', 'I', NEW.{key}, {student_new}, NULL); END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_changelog_update AFTER UPDATE ON {table} WHEN {changed} BEGIN "
+        f"{insert} ('{table}', 'U', NEW.{key}, {student_new}, "
+        f"(SELECT json_group_object(Name, json_array(Old, New)) FROM ({diff}))); END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_changelog_delete AFTER DELETE ON {table} BEGIN "
+        f"{insert} ('{table}', 'D', OLD.{key}, {student_old}, json_object({old_row})); END",
+    ]
+
+
+def _object_type(conn, name):
+    row = conn.execute("SELECT type FROM sqlite_master WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else None
+
+
+# Deletes all but the newest row of each key. Rows with a NULL key column are never
+# duplicates of each other (as in a UNIQUE constraint) and are kept. Academic years
+# are compared by start year, like their TermKey.
+def _drop_duplicates(conn, table, key, name):
+    columns = []
+    for column in key:
+        if column == "AcademicYear":
+            column = ("CASE WHEN AcademicYear GLOB '[0-9][0-9][0-9][0-9]*' "
+                      "THEN substr(AcademicYear, 1, 4) ELSE AcademicYear END")
+        columns.append(column)
+    not_null = " AND ".join(f"{column} IS NOT NULL" for column in key)
+    dropped = (f"{not_null} AND rowid NOT IN "
+               f"(SELECT MAX(rowid) FROM {table} GROUP BY {', '.join(columns)})")
+    count = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE {dropped}").fetchone()[0]
+    if not count:
+        return 0
+    # A table left by an earlier migration is added to, in the columns both have
+    conn.execute(f"CREATE TABLE IF NOT EXISTS main.migration_dropped_{name} AS SELECT * FROM {table} WHERE 0")
+    kept = {row[1] for row in conn.execute(f"PRAGMA main.table_info(migration_dropped_{name})")}
+    names = ", ".join(row[1] for row in conn.execute("SELECT * FROM pragma_table_info(?, ?)", _split_name(table))
+                      if row[1] in kept)
+    conn.execute(f"INSERT INTO main.migration_dropped_{name} ({names}) SELECT {names} FROM {table} WHERE {dropped}")
+    conn.execute(f"DELETE FROM {table} WHERE {dropped}")
+    print(f"Migration: moved {count} duplicate {name} rows to migration_dropped_{name}")
+    return count
+
+
+def _split_name(table):
+    schema, _, name = table.rpartition(".")
+    return name, schema or "main"
+
+
+def migrate(conn):
+    # Runs once per SCHEMA_VERSION bump. BEGIN IMMEDIATE plus the second version
+    # check keep two processes starting at the same time from migrating twice.
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        return
+    conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            conn.rollback()
+            return
+
+        # The rows of the coded tables are saved as the pages see them (the old views,
+        # or the plain text tables of a version 0 file), the base tables are rebuilt
+        # in the current layout, and the rows are written back through the new views,
+        # whose triggers do the conversion. The code and term tables are kept.
+        saved = []
+        for view, (base, key, columns) in CODED_TABLES.items():
+            object_type = _object_type(conn, view)
+            if object_type is not None:
+                conn.execute(f"CREATE TEMP TABLE migrate_{view} AS SELECT * FROM {view}")
+                _drop_duplicates(conn, f"temp.migrate_{view}", NATURAL_KEYS[view], view)
+                saved.append(view)
+            if object_type == "table":
+                conn.execute(f"DROP TABLE {view}")
+            conn.execute(f"DROP VIEW IF EXISTS {view}")
+            for action in ("insert", "update", "delete"):
+                conn.execute(f"DROP TRIGGER IF EXISTS {view}_{action}")
+            conn.execute(f"DROP TABLE IF EXISTS {base}")
+
+        if _object_type(conn, "requisite") == "table":
+            _drop_duplicates(conn, "requisite", ("CourseCode",), "requisite")
+
+        for statement in SCHEMA:
+            conn.execute(statement)
+        for table, labels in CODE_TABLES.items():
+            conn.executemany(f"INSERT OR IGNORE INTO {table} (Code, Label) VALUES (?, ?)",
+                             [(number, label) for number, label in enumerate(labels, 1)])
+        for view, (base, key, columns) in CODED_TABLES.items():
+            for statement in _coded_view_sql(view, base, key, columns):
+                conn.execute(statement)
+
+        for view in saved:
+            present = {row[1] for row in conn.execute(f"PRAGMA temp.table_info(migrate_{view})")}
+            names = ", ".join(column for column, _ in CODED_TABLES[view][2] if column in present)
+            conn.execute(f"INSERT INTO {view} ({names}) SELECT {names} FROM temp.migrate_{view}")
+            conn.execute(f"DROP TABLE temp.migrate_{view}")
+        if saved:
+            # The rows were written back before the changelog triggers exist and have
+            # new ids, every consumer of the changelog starts over
+            conn.execute("DELETE FROM changelog_consumer")
+
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    if saved:
+        # Give the pages of the dropped tables back to the file system
+        conn.execute("VACUUM")
+
+
+def _add_columns(conn):
+    for table, column, definition in ADDED_COLUMNS:
+        if column in [row[1] for row in conn.execute(f"PRAGMA main.table_info({table})").fetchall()]:
+            continue
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        if (table, column) == ("adviser", "IsAdmin"):
+            # The accounts named in ADMIN_USERS were the admins until the flag
+            conn.executemany("UPDATE adviser SET IsAdmin = 1 WHERE UserName = ?", [(name,) for name in ADMIN_USERS])
+
+
+def init_schema(conn):
+    # migrate() builds the tables of a new or older file, after that this only
+    # creates tables that are missing
+    migrate(conn)
+    for statement in SCHEMA:
+        conn.execute(statement)
+    _add_columns(conn)
+    for table, (key, student) in CHANGELOG_TABLES.items():
+        for statement in _changelog_sql(conn, table, key, student):
+            conn.execute(statement)
+    conn.commit()
+
+
+# init_schema() once per process and file, connections opened after that skip it
+def _ensure_schema(conn, path):
+    with _schema_lock:
+        if path not in _schema_ready:
+            init_schema(conn)
+            _schema_ready.add(path)
+
+
+# Must run outside a transaction, journal_mode cannot change inside one
+def apply_storage_profile(conn, profile=None):
+    for pragma, value in STORAGE_PROFILES[profile or STORAGE_PROFILE].items():
+        conn.execute(f"PRAGMA {pragma} = {value}")
+
+
+_codes = {}
+
+
+# First and last possible TermKey of an academic year, for filtering the *_base
+# tables by academic year with a range on TermKey
+def academic_year_terms(academic_year):
+    row = connect().execute("SELECT TermKey / 100 FROM term WHERE AcademicYear = ? LIMIT 1", (academic_year,)).fetchone()
+    if row is not None:
+        year = row[0]
+    elif academic_year and academic_year[:4].isdigit():
+        year = int(academic_year[:4])
+    else:
+        # Never written, so no row can match
+        return 0, -1
+    return year * 100, year * 100 + 99
+
+
+# Code of a label in one of the CODE_TABLES, None if it was never written
+def code(table, label):
+    key = (table, label)
+    if key not in _codes:
+        row = connect().execute(f"SELECT Code FROM {table} WHERE Label = ?", (label,)).fetchone()
+        if row is None:
+            return None
+        # Codes never change once assigned, so they can be cached for the life of the process
+        _codes[key] = row[0]
+    return _codes[key]
+
+
+def connect():
+    # Opened lazily on first use so importing a page module does not touch the database
+    global _connection
+    with _connection_lock:
+        if _connection is None:
+            _connection = sqlite3.connect(DB_PATH, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE,
+                                          factory=TracingConnection)
+            apply_storage_profile(_connection)
+            _ensure_schema(_connection, DB_PATH)
+    return _connection
+
+
+def open_connection():
+    # A separate connection for background threads (job workers) that should not
+    # share transactions with the page connection
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE,
+                           factory=TracingConnection)
+    apply_storage_profile(conn)
+    # Workers can wait longer for the write lock than a page rerun should
+    conn.execute("PRAGMA busy_timeout = 30000")
+    _ensure_schema(conn, DB_PATH)
+    return conn
+
+
+def is_admin(username):
+    if not username:
+        return False
+    row = connect().execute("SELECT IsAdmin FROM adviser WHERE UserName = ?", (username,)).fetchone()
+    return bool(row and row[0])
+
+
+# Grants or revokes the admin flag of an existing account. Returns False if there is
+# no such account.
+def set_admin(username, admin=True, conn=None):
+    conn = conn or connect()
+    cur = conn.execute("UPDATE adviser SET IsAdmin = ? WHERE UserName = ?", (int(admin), username))
+    conn.commit()
+    return cur.rowcount == 1
+
+
+def main(argv=None):
+    global DB_PATH
+    parser = argparse.ArgumentParser(description="Grant or revoke access to the Admin page.")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--grant-admin", metavar="USERNAME", help="give an existing account the Admin page")
+    group.add_argument("--revoke-admin", metavar="USERNAME", help="take the Admin page away from an account")
+    parser.add_argument("--db", help=f"database file (default: {DB_PATH})")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        DB_PATH = args.db
+    username = args.grant_admin or args.revoke_admin
+    if not set_admin(username, admin=bool(args.grant_admin)):
+        print(f"Error: no account named {username}", file=sys.stderr)
+        return 1
+    print(f"{'Granted' if args.grant_admin else 'Revoked'} admin rights of {username}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+import argparse
+import csv
+import io
+import sys
+import tempfile
+import time
+import streamlit as st
+import Database
+import Jobs
+import Queries
+import Scope
+
+# CSV and XLSX exports of the Student Directory, Course Directory and the grade
+# records. Rows are read from the cursor BATCH_ROWS at a time and written straight
+# into the file, a csv writer or a write-only openpyxl workbook (which keeps the
+# rows in a temporary file until it is saved), so exporting every grade of the
+# department takes the same memory as exporting one adviser's students. The
+# queries are the export_* entries in Queries.py, ordered by an index so SQLite
+# does not sort the whole result either.
+#
+# Runs as a job (see Jobs.JOB_KINDS), the finished file is kept on disk as the job
+# result and the download is served from it, or from the command line:
+#
+#     python Exports.py grades --format xlsx --out grades.xlsx
+
+BATCH_ROWS = 2000
+
+# Export name -> (title, named query, scoped to the adviser's students with Queries.scoped)
+EXPORTS = {
+    "student_directory": ("Student Directory", "export_student_directory"),
+    "course_directory": ("Course Directory", "export_course_directory"),
+    "grades": ("Grade Records", "export_grades"),
+}
+
+# Format -> MIME type
+FORMATS = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def file_name(export_name, file_format, adviser=None):
+    parts = [export_name, adviser or "department", time.strftime("%Y%m%d")]
+    return "_".join(parts) + "." + file_format
+
+
+def _query(export_name, adviser=None):
+    name, params = Queries.scoped(EXPORTS[export_name][1], (), adviser)
+    return Queries.sql(name), params
+
+
+def _batches(cur):
+    while True:
+        rows = cur.fetchmany(BATCH_ROWS)
+        if not rows:
+            return
+        yield rows
+
+
+def write_csv(cur, out, progress=None):
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="")
+    writer = csv.writer(text)
+    writer.writerow([column[0] for column in cur.description])
+    written = 0
+    for rows in _batches(cur):
+        writer.writerows(rows)
+        written += len(rows)
+        if progress:
+            progress(written)
+    text.flush()
+    # Leaves out open for the caller
+    text.detach()
+    return written
+
+
+def write_xlsx(cur, out, title, progress=None):
+    # Imported here, only the XLSX export needs openpyxl
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title)
+    sheet.append([column[0] for column in cur.description])
+    written = 0
+    for rows in _batches(cur):
+        for row in rows:
+            sheet.append(row)
+        written += len(rows)
+        if progress:
+            progress(written)
+    workbook.save(out)
+    return written
+
+
+# Writes one export to the binary file out. Returns the number of rows.
+def export(export_name, file_format, out, adviser=None, conn=None, progress=None):
+    cur = (conn or Database.connect()).execute(*_query(export_name, adviser))
+    try:
+        if file_format == "xlsx":
+            return write_xlsx(cur, out, EXPORTS[export_name][0], progress)
+        return write_csv(cur, out, progress)
+    finally:
+        cur.close()
+
+
+# Job entry point, see Jobs.JOB_KINDS. Returns the file, not its bytes, Jobs copies
+# it into the job's result file in chunks.
+def export_job(job, export_name, file_format="csv", adviser=None):
+    query, params = _query(export_name, adviser)
+    total = job.conn.execute(f"SELECT COUNT(*) FROM ({query})", params).fetchone()[0]
+    job.progress(0.02, f"Exporting {total} rows")
+
+    def progress(written):
+        job.progress(0.02 + 0.9 * written / max(total, 1), f"Exported {written} of {total} rows")
+
+    out = tempfile.TemporaryFile()
+    try:
+        export(export_name, file_format, out, adviser, conn=job.conn, progress=progress)
+    except BaseException:
+        out.close()
+        raise
+    return file_name(export_name, file_format, adviser), FORMATS[file_format], out
+
+
+# Format choice, export button and the user's export jobs, for the directory and
+# grade pages. Exports the students of the current scope (see Scope.py).
+def render(export_name, key):
+    title = EXPORTS[export_name][0]
+    username = st.session_state.get("username")
+    with st.expander(f"Export {title}"):
+        col1, col2 = st.columns([1, 3])
+        file_format = col1.selectbox("Format:", list(FORMATS), key=f"{key}_format")
+        if col2.button(f"Export {title}", key=f"{key}_button"):
+            job_id = Jobs.enqueue("export", {"export_name": export_name, "file_format": file_format,
+                                             "adviser": Scope.adviser()}, created_by=username)
+            st.success(f"Export #{job_id} queued. The file will appear below when it is ready.")
+        Jobs.render_jobs(kind="export", created_by=username, limit=5, key=f"{key}_jobs")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the student directory, course directory or grades as CSV or XLSX.")
+    parser.add_argument("export", choices=list(EXPORTS))
+    parser.add_argument("--format", choices=list(FORMATS), default="csv")
+    parser.add_argument("--adviser", help="only the students assigned to this adviser")
+    parser.add_argument("--db", help=f"database file (default: {Database.DB_PATH})")
+    parser.add_argument("--out", help="output file (default: a name built from the export)")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        Database.DB_PATH = args.db
+    out_path = args.out or file_name(args.export, args.format, args.adviser)
+    with open(out_path, "wb") as out:
+        rows = export(args.export, args.format, out, args.adviser)
+    print(f"Wrote {rows} rows to {out_path}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+import importlib.util
+import pandas as pd
+import Database
+
+# pandas loading helpers for the pages. The coded columns (see Database.CODE_TABLES)
+# come back as ordered categoricals: one small integer per cell instead of a Python
+# string, and sorting follows the page order (1st Sem, 2nd Sem, Summer) instead of
+# the alphabet.
+#
+# Other columns get the dtype their query declares (Queries.DTYPES, or dtypes= for
+# ad hoc SQL): "category" for repeated labels such as StudentID, CourseCode and
+# AcademicYear, small integer types for counts and ids, and "string" for free text,
+# which is Arrow-backed (one buffer per column instead of one Python object per
+# cell) when pyarrow is installed and left as object otherwise.
+
+CATEGORY_ORDER = {
+    "Semester": Database.SEMESTERS,
+    "YearLevel": Database.YEAR_LEVELS,
+    "Grade": Database.GRADES,
+    "FinalGrade": Database.GRADES,
+    "GradeStatus": Database.GRADE_STATUSES,
+}
+
+STRING_DTYPE = "string[pyarrow]" if importlib.util.find_spec("pyarrow") else None
+
+
+def categorize(df, columns=None):
+    for column in columns or CATEGORY_ORDER:
+        if column not in df.columns:
+            continue
+        present = set(df[column].dropna().unique())
+        # Known labels in page order, then anything else that is in the data
+        categories = [label for label in CATEGORY_ORDER[column] if label in present]
+        categories += sorted(present.difference(categories), key=str)
+        df[column] = pd.Categorical(df[column], categories=categories, ordered=True)
+    return df
+
+
+def astype(df, dtypes):
+    for column, dtype in (dtypes or {}).items():
+        if column not in df.columns or column in CATEGORY_ORDER:
+            continue
+        if dtype == "string":
+            dtype = STRING_DTYPE
+        if dtype:
+            df[column] = df[column].astype(dtype)
+    return df
+
+
+# pd.read_sql_query with the coded columns as categoricals and the other columns
+# in dtypes converted. Pass columns to limit which coded columns are converted,
+# e.g. when the frame goes into an editable st.data_editor.
+def read_sql(query, conn, params=None, columns=None, dtypes=None):
+    return astype(categorize(pd.read_sql_query(query, conn, params=params), columns), dtypes)
@@ -1,36 +1,29 @@
 import streamlit as st
-import calendar
 from datetime import datetime
 import pandas as pd
-import numpy as np
 from streamlit_option_menu import option_menu
-import pickle
-from pathlib import Path
-import streamlit_authenticator as stauth
-from streamlit_pandas_profiling import st_profile_report
-import sqlite3
+import Exports
+import Metrics
+import Queries
+import Scope
+import Writer
+import Jobs
 import plotly.express as px
-import re
 
 
-conn = sqlite3.connect('studentmonitor.db', check_same_thread=False)
-cur = conn.cursor()
-
 def app():
     semesters = ["1st Sem", "2nd Sem", "Summer"]
     year_levels = ["1", "2", "3", "4"]
     grade_options = ["  ", "1.00", "1.25", "1.50", "1.75", "2.00", "2.25", "2.50", "2.75", "3.00", "5.00", "INC", "INPROG", "P", "F", "DRP", "W"]
     gradestatus_options = ["Passed", "Failed", "To be Determined","Dropped"]
 
-    # Function to add or update grade
-    def addOrUpdateGrade(StudentID, CourseCode, Grade, FinalGrade, GradeStatus):
-        cur.execute(
-            """UPDATE courseassignment 
-            SET Grade = ?, FinalGrade = ?, GradeStatus = ?
-            WHERE StudentID = ? AND CourseCode = ?""",
-            (Grade, FinalGrade, GradeStatus, StudentID, CourseCode)
-        )
-        conn.commit()
+    # Function to add or update the grades of one term, (EnrollID, Grade, FinalGrade, GradeStatus)
+    # per course. By EnrollID so a retake and the first attempt keep their own grades.
+    def addOrUpdateGrades(grades):
+        Writer.write_many([
+            ("course_assignment_set_grade", (Grade, FinalGrade, GradeStatus, int(EnrollID)))
+            for EnrollID, Grade, FinalGrade, GradeStatus in grades
+        ])
         st.session_state.operation_success = "Grade has been added. If there is INC please update when accomplished."
 
     # Function to determine grade status
@@ -51,14 +44,13 @@ def app():
 
     sub_selected = option_menu(
                     menu_title=None,
-                    options=["Grade Evaluation", "Promotion"],
+                    options=["Grade Evaluation", "Promotion", "Grade Slips"],
                     orientation="horizontal",
                     default_index=0
                 )
     
     # Fetching student IDs and names
-    cur.execute("SELECT StudentID, Name FROM student")
-    students = cur.fetchall()
+    students = Scope.fetchall("student_names")
     # Sort students by name
     students.sort(key=lambda student: student[1])
 
@@ -70,6 +62,7 @@ def app():
     
     if sub_selected == "Grade Evaluation":
         st.header("Grade Evaluation")
+        Exports.render("grades", key="grades_export")
 
         selected_student_name = st.selectbox("Select Student:", sorted_names)
         if selected_student_name:
@@ -82,49 +75,12 @@ def app():
             st.write(f"Grades for {student_name} ({selected_student_id})")
 
             # Fetch the course assignments for the selected student with course descriptions
-            grades_df = pd.read_sql_query(
-                """SELECT ca.StudentID, ca.CourseCode, p.CourseDesc, ca.Grade, ca.FinalGrade, ca.GradeStatus, p.Units, ca.Semester, ca.YearLevel
-                FROM courseassignment ca
-                JOIN prospectus p ON ca.CourseCode = p.CourseCode
-                WHERE ca.StudentID = ?
-                ORDER BY ca.YearLevel, ca.Semester""",
-                conn, params=(selected_student_id,)
-            )
+            # Grade columns stay plain strings, they are edited in st.data_editor below
+            grades_df = Queries.read_sql("grades_of_student", (selected_student_id,), columns=["Semester", "YearLevel"])
 
             if not grades_df.empty:
                 def get_grade(row):
-                    initial_grade = row['Grade']
-                    final_grade = row['FinalGrade']
-                        
-                    non_numeric_grades = ["W", "P", "F", "INPROG"]
-
-                    if pd.isna(initial_grade) or initial_grade.strip() == "" or initial_grade.strip() in non_numeric_grades:
-                        return None  # Exclude these grades from calculation
-                        
-                    if initial_grade.strip() == "INC":
-                        if pd.isna(final_grade) or final_grade.strip() == "":
-                            return 5.00  # Default value for INC with no final grade
-                        else:
-                            try:
-                                return float(final_grade)  # Convert final grade to float
-                            except ValueError:
-                                return 0.00  # Return 0.00 if final grade cannot be converted
-                    elif initial_grade.strip() == "DRP":
-                        return 5.00  # DRP equivalent to 5.00
-                    else:
-                        if pd.isna(final_grade) or final_grade.strip() == "":
-                            try:
-                                return float(initial_grade)  # Use initial grade as final grade if no final grade provided
-                            except ValueError:
-                                return 0.00  # Return 0.00 if initial grade cannot be converted
-                        else:
-                            try:
-                                return float(final_grade)  # Convert final grade to float
-                            except ValueError:
-                                try:
-                                    return float(initial_grade)  # Use initial grade if final grade cannot be converted
-                                except ValueError:
-                                    return 0.00  # Return 0.00 if neither can be converted
+                    return Metrics.grade_point(row['Grade'], row['FinalGrade'])
 
                 def calculate_gpa(df):
                     valid_grades = df[~df['CourseCode'].isin(['NST001', 'NST002'])]
@@ -154,6 +110,7 @@ def app():
                             edited_df = st.data_editor(
                                 edited_df,
                                 column_config={
+                                    "EnrollID": None,
                                     "CourseCode": st.column_config.TextColumn(width="medium", disabled=True),
                                     "CourseDesc": st.column_config.TextColumn(width="medium", disabled=True),
                                     "Grade": st.column_config.SelectboxColumn(
@@ -171,6 +128,7 @@ def app():
                             )
 
                             if st.button(f"Submit Grades for {year} {sem}"):
+                                grades = []
                                 for index, row in edited_df.iterrows():
                                     initial_grade = row['Grade']
                                     final_grade = row['FinalGrade']
@@ -183,7 +141,8 @@ def app():
                                         final_grade = initial_grade
                                         grade_status = determineGradeStatus(final_grade)
 
-                                    addOrUpdateGrade(selected_student_id, row['CourseCode'], initial_grade, final_grade, grade_status)
+                                    grades.append((row['EnrollID'], initial_grade, final_grade, grade_status))
+                                addOrUpdateGrades(grades)
                                 st.experimental_rerun()
 
                             gpa = calculate_gpa(filtered_grades_df)
@@ -235,13 +194,8 @@ def app():
 
             if selected_acad_year and selected_semester:
                 # Fetch the course assignments for the selected student with course descriptions
-                promoted_df = pd.read_sql_query(
-                    """SELECT ca.AcademicYear, ca.Semester, ca.StudentID, s.Name, ca.YearLevel
-                        FROM courseassignment ca
-                        JOIN student s ON ca.StudentID = s.StudentID
-                        WHERE ca.AcademicYear = ? AND ca.Semester = ?""",
-                    conn, params=(selected_acad_year, selected_semester)
-                )
+                promoted_df = Scope.read_sql("promotion_candidates", (selected_acad_year, selected_semester),
+                                             categorize=False)
                 
                 # Add a Promotion column to the dataframe
                 promoted_df['Promotion'] = False
@@ -261,13 +215,34 @@ def app():
                 )
                 
                 if st.button("Promote Students"):
-                    # Insert the updated promotion data into the Promotion table
-                    for index, row in edited_df.iterrows():
-                        cur.execute('''
-                            INSERT INTO promotion (StudentID, AcademicYear, Semester, PromotionStatus)
-                            VALUES (?, ?, ?, ?)
-                        ''', (row['StudentID'], selected_acad_year, selected_semester, row['Promotion']))
-                    conn.commit()
+                    # Save the promotion decisions, all rows in one commit. Promoting again
+                    # replaces the earlier decision of the same student and term.
+                    Writer.write_many([
+                        ("promotion_upsert", (row['StudentID'], selected_acad_year, selected_semester, row['Promotion']))
+                        for index, row in edited_df.iterrows()
+                    ])
 
                     st.success("Promotion status updated successfully!")
-                    
\ No newline at end of file
+                    
+
+    elif sub_selected == "Grade Slips":
+            st.header("Grade Slips")
+            st.write("Grade slips for every student of a program, built in the background and downloaded as one ZIP.")
+
+            programs = ["All Programs"] + [row[0] for row in Queries.fetchall("student_programs")]
+            academic_years = ["All Years"] + [row[0] for row in Queries.fetchall("course_assignment_years")]
+
+            col1, col2, col3 = st.columns(3)
+            selected_program = col1.selectbox("Select Program:", programs, key="slip_program")
+            selected_acad_year = col2.selectbox("Enrolled in Academic Year:", academic_years, key="slip_year")
+            selected_format = col3.selectbox("Format:", ["docx", "csv"], key="slip_format")
+
+            if st.button("Generate Grade Slips"):
+                job_id = Jobs.enqueue("transcripts", {
+                    "program": None if selected_program == "All Programs" else selected_program,
+                    "academic_year": None if selected_acad_year == "All Years" else selected_acad_year,
+                    "file_format": selected_format,
+                }, created_by=st.session_state.get("username"))
+                st.success(f"Grade slips #{job_id} queued. The ZIP will appear below when it is ready.")
+
+            Jobs.render_jobs(kind="transcripts", created_by=st.session_state.get("username"), key="grade_slip_jobs")
@@ -1,279 +1,20 @@
 import streamlit as st
-import calendar
-from datetime import datetime
-import pandas as pd
-import numpy as np
-from streamlit_option_menu import option_menu
-import pickle
-from pathlib import Path
-import streamlit_authenticator as stauth
-from streamlit_pandas_profiling import st_profile_report
-import sqlite3
+import Tracing
+import Metrics
+import Queries
+import Replica
+import Scope
+import Jobs
+import Assets
 import plotly.express as px
-import docx 
-import io
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.shared import Pt, RGBColor, Inches
-from docx.oxml.ns import qn
-from docx.oxml import OxmlElement
-import base64
-
-
-conn = sqlite3.connect('studentmonitor.db', check_same_thread=False)
-cur = conn.cursor()
-
-def calculate_rates(academic_year):
-    cur.execute("SELECT COUNT(StudentID) FROM academicrecords WHERE AcademicYear <= ?", (academic_year,))
-    student_total = cur.fetchone()[0]
-
-    cur.execute("SELECT COUNT(StudentID) FROM academicrecords WHERE YearLevel = '1' AND AcademicYear = ?", (academic_year,))
-    initial_cohort_size = cur.fetchone()[0]
-
-    cur.execute("SELECT COUNT(StudentID) FROM academicrecords WHERE YearLevel IN ('1', '2', '3', '4') AND AcademicYear = ?", (academic_year,))
-    current_students = cur.fetchone()[0]
-    retention_rate = (current_students / initial_cohort_size) * 100 if initial_cohort_size > 0 else 0
-
-    cur.execute("SELECT COUNT(StudentID) FROM academicrecords WHERE ScholasticStatus = 'Graduate' AND AcademicYear = ?", (academic_year,))
-    graduate_count = cur.fetchone()[0]
-    completion_rate = (graduate_count / student_total) * 100 if student_total > 0 else 0
-
-    cur.execute("SELECT COUNT(StudentID) FROM promotion WHERE PromotionStatus = '1' AND AcademicYear = ?", (academic_year,))
-    promotion_count = cur.fetchone()[0]
-    promotion_rate = (promotion_count / student_total) * 100 if student_total > 0 else 0
-
-    cur.execute("SELECT COUNT(StudentID) FROM courseassignment WHERE GradeStatus = 'Failed' AND AcademicYear = ?", (academic_year,))
-    fail_count = cur.fetchone()[0]
-    failure_rate = (fail_count / student_total) * 100 if student_total > 0 else 0
-
-    cur.execute("SELECT COUNT(StudentID) FROM academicrecords WHERE ScholasticStatus = 'Dropped' AND AcademicYear = ?", (academic_year,))
-    dropout_count = cur.fetchone()[0]
-    dropout_rate = (dropout_count / student_total) * 100 if student_total > 0 else 0
-
-    return {
-        "student_total": student_total,
-        "retention_rate": retention_rate,
-        "completion_rate": completion_rate,
-        "promotion_rate": promotion_rate,
-        "failure_rate": failure_rate,
-        "dropout_rate": dropout_rate,
-        "fail_count": fail_count,
-        "dropout_count": dropout_count
-    }
-
-def calculate_gpa(student_id, year_level, semester):
-    cur.execute("""
-        SELECT ca.Grade, ca.FinalGrade, p.Units
-        FROM courseassignment ca
-        JOIN prospectus p ON ca.CourseCode = p.CourseCode
-        WHERE ca.StudentID = ? AND ca.YearLevel = ? AND ca.Semester = ? 
-          AND ca.Grade NOT IN ('W', 'P', 'F', 'INPROG') 
-          AND ca.CourseCode NOT IN ('NST001', 'NST002')
-    """, (student_id, year_level, semester))
-    grades = cur.fetchall()
-
-    if not grades:
-        return None
-
-    total_units = 0
-    weighted_sum = 0.0
-
-    for grade in grades:
-        initial_grade = grade[0]
-        final_grade = grade[1]
-        units = grade[2]
-
-        if initial_grade in ['INC', 'INPROG']:
-            if final_grade and final_grade.strip() != '':
-                try:
-                    weighted_sum += float(final_grade) * units
-                    total_units += units
-                except ValueError:
-                    continue  # Skip this grade if final grade cannot be converted to float
-        else:
-            try:
-                weighted_sum += float(initial_grade) * units
-                total_units += units
-            except ValueError:
-                continue  # Skip this grade if initial grade cannot be converted to float
-
-    if total_units > 0:
-        gpa_value = round(weighted_sum / total_units, 2)
-    else:
-        gpa_value = 0.0
-
-    return gpa_value
-
-def calculate_awardees(year_level, semester):
-    cur.execute("""
-        SELECT DISTINCT StudentID FROM courseassignment
-        WHERE YearLevel = ? AND Semester = ?
-    """, (year_level, semester))
-    student_ids = [row[0] for row in cur.fetchall()]
-
-    rl_count = 0
-    cl_count = 0
-    dl_count = 0
-
-    for student_id in student_ids:
-        gpa = calculate_gpa(student_id, year_level, semester)
-        if gpa is not None:
-            if 1.0 <= gpa <= 1.20:
-                rl_count += 1
-            elif 1.21 <= gpa <= 1.45:
-                cl_count += 1
-            elif 1.46 <= gpa <= 1.75:
-                dl_count += 1
-
-    return {
-        "rl_count": rl_count,
-        "cl_count": cl_count,
-        "dl_count": dl_count
-    }
-
-def calculate_counts(year_level, semester):
-    cur.execute("SELECT COUNT(StudentID) FROM courseassignment WHERE Grade = 'INC' AND YearLevel = ? AND Semester = ?", (year_level, semester))
-    inc_count = cur.fetchone()[0]
-
-    cur.execute("SELECT COUNT(StudentID) FROM academicrecords WHERE ScholasticStatus = 'Withdrawn' AND YearLevel = ? AND Semester = ?", (year_level, semester))
-    withdrawn_count = cur.fetchone()[0]
-
-    cur.execute("SELECT COUNT(StudentID) FROM courseassignment WHERE GradeStatus = 'Failed' AND YearLevel = ? AND Semester = ?", (year_level, semester))
-    fail_count = cur.fetchone()[0]
-
-    return {
-        "inc_count": inc_count,
-        "withdrawn_count": withdrawn_count,
-        "fail_count": fail_count,
-        **calculate_awardees(year_level, semester)
-    }
-
-def calculate_cgpa(student_id, year_level, semester):
-    cur.execute("""
-        SELECT ca.StudentID, ca.CourseCode, p.Units, ca.Grade, ca.FinalGrade
-        FROM courseassignment ca
-        JOIN prospectus p ON ca.CourseCode = p.CourseCode
-        WHERE ca.StudentID = ? AND ca.YearLevel = ? AND ca.Semester = ?
-    """, (student_id, year_level, semester))
-    
-    rows = cur.fetchall()
-    total_units = 0
-    total_grade_points = 0
-    
-    for row in rows:
-        units = float(row[2])  # Convert units to float
-        grade = row[3]  # Grade from courseassignment table
-        final_grade = row[4]  # FinalGrade from courseassignment table
-        
-        # Consider only final grades for CGPA calculation
-        if final_grade is not None and final_grade.strip():  # Check if final_grade is not empty or None
-            try:
-                grade_points = float(final_grade) * units
-                total_grade_points += grade_points
-                total_units += units
-            except ValueError:
-                continue  # Skip this grade if final grade cannot be converted to float
-    
-    if total_units == 0:
-        return None  # No units found for the student
-    
-    cgpa = total_grade_points / total_units
-    return cgpa
-
-
-def get_initial_grade_value(initial_grade, final_grade):
-    if initial_grade in ["1.00", "1.25", "1.50", "1.75", "2.00", "2.25", "2.50", "2.75", "3.00"]:
-        return float(initial_grade)
-    elif initial_grade in ["INC", "INPROG"] and final_grade in ["1.00", "1.25", "1.50", "1.75", "2.00", "2.25", "2.50", "2.75", "3.00"]:
-        return float(final_grade)
-    elif initial_grade == "5.00":
-        return 5.00
-    else:
-        return None
-def calc_gpa(grades_df):
-    gpa_data = []
-    for student_id, group in grades_df.groupby('StudentID'):
-        valid_grades = group[~group['CourseCode'].isin(['NST001', 'NST002'])]
-        valid_grades['GradePoint'] = valid_grades.apply(lambda row: get_initial_grade_value(row['Grade'], row['FinalGrade']), axis=1)
-        valid_grades.dropna(subset=['GradePoint'], inplace=True)
-        total_units = valid_grades['Units'].sum()
-        weighted_sum = (valid_grades['Units'] * valid_grades['GradePoint']).sum()
-        if total_units > 0:
-            gpa = weighted_sum / total_units
-            gpa_data.append((student_id, gpa))
-    return pd.DataFrame(gpa_data, columns=['StudentID', 'GPA'])
-
-def calc_cgpa(grades_df):
-    cgpa_data = []
-    for student_id, group in grades_df.groupby('StudentID'):
-        running_total_units = 0
-        running_weighted_sum = 0
-        valid_grades = group[~group['CourseCode'].isin(['NST001', 'NST002'])]
-        valid_grades['GradePoint'] = valid_grades.apply(lambda row: get_initial_grade_value(row['Grade'], row['FinalGrade']), axis=1)
-        valid_grades.dropna(subset=['GradePoint'], inplace=True)
-        running_total_units += valid_grades['Units'].sum()
-        running_weighted_sum += (valid_grades['Units'] * valid_grades['GradePoint']).sum()
-        if running_total_units > 0:
-            cgpa = round(running_weighted_sum / running_total_units, 5)
-            cgpa_data.append((student_id, cgpa))
-    return pd.DataFrame(cgpa_data, columns=['StudentID', 'CGPA'])
-
-def get_all_student_grades():
-    query = """
-        SELECT ca.StudentID, ca.CourseCode, p.Units, ca.Grade, ca.FinalGrade, ca.YearLevel, ca.Semester
-        FROM courseassignment ca
-        JOIN prospectus p ON ca.CourseCode = p.CourseCode
-    """
-    grade_df = pd.read_sql_query(query, conn)
-    return grade_df
-
-def calculate_average_gpa_cgpa_all():
-    final_grades_df = get_all_student_grades()
-    all_year_levels = final_grades_df['YearLevel'].unique()
-    all_semesters = final_grades_df['Semester'].unique()
-    
-    avg_gpa_cgpa_data = []
-    
-    for year_level in all_year_levels:
-        for semester in all_semesters:
-            selected_grades_df = final_grades_df[(final_grades_df['YearLevel'] == year_level) & 
-                                                (final_grades_df['Semester'] == semester)]
-            gpa_df = calc_gpa(selected_grades_df)
-            cgpa_df = calc_cgpa(selected_grades_df)
-            avg_gpa = gpa_df['GPA'].mean() if not gpa_df.empty else None
-            avg_cgpa = cgpa_df['CGPA'].mean() if not cgpa_df.empty else None
-            avg_gpa_cgpa_data.append((year_level, semester, avg_gpa, avg_cgpa))
-    
-    avg_gpa_cgpa_df = pd.DataFrame(avg_gpa_cgpa_data, columns=['YearLevel', 'Semester', 'AverageGPA', 'AverageCGPA'])
-    return avg_gpa_cgpa_df
-
-def get_course_data_with_status_counts(conn, year_level, semester):
-            query = f"""
-            SELECT p.CourseCode, p.CourseDesc, p.Units, ca.Semester, ca.YearLevel, 
-            SUM(CASE WHEN ca.GradeStatus = 'Passed' THEN 1 ELSE 0 END) as PassedCount,
-            SUM(CASE WHEN ca.GradeStatus = 'Failed' THEN 1 ELSE 0 END) as FailedCount,
-            SUM(CASE WHEN ca.GradeStatus = 'Dropout' THEN 1 ELSE 0 END) as DroppedCount,
-            SUM(CASE WHEN ca.GradeStatus = 'Withdrawn' THEN 1 ELSE 0 END) as WithdrawnCount,
-            SUM(CASE WHEN ca.GradeStatus != 'Passed' THEN 1 ELSE 0 END) as RetakeCount
-            FROM prospectus p
-            LEFT JOIN courseassignment ca ON p.CourseCode = ca.CourseCode
-            WHERE ca.YearLevel LIKE ? AND ca.Semester LIKE ?
-            GROUP BY p.CourseCode, p.CourseDesc, p.Units, ca.Semester, ca.YearLevel
-            """
-            df = pd.read_sql_query(query, conn, params=(f'%{year_level}%', f'%{semester}%'))
-            return df
-
-
-def get_pdf_download_link(file_path):
-    # Function to generate download link for PDF file
-    with open(file_path, "rb") as f:
-        pdf = f.read()
-        b64_pdf = base64.b64encode(pdf).decode()
-        href = f'<a href="data:application/pdf;base64,{b64_pdf}" download="User Guide.pdf"><button>Download User Guide (PDF)</button></a>'
-    return href
+
 
 def app():
     st.subheader("Home", divider='red')
     tab1, tab2, tab3, tab4 = st.tabs(["About", "Counts", "Trends", "Adviser's Report"])
+    # The Counts and Trends dashboards cover the adviser's own students unless the
+    # department-wide view is on, the Adviser's Report is always department-wide
+    adviser = Scope.adviser()
 
     with tab1:
         st.header("About Us")
@@ -337,11 +78,10 @@ def app():
         st.markdown("<br>", unsafe_allow_html=True)
         
         st.subheader("User Guide")
-        pdf_path = "User Guide.pdf" 
-        download_link = get_pdf_download_link(pdf_path)
-        st.markdown(download_link, unsafe_allow_html=True)
+        Assets.download_button("user_guide", "Download User Guide (PDF)")
 
-    with tab2:
+    # The dashboards read one snapshot of the read replica each, see Replica.py
+    with tab2, Tracing.section("Counts tab"), Replica.snapshot():
         year_levels = ["1", "2", "3", "4"]
         semesters = ["1st Sem", "2nd Sem", "Summer"]
         col1, col2, col3, col4 = st.columns(4)
@@ -349,7 +89,9 @@ def app():
         selected_semester = col2.selectbox("Select Semester:", semesters)
 
         if selected_year_level and selected_semester:
-            counts = calculate_counts(selected_year_level, selected_semester)
+            if Replica.ENABLED and Replica.refreshed_at():
+                st.caption(f"Figures as of {Replica.refreshed_at()}, updated every {Replica.REFRESH_SECONDS:g} seconds.")
+            counts = Metrics.calculate_counts(selected_year_level, selected_semester, adviser)
 
             st.subheader(f"Counts for {selected_year_level} Year: {selected_semester}")
             col1, col2, col3 = st.columns(3)
@@ -385,28 +127,11 @@ def app():
                 st.plotly_chart(fig)
 
             # Calculate GPA distribution
-            cur.execute("SELECT DISTINCT StudentID FROM academicrecords")
-            student_ids = [row[0] for row in cur.fetchall()]
-            below_25_gpa = 0
-            above_25_gpa = 0
-            below_25_cgpa = 0
-            above_25_cgpa = 0
-
-            for student_id in student_ids:
-                gpa = calculate_gpa(student_id, selected_year_level, selected_semester)
-                cgpa = calculate_cgpa(student_id, selected_year_level, selected_semester)
-                
-                if gpa is not None:
-                    if gpa > 2.5:
-                        below_25_gpa += 1
-                    else:
-                        above_25_gpa += 1
-                
-                if cgpa is not None:
-                    if cgpa > 2.5:
-                        below_25_cgpa += 1
-                    else:
-                        above_25_cgpa += 1
+            distribution = Metrics.gpa_distribution(selected_year_level, selected_semester, adviser)
+            below_25_gpa = distribution["below_25_gpa"]
+            above_25_gpa = distribution["above_25_gpa"]
+            below_25_cgpa = distribution["below_25_cgpa"]
+            above_25_cgpa = distribution["above_25_cgpa"]
 
             # Display GPA and CGPA Distributions using Plotly
             st.subheader("GPA Distribution")
@@ -425,7 +150,7 @@ def app():
 
             st.divider()
 
-            course_data_df = get_course_data_with_status_counts(conn, selected_year_level, selected_semester)
+            course_data_df = Metrics.course_status_counts(selected_year_level, selected_semester, adviser)
                 
             if not course_data_df.empty:
                 st.subheader(f'Course Data for {selected_year_level} Year Level, {selected_semester} Semester')
@@ -441,16 +166,15 @@ def app():
                 st.warning("No data found for the selected year level and semester.")
         
 
-    with tab3:  
+    with tab3, Tracing.section("Trends tab"), Replica.snapshot():
         # Select academic year
-        cur.execute("SELECT DISTINCT AcademicYear FROM academicrecords ORDER BY AcademicYear")
-        academic_years = [row[0] for row in cur.fetchall()]
+        academic_years = [row[0] for row in Queries.fetchall("academic_years", conn=Replica.connect())]
         
         col1, col2, col3 = st.columns(3)
         selected_academic_year = col1.selectbox("Select Academic Year:", academic_years)
 
         if selected_academic_year:
-            rates = calculate_rates(selected_academic_year)
+            rates = Metrics.calculate_rates(selected_academic_year, adviser=adviser)
 
             col1, col2, col3 = st.columns(3)
             with col1:
@@ -464,7 +188,7 @@ def app():
                 st.metric("Dropout Rate", rates['dropout_rate'], "%", delta_color="normal")
 
        # Fetch and calculate average GPA and CGPA
-        avg_gpa_cgpa_df = calculate_average_gpa_cgpa_all()
+        avg_gpa_cgpa_df = Metrics.calculate_average_gpa_cgpa_all(adviser=adviser)
 
         # Drop rows with None values to avoid plotting issues
         avg_gpa_cgpa_df.dropna(inplace=True)
@@ -499,21 +223,8 @@ def app():
         st.plotly_chart(fig_gpa)
         st.plotly_chart(fig_cgpa)
 
-    with tab4:
-        # Fetch and calculate average GPA and CGPA
-        avg_gpa_cgpa_df = calculate_average_gpa_cgpa_all()
-
-        # Check if DataFrame is empty before accessing its rows
-        if not avg_gpa_cgpa_df.empty:
-            average_gpa = avg_gpa_cgpa_df['AverageGPA'].values[0]
-            average_cgpa = avg_gpa_cgpa_df['AverageCGPA'].values[0]
-        else:
-            st.error("No data available for average GPA and CGPA.")
-            average_gpa = 0 
-            average_cgpa = 0 
-
-        cur.execute("SELECT DISTINCT AcademicYear FROM academicrecords ORDER BY AcademicYear")
-        academic_year = [row[0] for row in cur.fetchall()]
+    with tab4, Tracing.section("Adviser's Report tab"):
+        academic_year = [row[0] for row in Queries.fetchall("academic_years", conn=Replica.connect())]
         year_levels = ["1", "2", "3", "4"]
         semesters = ["1st Sem", "2nd Sem", "Summer"]
 
@@ -522,32 +233,6 @@ def app():
         selected_year_level = col2.selectbox("Select Year Level", year_levels, key='yl')
         selected_semester = col3.selectbox("Select Semester", semesters, key='semmy')
 
-        cur.execute("SELECT DISTINCT StudentID FROM academicrecords")
-        student_ids = [row[0] for row in cur.fetchall()]
-        below_25_gpa = 0
-        above_25_gpa = 0
-        below_25_cgpa = 0
-        above_25_cgpa = 0
-
-        for student_id in student_ids:
-            gpa = calculate_gpa(student_id, selected_year_level, selected_semester)
-            cgpa = calculate_cgpa(student_id, selected_year_level, selected_semester)
-            
-            if gpa is not None:
-                if gpa > 2.5:
-                    below_25_gpa += 1
-                else:
-                    above_25_gpa += 1
-            
-            if cgpa is not None:
-                if cgpa > 2.5:
-                    below_25_cgpa += 1
-                else:
-                    above_25_cgpa += 1
-
-        rates = calculate_rates(selected_academic_year)
-        student_total = rates["student_total"]
-
         col1, col2 = st.columns(2)
         program_title = col1.text_input("Program Title")
         department = col2.text_input("Department")
@@ -594,334 +279,54 @@ def app():
         prog_adv = col1.text_input("Name of Program Adviser:")
         dept_chairperson = col2.text_input("Department Chairperson:")
 
-        def set_text_properties(paragraph, bold=False, size=11, alignment=None, color=RGBColor(0, 0, 0)):
-            for run in paragraph.runs:
-                run.font.bold = bold
-                run.font.size = Pt(size)
-                run.font.color.rgb = color
-                if alignment:
-                    paragraph.alignment = alignment
-
-        def set_column_width(cell, width):
-            cell_width = OxmlElement('w:tcW')
-            cell_width.set(qn('w:w'), str(width))
-            cell_width.set(qn('w:type'), 'dxa')
-            cell._element.get_or_add_tcPr().append(cell_width)
-
+        fields = {
+            "program_title": program_title,
+            "department": department,
+            "college": college,
+            "academic_year": academic_year,
+            "reporting_period": reporting_period,
+            "submission_date": submission_date,
+            "objectives": objectives,
+            "co_act": co_act,
+            "accomplishments": accomplishments,
+            "program_outputs": program_outputs,
+            "deliverables": deliverables,
+            "date_cons": date_cons,
+            "nature_advising": nature_advising,
+            "action_taken": action_taken,
+            "risk_challenges": risk_challenges,
+            "collab_linkages": collab_linkages,
+            "problem_encountered": problem_encountered,
+            "recom": recom,
+            "program_plans": program_plans,
+            "prog_adv": prog_adv,
+            "dept_chairperson": dept_chairperson,
+        }
+
+        # The metrics and the documents are built by background jobs (Reports.adviser_report_job,
+        # Reports.adviser_report_batch_job) so the page stays responsive and the report survives a page refresh
         with st.form("adviser_report_form"):
-            submitted = st.form_submit_button("Generate Report")
-
-            if submitted:
-                counts = calculate_counts(selected_year_level, selected_semester)
-                rates = calculate_rates(selected_academic_year)
-
-                doc = docx.Document()
-                
-                # Add logo and aligned text in the header
-                header = doc.sections[0].header
-                header_table = header.add_table(rows=1, cols=2, width=5)
-
-                set_column_width(header_table.columns[0].cells[0], 1000)  # Width in twips (1/20 of a point)
-                set_column_width(header_table.columns[1].cells[0], 7000)
-
-                # Add logo to the first cell (adjust path to your logo image)
-                logo_cell = header_table.cell(0, 0)
-                logo_cell.vertical_alignment = WD_ALIGN_PARAGRAPH.LEFT
-                logo_paragraph = logo_cell.paragraphs[0]
-                logo_run = logo_paragraph.add_run()
-                logo_run.add_picture('seal-02.png', width=Inches(0.95))
-
-                # Add text to the second cell
-                text_cell = header_table.cell(0,1)
-                text_paragraph = text_cell.paragraphs[0]
-                text_run1 = text_paragraph.add_run('MSU – ILIGAN INSTITUTE OF TECHNOLOGY\n')
-                text_run1.bold = True
-                text_run1.font.size = Pt(10)
-                text_run1.font.color.rgb = RGBColor(0, 0, 0)
-
-                text_run3 = text_paragraph.add_run('OFFICE OF THE VICE CHANCELLOR FOR ACADEMIC AFFAIRS\n')
-                text_run3.font.size = Pt(10)
-                text_run3.font.color.rgb = RGBColor(0, 0, 0)
-
-                text_run4 = text_paragraph.add_run('OFFICE OF THE DIRECTOR FOR UNDERGRADUATE PROGRAMS\n')
-                text_run4.font.size = Pt(10)
-                text_run4.font.color.rgb = RGBColor(0, 0, 0)
-
-                text_run5 = text_paragraph.add_run('Iligan City, Philippines')
-                text_run5.font.size = Pt(10)
-                text_run5.font.color.rgb = RGBColor(0, 0, 0)
-
-                # Set alignment for text in the second cell
-                text_cell.paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.LEFT 
-
-                headingc = doc.add_heading('ACADEMIC PROGRAM ADVISING PROGRESS REPORT', 0)
-                set_text_properties(headingc, size=12, bold=True, alignment=WD_ALIGN_PARAGRAPH.CENTER)
-
-
-                para1 = doc.add_paragraph()
-                run1 = para1.add_run('Program Title: ')
-                run1.bold = True
-                run1.font.size = Pt(12)
-                run1.font.color.rgb = RGBColor(0, 0, 0)
-                
-                run2 = para1.add_run(program_title)
-                run2.bold = False
-                run2.font.size = Pt(12)
-                run2.font.color.rgb = RGBColor(0, 0, 0)
-
-                # Department
-                para2 = doc.add_paragraph()
-                run3 = para2.add_run('Department: ')
-                run3.bold = True
-                run3.font.size = Pt(12)
-                run3.font.color.rgb = RGBColor(0, 0, 0)
-
-                run4 = para2.add_run(department)
-                run4.bold = False
-                run4.font.size = Pt(12)
-                run4.font.color.rgb = RGBColor(0, 0, 0)
-
-                # College
-                para3 = doc.add_paragraph()
-                run5 = para3.add_run('College: ')
-                run5.bold = True
-                run5.font.size = Pt(12)
-                run5.font.color.rgb = RGBColor(0, 0, 0)
-
-                run6 = para3.add_run(college)
-                run6.bold = False
-                run6.font.size = Pt(12)
-                run6.font.color.rgb = RGBColor(0, 0, 0)
-
-                # Academic Year
-                para4 = doc.add_paragraph()
-                run7 = para4.add_run('Academic Year: ')
-                run7.bold = True
-                run7.font.size = Pt(12)
-                run7.font.color.rgb = RGBColor(0, 0, 0)
-
-                run8 = para4.add_run(academic_year)
-                run8.bold = False
-                run8.font.size = Pt(12)
-                run8.font.color.rgb = RGBColor(0, 0, 0)
-
-                # Reporting Period
-                para5 = doc.add_paragraph()
-                run9 = para5.add_run('Reporting Period: ')
-                run9.bold = True
-                run9.font.size = Pt(12)
-                run9.font.color.rgb = RGBColor(0, 0, 0)
-
-                run10 = para5.add_run(reporting_period)
-                run10.bold = False
-                run10.font.size = Pt(12)
-                run10.font.color.rgb = RGBColor(0, 0, 0)
-
-                # Report Submission Date
-                para6 = doc.add_paragraph()
-                run11 = para6.add_run('Report Submission Date: ')
-                run11.bold = True
-                run11.font.size = Pt(12)
-                run11.font.color.rgb = RGBColor(0, 0, 0)
-
-                run12 = para6.add_run(submission_date)
-                run12.bold = False
-                run12.font.size = Pt(12)
-                run12.font.color.rgb = RGBColor(0, 0, 0)
-
-                # Section II: Program Academic Performance Profile
-                heading7 = doc.add_heading('I. Program Academic Performance Profile', level=2)
-                set_text_properties(heading7, size=12, bold=True)
-
-                # Create table for two-column layout
-                table = doc.add_table(rows=8, cols=4)
-
-                # Set column widths (first column wider)
-                set_column_width(table.columns[0].cells[0], 5000)  # Width in twips (1/20 of a point)
-                set_column_width(table.columns[1].cells[0], 1000)
-                set_column_width(table.columns[2].cells[0], 5000)
-                set_column_width(table.columns[3].cells[0], 1000)
-
-                # Fill in the table cells
-                cells = table.rows[0].cells
-                cells[0].text = 'Total Program Enrollees:'
-                cells[1].text = str(rates["student_total"])
-                cells[2].text = 'Number of Students with INC:'
-                cells[3].text = str(counts["inc_count"])
-
-                cells = table.rows[1].cells
-                cells[0].text = 'Retention Rate:'
-                cells[1].text = f'{rates["retention_rate"]:.2f}%'
-                cells[2].text = 'Number of Students withdraw from the program:'
-                cells[3].text = str(counts["withdrawn_count"])
-
-                cells = table.rows[2].cells
-                cells[0].text = 'Completion Rate:'
-                cells[1].text = f'{rates["completion_rate"]:.2f}%'
-                cells[2].text = 'Number of Students with failing grades:'
-                cells[3].text = str(counts["fail_count"])
-
-                cells = table.rows[3].cells
-                cells[0].text = 'Promotion Rate:'
-                cells[1].text = f'{rates["promotion_rate"]:.2f}%'
-                cells[2].text = 'Number of Rizal Excellence Awardees (1.0 – 1.20):'
-                cells[3].text = str(counts["rl_count"])
-
-                cells = table.rows[4].cells
-                cells[0].text = 'Failure Rate:'
-                cells[1].text = f'{rates["failure_rate"]:.2f}%'
-                cells[2].text = 'Number of Chancellor’s Excellence Awardees (1.21 – 1.45):'
-                cells[3].text = str(counts["cl_count"])
-
-                cells = table.rows[5].cells
-                cells[0].text = 'Dropout Rate:'
-                cells[1].text = f'{rates["dropout_rate"]:.2f}%'
-                cells[2].text = 'Number of Dean’s Excellence Awardees (1.46 – 1.75):'
-                cells[3].text = str(counts["dl_count"])
-
-                cells = table.rows[6].cells
-                cells[0].text = 'Average GPA of Students:'
-                cells[1].text = f'{average_gpa:.3f}'
-                cells[2].text = 'Number of Students with GPA below 2.50:'
-                cells[3].text = str(below_25_gpa)
-
-                cells = table.rows[7].cells
-                cells[0].text = 'Average CGPA of Students:'
-                cells[1].text = f'{average_cgpa:.3f}'
-                cells[2].text = 'Number of Students with CGPA below 2.50:'
-                cells[3].text = str(below_25_cgpa)
-
-                # Section III: Program Engagement & Activities
-                heading8 = doc.add_heading('II. Program Engagement & Activities', level=2)
-                set_text_properties(heading8, bold=True, size=12)
-
-                objectives_paragraph = doc.add_paragraph()
-                objectives_paragraph.add_run('Objectives: ').bold = True
-                objectives_paragraph.add_run(f'{objectives}')
-                objectives_paragraph.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-
-                co_act_paragraph = doc.add_paragraph()
-                co_act_paragraph.add_run('Curricular & Co-Curricular Activities: ').bold = True
-                co_act_paragraph.add_run(f'{co_act}')
-                co_act_paragraph.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-
-                accomplishments_paragraph = doc.add_paragraph()
-                accomplishments_paragraph.add_run('Accomplishments: ').bold = True
-                accomplishments_paragraph.add_run(f'{accomplishments}')
-                accomplishments_paragraph.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-
-                # Section III: Program Engagement & Activities
-                heading20 = doc.add_heading('III: Program Outputs and Deliverables', level=2)
-                set_text_properties(heading20, bold=True, size=12)
-
-                program_outputs_paragraph = doc.add_paragraph()
-                program_outputs_paragraph.add_run('Program Outputs: ').bold = True
-                program_outputs_paragraph.add_run(f'{program_outputs}')
-                program_outputs_paragraph.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-
-                deliverables_paragraph = doc.add_paragraph()
-                deliverables_paragraph.add_run('Deliverables: ').bold = True
-                deliverables_paragraph.add_run(f'{deliverables}')
-                deliverables_paragraph.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-
-                # Section IV: Consultation & Advising
-                heading9 = doc.add_heading('IV. Consultation & Advising', level=2)
-                set_text_properties(heading9, bold=True, size=12)
-
-                date_cons_paragraph = doc.add_paragraph()
-                date_cons_paragraph.add_run('Date of Consultation: ').bold = True
-                date_cons_paragraph.add_run(f'{date_cons}')
-                date_cons_paragraph.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-
-                nature_advising_paragraph = doc.add_paragraph()
-                nature_advising_paragraph.add_run('Nature of Advising: ').bold = True
-                nature_advising_paragraph.add_run(f'{nature_advising}')
-                nature_advising_paragraph.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-
-                action_taken_paragraph = doc.add_paragraph()
-                action_taken_paragraph.add_run('Action Taken: ').bold = True
-                action_taken_paragraph.add_run(f'{action_taken}')
-                action_taken_paragraph.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-
-                # Section V: Risks & Challenges
-                heading10 = doc.add_heading('V. Risks & Challenges', level=2)
-                set_text_properties(heading10, bold=True, size=12)
-                risk_challenges_paragraph = doc.add_paragraph()
-                risk_challenges_paragraph.add_run(f'{risk_challenges}')
-                risk_challenges_paragraph.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-                # Ensure to justify the paragraph content
-
-                # Section VI: Collaboration & Linkages
-                heading11 = doc.add_heading('VI. Collaboration & Linkages', level=2)
-                set_text_properties(heading11, bold=True, size=12)
-                collab_linkages_paragraph = doc.add_paragraph()
-                collab_linkages_paragraph.add_run(f'{collab_linkages}')
-                collab_linkages_paragraph.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-                # Ensure to justify the paragraph content
-
-                # Section VII: Problems Encountered
-                heading12 = doc.add_heading('VII. Problems Encountered', level=2)
-                set_text_properties(heading12, bold=True, size=12)
-                problem_encountered_paragraph = doc.add_paragraph()
-                problem_encountered_paragraph.add_run(f'{problem_encountered}')
-                problem_encountered_paragraph.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-                # Ensure to justify the paragraph content
-
-                # Section VIII: Recommendations
-                heading13 = doc.add_heading('VIII. Recommendations', level=2)
-                set_text_properties(heading13, bold=True, size=12)
-                recom_paragraph = doc.add_paragraph()
-                recom_paragraph.add_run(f'{recom}')
-                recom_paragraph.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-                # Ensure to justify the paragraph content
-
-                # Section IX: Program Plans
-                heading14 = doc.add_heading('IX. Program Plans', level=2)
-                set_text_properties(heading14, bold=True, size=12)
-                program_plans_paragraph = doc.add_paragraph()
-                program_plans_paragraph.add_run(f'{program_plans}')
-                program_plans_paragraph.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-                # Ensure to justify the paragraph content
-
-                para7 = doc.add_paragraph()
-                run13 = para7.add_run('Name of Program Adviser: ')
-                run13.bold = True
-                run13.font.size = Pt(12)
-                run13.font.color.rgb = RGBColor(0, 0, 0)
-
-                run14 = para7.add_run(prog_adv)
-                run14.bold = False
-                run14.font.size = Pt(12)
-                run14.font.color.rgb = RGBColor(0, 0, 0)
-
-                heading16 = doc.add_heading('Signature and Date:', level=2)
-                set_text_properties(heading16, bold=True, size=12)
-
-                para8 = doc.add_paragraph()
-                run15 = para8.add_run('Department Chairperson:')
-                run15.bold = True
-                run15.font.size = Pt(12)
-                run15.font.color.rgb = RGBColor(0, 0, 0)
-
-                run16 = para8.add_run(dept_chairperson)
-                run16.bold = False
-                run16.font.size = Pt(12)
-                run16.font.color.rgb = RGBColor(0, 0, 0)
-
-                heading18 = doc.add_heading('Signature and Date:', level=2)
-                set_text_properties(heading18, bold=True, size=12)
-
-                 # Save the document to a BytesIO object
-                doc_io = io.BytesIO()
-                doc.save(doc_io)
-                doc_io.seek(0)
-
-        # Place the download button outside the form submission block
-        if submitted:
-            st.download_button(
-                label="Download Report",
-                data=doc_io,
-                file_name=f"adviser_report_{selected_year_level}_{selected_semester}.docx",
-                mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-            )
-                
\ No newline at end of file
+            col1, col2 = st.columns(2)
+            submitted = col1.form_submit_button("Generate Report")
+            submitted_all = col2.form_submit_button("Generate All Terms (ZIP)")
+
+            if (submitted or submitted_all) and not selected_academic_year:
+                st.error("No academic records available for the report.")
+            elif submitted:
+                job_id = Jobs.enqueue("adviser_report", {
+                    "academic_year": selected_academic_year,
+                    "year_level": selected_year_level,
+                    "semester": selected_semester,
+                    "fields": fields,
+                }, created_by=st.session_state.get("username"))
+                st.success(f"Report #{job_id} queued. It will appear below when it is ready.")
+            elif submitted_all:
+                # One report per program, year level and semester of the selected academic year
+                job_id = Jobs.enqueue("adviser_report_batch", {
+                    "academic_year": selected_academic_year,
+                    "fields": fields,
+                }, created_by=st.session_state.get("username"))
+                st.success(f"Reports #{job_id} for all terms queued. The ZIP will appear below when it is ready.")
+
+        st.subheader("Generated Reports")
+        Jobs.render_jobs(kind=("adviser_report", "adviser_report_batch"), created_by=st.session_state.get("username"), key="adviser_report_jobs")
@@ -0,0 +1,346 @@
+import importlib
+import io
+import json
+import os
+import shutil
+import threading
+import time
+import traceback
+import streamlit as st
+import Database
+import Writer
+
+# SQLite backed job queue for work that is too slow to run inside a Streamlit rerun
+# (adviser reports, batch exports, ...). Pages enqueue a job, a pool of worker
+# threads runs it and stores the result in the jobs table (a result that is a file
+# stays on disk, see result_dir), and the page polls the table for progress. Jobs
+# are kept in the database so they survive a page refresh.
+
+WORKERS = int(os.environ.get("STUDENTMONITOR_JOB_WORKERS", "2"))
+POLL_SECONDS = 1.0
+RETRY_BACKOFF_SECONDS = 5
+RETENTION_DAYS = 7
+# Chunk size when a job returns its result as a file, see _store_result_file
+RESULT_CHUNK_BYTES = 1024 * 1024
+
+# Job kind -> "module.function" that runs it. The module is imported by the worker
+# on first use, so queued jobs still run after a server restart.
+JOB_KINDS = {
+    "adviser_report": "Reports.adviser_report_job",
+    "adviser_report_batch": "Reports.adviser_report_batch_job",
+    "transcripts": "Transcripts.transcripts_job",
+    "archive": "Archive.archive_job",
+    "export": "Exports.export_job",
+    "analytics_export": "Analytics.analytics_job",
+}
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+_workers = []
+_workers_lock = threading.Lock()
+
+
+class JobCancelled(Exception):
+    pass
+
+
+# Handed to the job function so it can report progress and notice cancellation
+class JobContext:
+    def __init__(self, conn, job_id, created_by):
+        self.conn = conn
+        self.job_id = job_id
+        self.created_by = created_by
+
+    def cancel_requested(self):
+        cur = self.conn.execute("SELECT CancelRequested FROM jobs WHERE JobID=?", (self.job_id,))
+        row = cur.fetchone()
+        return bool(row and row[0])
+
+    def progress(self, fraction, message=None):
+        self.conn.execute("UPDATE jobs SET Progress=?, Message=? WHERE JobID=?",
+                          (max(0.0, min(1.0, fraction)), message, self.job_id))
+        self.conn.commit()
+        if self.cancel_requested():
+            raise JobCancelled()
+
+
+def _now():
+    return time.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def enqueue(kind, params, created_by=None, max_attempts=3):
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    request = Writer.submit([("job_insert", (kind, json.dumps(params), QUEUED, max_attempts, created_by, _now(),
+                                             "Waiting for a worker"))])
+    request.result()
+    ensure_workers()
+    return request.lastrowid
+
+
+def cancel(job_id):
+    Writer.write_many([
+        ("job_cancel_queued", (CANCELLED, _now(), "Cancelled before it started", job_id, QUEUED)),
+        ("job_cancel_running", (job_id, RUNNING)),
+    ])
+
+
+def retry(job_id):
+    Writer.write("job_retry", (QUEUED, "Waiting for a worker", job_id, FAILED, CANCELLED))
+    ensure_workers()
+
+
+# Everything but the result itself
+_JOB_COLUMNS = """JobID, Kind, Status, Progress, Message, Attempts, MaxAttempts, CreatedBy, CreatedAt,
+    StartedAt, FinishedAt, Error, ResultName, ResultMime"""
+
+
+def get_job(job_id):
+    cur = Database.connect().execute(f"SELECT {_JOB_COLUMNS} FROM jobs WHERE JobID=?", (job_id,))
+    row = cur.fetchone()
+    return dict(zip([column[0] for column in cur.description], row)) if row else None
+
+
+def list_jobs(kind=None, created_by=None, limit=20):
+    conn = Database.connect()
+    query = f"SELECT {_JOB_COLUMNS} FROM jobs"
+    conditions = []
+    params = []
+    if isinstance(kind, (list, tuple)):
+        conditions.append(f"Kind IN ({', '.join('?' for _ in kind)})")
+        params.extend(kind)
+    elif kind is not None:
+        conditions.append("Kind = ?")
+        params.append(kind)
+    if created_by is not None:
+        conditions.append("CreatedBy = ?")
+        params.append(created_by)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY JobID DESC LIMIT ?"
+    params.append(limit)
+    cur = conn.execute(query, params)
+    columns = [column[0] for column in cur.description]
+    return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+
+def get_result(job_id):
+    cur = Database.connect().execute("SELECT Result FROM jobs WHERE JobID=? AND Status=?", (job_id, DONE))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+# The result of a finished job as a binary file: its file on disk when the job
+# returned a file, its stored bytes otherwise. None if there is none (any more).
+def open_result(job_id):
+    cur = Database.connect().execute("SELECT ResultPath FROM jobs WHERE JobID=? AND Status=?", (job_id, DONE))
+    row = cur.fetchone()
+    if row and row[0]:
+        try:
+            return open(row[0], "rb")
+        except OSError:
+            return None
+    data = get_result(job_id)
+    return None if data is None else io.BytesIO(data)
+
+
+# Result files of the jobs, next to the live database unless
+# STUDENTMONITOR_JOB_RESULTS says otherwise
+def result_dir():
+    return os.environ.get("STUDENTMONITOR_JOB_RESULTS") or os.path.splitext(Database.DB_PATH)[0] + ".jobs"
+
+
+def _remove_result_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _claim(conn):
+    cur = conn.execute(
+        "SELECT JobID FROM jobs WHERE Status=? AND NotBefore <= ? ORDER BY JobID LIMIT 1",
+        (QUEUED, time.time())
+    )
+    row = cur.fetchone()
+    if row is None:
+        return None
+    # Another worker may have claimed it in between, the Status check makes this a no-op then
+    cur = conn.execute(
+        "UPDATE jobs SET Status=?, Attempts=Attempts+1, StartedAt=?, Message=? WHERE JobID=? AND Status=?",
+        (RUNNING, _now(), "Started", row[0], QUEUED)
+    )
+    conn.commit()
+    if cur.rowcount != 1:
+        return None
+    cur = conn.execute("SELECT JobID, Kind, Params, Attempts, MaxAttempts, CreatedBy FROM jobs WHERE JobID=?", (row[0],))
+    return cur.fetchone()
+
+
+# Copies a result file into result_dir() in chunks, so a large export is never held
+# in memory as a whole. The download is served from that file (see open_result).
+def _store_result_file(conn, job_id, result_name, result):
+    try:
+        os.makedirs(result_dir(), exist_ok=True)
+        path = os.path.join(result_dir(), f"{job_id}-{os.path.basename(result_name)}")
+        result.seek(0)
+        with open(path + ".tmp", "wb") as out:
+            shutil.copyfileobj(result, out, RESULT_CHUNK_BYTES)
+        os.replace(path + ".tmp", path)
+    finally:
+        result.close()
+    conn.execute("UPDATE jobs SET Result=NULL, ResultPath=? WHERE JobID=?", (path, job_id))
+
+
+def _run_job(conn, job):
+    job_id, kind, params, attempts, max_attempts, created_by = job
+    context = JobContext(conn, job_id, created_by)
+    try:
+        module_name, function_name = JOB_KINDS[kind].rsplit(".", 1)
+        function = getattr(importlib.import_module(module_name), function_name)
+        result = function(context, **json.loads(params))
+        result_name, result_mime, result_data = result if result else (None, None, None)
+        # Jobs return the bytes of the result, stored in the transaction that marks
+        # the job done, or an open file with them, kept on disk
+        if hasattr(result_data, "read"):
+            _store_result_file(conn, job_id, result_name, result_data)
+        else:
+            conn.execute("UPDATE jobs SET Result=?, ResultPath=NULL WHERE JobID=?", (result_data, job_id))
+    except JobCancelled:
+        conn.rollback()
+        conn.execute("UPDATE jobs SET Status=?, FinishedAt=?, Message=? WHERE JobID=?",
+                     (CANCELLED, _now(), "Cancelled", job_id))
+    except Exception as e:
+        conn.rollback()
+        error = traceback.format_exc(limit=5)
+        print(f"Error running job {job_id} ({kind}): {str(e)}")
+        if attempts < max_attempts:
+            # Retry later with exponential backoff
+            delay = RETRY_BACKOFF_SECONDS * 2 ** (attempts - 1)
+            conn.execute("UPDATE jobs SET Status=?, NotBefore=?, Error=?, Message=? WHERE JobID=?",
+                         (QUEUED, time.time() + delay, error, f"Attempt {attempts} failed, retrying in {delay}s", job_id))
+        else:
+            conn.execute("UPDATE jobs SET Status=?, FinishedAt=?, Error=?, Message=? WHERE JobID=?",
+                         (FAILED, _now(), error, f"Failed after {attempts} attempt(s)", job_id))
+    else:
+        conn.execute(
+            """UPDATE jobs SET Status=?, Progress=1, FinishedAt=?, Message=?, Error=NULL,
+            ResultName=?, ResultMime=? WHERE JobID=?""",
+            (DONE, _now(), "Done", result_name, result_mime, job_id)
+        )
+    conn.commit()
+
+
+def _worker():
+    conn = Database.open_connection()
+    while True:
+        try:
+            job = _claim(conn)
+            if job is None:
+                time.sleep(POLL_SECONDS)
+                continue
+            _run_job(conn, job)
+        except Exception as e:
+            # Keep the worker alive, e.g. when the database is briefly locked
+            print(f"Job worker error: {str(e)}")
+            time.sleep(POLL_SECONDS)
+
+
+def _recover(conn):
+    # Jobs left running by a previous server process will never finish, queue them again
+    conn.execute("UPDATE jobs SET Status=?, Message=? WHERE Status=? AND Attempts < MaxAttempts",
+                 (QUEUED, "Requeued after server restart", RUNNING))
+    conn.execute("UPDATE jobs SET Status=?, FinishedAt=?, Message=? WHERE Status=?",
+                 (FAILED, _now(), "Interrupted by server restart", RUNNING))
+    expired = ("Status IN (?, ?, ?) AND FinishedAt < datetime('now', 'localtime', ?)",
+               (DONE, FAILED, CANCELLED, f"-{RETENTION_DAYS} days"))
+    for (path,) in conn.execute(f"SELECT ResultPath FROM jobs WHERE ResultPath IS NOT NULL AND {expired[0]}",
+                                expired[1]).fetchall():
+        _remove_result_file(path)
+    conn.execute(f"DELETE FROM jobs WHERE {expired[0]}", expired[1])
+    conn.commit()
+
+
+def ensure_workers():
+    with _workers_lock:
+        if _workers:
+            return
+        conn = Database.open_connection()
+        _recover(conn)
+        conn.close()
+        for number in range(WORKERS):
+            worker = threading.Thread(target=_worker, name=f"job-worker-{number + 1}", daemon=True)
+            worker.start()
+            _workers.append(worker)
+
+
+def _render_jobs(kind, created_by, limit, key):
+    jobs = list_jobs(kind=kind, created_by=created_by, limit=limit)
+    if not jobs:
+        st.info("No jobs yet.")
+        return
+
+    for job in jobs:
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            st.write(f"**#{job['JobID']} {job['Kind']}** · {job['Status']} · queued {job['CreatedAt']}")
+            st.progress(job['Progress'], text=job['Message'] or job['Status'])
+            if job['Status'] == FAILED and job['Error']:
+                st.caption(job['Error'].strip().splitlines()[-1])
+        with col2:
+            if job['Status'] in (QUEUED, RUNNING):
+                if st.button("Cancel", key=f"{key}_cancel_{job['JobID']}"):
+                    cancel(job['JobID'])
+                    st.rerun()
+            elif job['Status'] == DONE and job['ResultName']:
+                if st.button("Prepare download", key=f"{key}_prepare_{job['JobID']}"):
+                    st.session_state[f"{key}_prepared"] = job['JobID']
+                    # The whole page, the download is rendered outside the job list
+                    st.rerun()
+            elif job['Status'] in (FAILED, CANCELLED):
+                if st.button("Retry", key=f"{key}_retry_{job['JobID']}"):
+                    retry(job['JobID'])
+                    st.rerun()
+
+
+# Download button for the one result the user prepared. Rendered outside the job
+# list, which refreshes every few seconds, so the result is only read on the reruns
+# of the user's own clicks, and only that job's.
+def _render_download(key):
+    job_id = st.session_state.get(f"{key}_prepared")
+    if job_id is None:
+        return
+    job = get_job(job_id)
+    result = open_result(job_id) if job and job['ResultName'] else None
+    if result is None:
+        del st.session_state[f"{key}_prepared"]
+        return
+    col1, col2 = st.columns([4, 1])
+    with col1, result:
+        st.download_button(
+            label=f"Download {job['ResultName']}",
+            data=result,
+            file_name=job['ResultName'],
+            mime=job['ResultMime'],
+            key=f"{key}_download"
+        )
+    with col2:
+        if st.button("Close", key=f"{key}_close"):
+            del st.session_state[f"{key}_prepared"]
+            st.rerun()
+
+
+# Job list with progress bars and cancel/retry/prepare download buttons. Refreshes
+# itself every few seconds on Streamlit versions with fragments, otherwise on demand.
+def render_jobs(kind=None, created_by=None, limit=10, key="jobs"):
+    ensure_workers()
+    _render_download(key)
+    if hasattr(st, "fragment"):
+        st.fragment(run_every=POLL_SECONDS * 2)(_render_jobs)(kind, created_by, limit, key)
+    else:
+        _render_jobs(kind, created_by, limit, key)
+        st.button("Refresh", key=f"{key}_refresh")
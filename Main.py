@@ -1,101 +1,27 @@
 import streamlit as st
-import sqlite3
 from hashlib import sha256
 from streamlit_option_menu import option_menu
-import Home, Student_Registration, Prospectus, Course_Assignment, Grade_Report
+import importlib
+import Database, Tracing, Queries, Writer, Scope
 import string
 import random
 
+# Page modules are imported only when selected so the login form renders without
+# waiting for pandas, plotly and python-docx to load
+PAGES = {
+    "Home": "Home",
+    "Student Registration": "Student_Registration",
+    "Prospectus": "Prospectus",
+    "Course Assignment": "Course_Assignment",
+    "Grade Report": "Grade_Report",
+    "Admin": "Admin",
+}
+
 def hash_password(password):
     return sha256(password.encode()).hexdigest()
 
-# Database connection
-conn = sqlite3.connect('studentmonitor.db')
-cur = conn.cursor()
-
-# Create necessary tables
-cur.execute("""
-CREATE TABLE IF NOT EXISTS adviser (
-    UserName TEXT NOT NULL,
-    Password TEXT NOT NULL,
-    Random_authenticator TEXT NOT NULL,
-    PRIMARY KEY(UserName)
-)""")
-
-cur.execute("""
-CREATE TABLE IF NOT EXISTS student (
-    StudentID TEXT NOT NULL UNIQUE,
-    Name TEXT NOT NULL,
-    BirthDate TEXT NOT NULL,
-    Sex TEXT NOT NULL,
-    Gender TEXT NOT NULL,
-    Religion TEXT NOT NULL,
-    Region TEXT NOT NULL,
-    Province TEXT NOT NULL,
-    Municipality TEXT NOT NULL,
-    Barangay TEXT NOT NULL,
-    Track TEXT NOT NULL,
-    Program TEXT NOT NULL,
-    ContactNumber TEXT NOT NULL,
-    PGName TEXT NOT NULL,
-    PGNumber TEXT NOT NULL,
-    PRIMARY KEY(StudentID)
-)""")
-
-cur.execute("""
-CREATE TABLE IF NOT EXISTS academicrecords (
-    RecordID INTEGER PRIMARY KEY AUTOINCREMENT,
-    StudentID TEXT NOT NULL,
-    ScholasticStatus TEXT NOT NULL,
-    ScholarshipStatus TEXT,
-    AcademicYear TEXT NOT NULL,
-    YearLevel INTEGER NOT NULL,
-    Semester TEXT NOT NULL,
-    UNIQUE(StudentID, AcademicYear, Semester),
-    FOREIGN KEY(StudentID) REFERENCES student(StudentID)
-)""")
-
-cur.execute("""CREATE TABLE IF NOT EXISTS promotion (
-                StudentID INTEGER,
-                AcademicYear TEXT,
-                Semester TEXT,
-                PromotionStatus TEXT
-            )""")
-
-cur.execute("""
-CREATE TABLE IF NOT EXISTS prospectus (
-    CourseCode TEXT NOT NULL UNIQUE,
-    CourseDesc TEXT NOT NULL,
-    Units INTEGER NOT NULL,
-    Semester TEXT NOT NULL,
-    YearLevel TEXT NOT NULL,
-    Classification TEXT NOT NULL,
-    PRIMARY KEY(CourseCode)
-)""")
-
-cur.execute("""
-CREATE TABLE IF NOT EXISTS requisite (
-    CourseCode TEXT,
-    Corequisite TEXT,
-    Prerequisite TEXT,
-    FOREIGN KEY(CourseCode) REFERENCES prospectus(CourseCode)
-)""")
-
-cur.execute("""
-CREATE TABLE IF NOT EXISTS courseassignment (
-    EnrollID INTEGER PRIMARY KEY AUTOINCREMENT,
-    StudentID TEXT NOT NULL,
-    CourseCode TEXT NOT NULL,
-    Grade TEXT,
-    FinalGrade TEXT,
-    GradeStatus TEXT,
-    AcademicYear TEXT,
-    YearLevel TEXT,
-    Semester TEXT,
-    FOREIGN KEY(StudentID) REFERENCES student(StudentID),
-    FOREIGN KEY(CourseCode) REFERENCES prospectus(CourseCode)
-)""")
-
+# Database connection, tables are created by Database.connect() on first use
+conn = Database.connect()
 
 def generate_random_authenticator(length=10):
     characters = string.ascii_letters + string.digits
@@ -124,8 +50,7 @@ def login_form():
 
         if st.button("Login", key="login_button"):
             hashed_password = hash_password(password)
-            cur.execute("SELECT * FROM adviser WHERE Username=? AND Password=?", (username, hashed_password))
-            user = cur.fetchone()
+            user = Queries.fetchone("adviser_login", (username, hashed_password))
 
             if user:
                 st.session_state["authenticated"] = True
@@ -148,19 +73,13 @@ def login_form():
 
         if st.button("Create Account", key="create_account_button"):
             if create_username and create_password:
-                cur.execute("SELECT Username FROM adviser WHERE Username=?", (create_username,))
-                if cur.fetchone():
-                    st.error("Username already exists")
+                hashed_password = hash_password(create_password)
+                random_authenticator = generate_random_authenticator()
+                # Nothing is written when the username is taken or reserved for an admin
+                if Writer.write("adviser_insert", (create_username, hashed_password, random_authenticator)):
+                    st.success(f"Account created successfully. Your authenticator is: {random_authenticator}. Please keep or memorize it as it will be given only once.")
                 else:
-                    hashed_password = hash_password(create_password)
-                    random_authenticator = generate_random_authenticator()
-                    try:
-                        cur.execute("INSERT INTO adviser (Username, Password, Random_authenticator) VALUES (?, ?, ?)",
-                                    (create_username, hashed_password, random_authenticator))
-                        conn.commit()
-                        st.success(f"Account created successfully. Your authenticator is: {random_authenticator}. Please keep or memorize it as it will be given only once.")
-                    except sqlite3.IntegrityError:
-                        st.error("Username already exists")
+                    st.error("Username already exists or is reserved")
             else:
                 st.error("Please enter a username and password")
 
@@ -175,14 +94,11 @@ def login_form():
             if new_password != repeat_password:
                 st.error("Passwords do not match")
             else:
-                cur.execute("SELECT Random_authenticator FROM adviser WHERE Username=? AND Random_authenticator=?",
-                            (forgot_username, random_authenticator))
-                user = cur.fetchone()
+                user = Queries.fetchone("adviser_authenticator", (forgot_username, random_authenticator))
 
                 if user:
                     hashed_new_password = hash_password(new_password)
-                    cur.execute("UPDATE adviser SET Password=? WHERE Username=?", (hashed_new_password, forgot_username))
-                    conn.commit()
+                    Writer.write("adviser_set_password", (hashed_new_password, forgot_username))
                     st.success("Password reset successfully")
                 else:
                     st.error("Invalid username or authenticator")
@@ -190,25 +106,20 @@ def login_form():
 if "authenticated" not in st.session_state:
     st.session_state["authenticated"] = False
 
-conn = sqlite3.connect('studentmonitor.db')
-cur = conn.cursor()
-
-adviser_table = """CREATE TABLE IF NOT EXISTS adviser (
-                Username TEXT NOT NULL,
-                Password TEXT NOT NULL,
-                Random_authenticator TEXT NOT NULL,
-                PRIMARY KEY(Username))"""
-cur.execute(adviser_table)
-
 if st.session_state["authenticated"]:
     if st.session_state["username"]:
         st.success(f"Welcome {st.session_state['username']}")
         st.sidebar.success("Successfully Logged in!")
         with st.sidebar:
+            menu_options = ["Home", "Student Registration", "Prospectus", "Course Assignment", "Grade Report"]
+            menu_icons = ["house-fill", "person-lines-fill", "book-fill", "list-columns-reverse", "bar-chart-line-fill"]
+            if Database.is_admin(st.session_state["username"]):
+                menu_options.append("Admin")
+                menu_icons.append("shield-lock-fill")
             app = option_menu(
                 menu_title="Main Menu",
-                options=["Home", "Student Registration", "Prospectus", "Course Assignment", "Grade Report"],
-                icons=["house-fill", "person-lines-fill", "book-fill", "list-columns-reverse", "bar-chart-line-fill"],
+                options=menu_options,
+                icons=menu_icons,
                 menu_icon="cast",
                 default_index=0,
             )
@@ -219,22 +130,18 @@ if st.session_state["authenticated"]:
                 st.info("Logged out successfully!")
                 st.experimental_rerun()
 
+            Scope.render_toggle()
+
             if st.sidebar.button("Log out"):
                 logout()
 
         st.markdown("# Student Monitoring System")
-        if app == "Home":
-            Home.app()
-        if app == "Student Registration":
-            Student_Registration.app()
-        if app == "Prospectus":
-            Prospectus.app()
-        if app == "Course Assignment":
-            Course_Assignment.app()
-        if app == "Grade Report":
-            Grade_Report.app()
+        # Times the rerun and groups the queries issued while rendering the page,
+        # reruns slower than Tracing.SLOW_RERUN_MS are written to the rerunlog table
+        with Tracing.run(app, username=st.session_state["username"], state=st.session_state, log_slow=True):
+            page = importlib.import_module(PAGES[app])
+            page.app()
 
 else:
-    login_form()
-
-conn.close()
\ No newline at end of file
+    with Tracing.run("Login", state=st.session_state, log_slow=True):
+        login_form()
\ No newline at end of file
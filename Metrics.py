@@ -0,0 +1,496 @@
+from collections import defaultdict
+import pandas as pd
+import Changelog
+import Database
+import Frames
+import Queries
+import Replica
+
+# GPA, CGPA, awardee and rate calculations shared by the Home dashboards and the
+# adviser report. Nothing in here touches Streamlit so it can run in job workers.
+# The per-student and per-term queries read the *_base tables directly so that the
+# year level and semester filters are integer index seeks (see Database.CODED_TABLES).
+# All reads go to the read replica (see Replica), callers wrap a whole dashboard or
+# report in Replica.snapshot() to get figures from one moment. calculate_rates()
+# covers past academic years and reads the history_* views, which include the
+# archived students (see Archive.py); everything else is about current students.
+# Per student and term GPA and CGPA are kept in the term_gpa table, updated from the
+# changelog (see Changelog.py) for the students whose grades changed.
+
+NSTP_COURSES = ('NST001', 'NST002')
+# Grades left out of the GPA entirely
+NON_GPA_GRADES = ('W', 'P', 'F', 'INPROG')
+
+
+# Extra condition limiting a query to the students of one program (all students when None)
+def _program_filter(program, column="StudentID", students="student"):
+    if program is None:
+        return "", ()
+    return f" AND {column} IN (SELECT StudentID FROM {students} WHERE Program = ?)", (program,)
+
+
+# Extra condition limiting a query to the students assigned to one adviser (all
+# students when None). The IN list is read from the adviser's adviser_student key
+# range and looked up in the StudentID index of the table.
+def _adviser_filter(adviser, column="StudentID"):
+    if adviser is None:
+        return "", ()
+    return f" AND {column} IN (SELECT StudentID FROM adviser_student WHERE UserName = ?)", (adviser,)
+
+
+def list_programs():
+    return [row[0] for row in Queries.fetchall("student_programs", conn=Replica.connect())]
+
+
+def calculate_rates(academic_year, program=None, adviser=None):
+    cur = Replica.connect().cursor()
+    where, params = _program_filter(program, students="history_student")
+    adviser_where, adviser_params = _adviser_filter(adviser)
+    where += adviser_where
+    params += adviser_params
+    # The academic year as a TermKey range, "up to" the year is everything below its end
+    first_term, last_term = Database.academic_year_terms(academic_year)
+    in_year = (first_term, last_term) + params
+    cur.execute("SELECT COUNT(StudentID) FROM history_academicrecords_base WHERE TermKey <= ?" + where, (last_term,) + params)
+    student_total = cur.fetchone()[0]
+
+    cur.execute("SELECT COUNT(StudentID) FROM history_academicrecords_base WHERE YearLevel = 1 AND TermKey BETWEEN ? AND ?" + where, in_year)
+    initial_cohort_size = cur.fetchone()[0]
+
+    cur.execute("SELECT COUNT(StudentID) FROM history_academicrecords_base WHERE YearLevel IN (1, 2, 3, 4) AND TermKey BETWEEN ? AND ?" + where, in_year)
+    current_students = cur.fetchone()[0]
+    retention_rate = (current_students / initial_cohort_size) * 100 if initial_cohort_size > 0 else 0
+
+    cur.execute("SELECT COUNT(StudentID) FROM history_academicrecords_base WHERE ScholasticStatus = 'Graduate' AND TermKey BETWEEN ? AND ?" + where, in_year)
+    graduate_count = cur.fetchone()[0]
+    completion_rate = (graduate_count / student_total) * 100 if student_total > 0 else 0
+
+    cur.execute("SELECT COUNT(StudentID) FROM history_promotion_base WHERE PromotionStatus = '1' AND TermKey BETWEEN ? AND ?" + where, in_year)
+    promotion_count = cur.fetchone()[0]
+    promotion_rate = (promotion_count / student_total) * 100 if student_total > 0 else 0
+
+    cur.execute("SELECT COUNT(StudentID) FROM history_courseassignment_base WHERE GradeStatusCode = ? AND TermKey BETWEEN ? AND ?" + where,
+                (Database.code("gradestatuscode", "Failed"),) + in_year)
+    fail_count = cur.fetchone()[0]
+    failure_rate = (fail_count / student_total) * 100 if student_total > 0 else 0
+
+    cur.execute("SELECT COUNT(StudentID) FROM history_academicrecords_base WHERE ScholasticStatus = 'Dropped' AND TermKey BETWEEN ? AND ?" + where, in_year)
+    dropout_count = cur.fetchone()[0]
+    dropout_rate = (dropout_count / student_total) * 100 if student_total > 0 else 0
+
+    return {
+        "student_total": student_total,
+        "retention_rate": retention_rate,
+        "completion_rate": completion_rate,
+        "promotion_rate": promotion_rate,
+        "failure_rate": failure_rate,
+        "dropout_rate": dropout_rate,
+        "fail_count": fail_count,
+        "dropout_count": dropout_count
+    }
+
+def calculate_gpa(student_id, year_level, semester):
+    cur = Replica.connect().cursor()
+    cur.execute("""
+        SELECT g.Label, f.Label, p.Units
+        FROM courseassignment_base ca
+        JOIN prospectus_base p ON ca.CourseCode = p.CourseCode
+        JOIN gradecode g ON g.Code = ca.GradeCode
+        LEFT JOIN gradecode f ON f.Code = ca.FinalGradeCode
+        WHERE ca.StudentID = ? AND ca.YearLevel = ? AND ca.SemesterCode = ?
+          AND g.Label NOT IN ('W', 'P', 'F', 'INPROG') 
+          AND ca.CourseCode NOT IN ('NST001', 'NST002')
+    """, (student_id, year_level, Database.code("semestercode", semester)))
+    return _gpa_from_rows(cur.fetchall())
+
+# GPA from (Grade, FinalGrade, Units) rows that already exclude NSTP and NON_GPA_GRADES
+def _gpa_from_rows(grades):
+    if not grades:
+        return None
+
+    total_units = 0
+    weighted_sum = 0.0
+
+    for grade in grades:
+        initial_grade = grade[0]
+        final_grade = grade[1]
+        units = grade[2]
+
+        if initial_grade in ['INC', 'INPROG']:
+            if final_grade and final_grade.strip() != '':
+                try:
+                    weighted_sum += float(final_grade) * units
+                    total_units += units
+                except ValueError:
+                    continue  # Skip this grade if final grade cannot be converted to float
+        else:
+            try:
+                weighted_sum += float(initial_grade) * units
+                total_units += units
+            except ValueError:
+                continue  # Skip this grade if initial grade cannot be converted to float
+
+    if total_units > 0:
+        gpa_value = round(weighted_sum / total_units, 2)
+    else:
+        gpa_value = 0.0
+
+    return gpa_value
+
+# GPA of every student with courses in the term, from term_gpa
+def calculate_awardees(year_level, semester, adviser=None):
+    cur = Replica.connect().cursor()
+    where, params = _adviser_filter(adviser)
+    cur.execute("""
+        SELECT COALESCE(SUM(GPA BETWEEN 1.0 AND 1.20), 0), COALESCE(SUM(GPA BETWEEN 1.21 AND 1.45), 0),
+               COALESCE(SUM(GPA BETWEEN 1.46 AND 1.75), 0)
+        FROM term_gpa WHERE YearLevel = ? AND SemesterCode = ?""" + where,
+        (year_level, Database.code("semestercode", semester)) + params)
+    rl_count, cl_count, dl_count = cur.fetchone()
+
+    return {
+        "rl_count": rl_count,
+        "cl_count": cl_count,
+        "dl_count": dl_count
+    }
+
+def calculate_counts(year_level, semester, adviser=None):
+    cur = Replica.connect().cursor()
+    semester_code = Database.code("semestercode", semester)
+    where, params = _adviser_filter(adviser)
+    cur.execute("SELECT COUNT(StudentID) FROM courseassignment_base WHERE GradeCode = ? AND YearLevel = ? AND SemesterCode = ?" + where,
+                (Database.code("gradecode", "INC"), year_level, semester_code) + params)
+    inc_count = cur.fetchone()[0]
+
+    cur.execute("SELECT COUNT(StudentID) FROM academicrecords_base WHERE ScholasticStatus = 'Withdrawn' AND YearLevel = ? AND SemesterCode = ?" + where,
+                (year_level, semester_code) + params)
+    withdrawn_count = cur.fetchone()[0]
+
+    cur.execute("SELECT COUNT(StudentID) FROM courseassignment_base WHERE GradeStatusCode = ? AND YearLevel = ? AND SemesterCode = ?" + where,
+                (Database.code("gradestatuscode", "Failed"), year_level, semester_code) + params)
+    fail_count = cur.fetchone()[0]
+
+    return {
+        "inc_count": inc_count,
+        "withdrawn_count": withdrawn_count,
+        "fail_count": fail_count,
+        **calculate_awardees(year_level, semester, adviser)
+    }
+
+# Per course pass/fail/drop counts of one term for the Counts tab
+def course_status_counts(year_level, semester, adviser=None):
+    passed = Database.code("gradestatuscode", "Passed")
+    params = (semester, passed, Database.code("gradestatuscode", "Failed"), Database.code("gradestatuscode", "Dropout"),
+              Database.code("gradestatuscode", "Withdrawn"), passed, year_level, Database.code("semestercode", semester))
+    name, params = Queries.scoped("course_status_counts", params, adviser)
+    return Queries.read_sql(name, params, conn=Replica.connect(), categorize=False)
+
+def calculate_cgpa(student_id, year_level, semester):
+    cur = Replica.connect().cursor()
+    cur.execute("""
+        SELECT g.Label, f.Label, p.Units
+        FROM courseassignment_base ca
+        JOIN prospectus_base p ON ca.CourseCode = p.CourseCode
+        LEFT JOIN gradecode g ON g.Code = ca.GradeCode
+        LEFT JOIN gradecode f ON f.Code = ca.FinalGradeCode
+        WHERE ca.StudentID = ? AND ca.YearLevel = ? AND ca.SemesterCode = ?
+    """, (student_id, year_level, Database.code("semestercode", semester)))
+    return _cgpa_from_rows(cur.fetchall())
+
+# CGPA from (Grade, FinalGrade, Units) rows of one student and term
+def _cgpa_from_rows(rows):
+    total_units = 0
+    total_grade_points = 0
+    
+    for row in rows:
+        units = float(row[2])  # Convert units to float
+        final_grade = row[1]  # FinalGrade from courseassignment table
+        
+        # Consider only final grades for CGPA calculation
+        if final_grade is not None and final_grade.strip():  # Check if final_grade is not empty or None
+            try:
+                grade_points = float(final_grade) * units
+                total_grade_points += grade_points
+                total_units += units
+            except ValueError:
+                continue  # Skip this grade if final grade cannot be converted to float
+    
+    if total_units == 0:
+        return None  # No units found for the student
+    
+    cgpa = total_grade_points / total_units
+    return cgpa
+
+
+# Grade points of one course as shown on the Grade Evaluation screen, None when the
+# course does not count (W, P, F, INPROG or no grade yet)
+def grade_point(initial_grade, final_grade):
+    if not isinstance(initial_grade, str) or initial_grade.strip() == "" or initial_grade.strip() in ["W", "P", "F", "INPROG"]:
+        return None
+
+    final_missing = not isinstance(final_grade, str) or final_grade.strip() == ""
+    if initial_grade.strip() == "INC":
+        if final_missing:
+            return 5.00  # Default value for INC with no final grade
+        try:
+            return float(final_grade)
+        except ValueError:
+            return 0.00
+    elif initial_grade.strip() == "DRP":
+        return 5.00  # DRP equivalent to 5.00
+    elif final_missing:
+        try:
+            return float(initial_grade)  # Use initial grade as final grade if no final grade provided
+        except ValueError:
+            return 0.00
+    else:
+        try:
+            return float(final_grade)
+        except ValueError:
+            try:
+                return float(initial_grade)  # Use initial grade if final grade cannot be converted
+            except ValueError:
+                return 0.00  # Return 0.00 if neither can be converted
+
+def get_initial_grade_value(initial_grade, final_grade):
+    if initial_grade in ["1.00", "1.25", "1.50", "1.75", "2.00", "2.25", "2.50", "2.75", "3.00"]:
+        return float(initial_grade)
+    elif initial_grade in ["INC", "INPROG"] and final_grade in ["1.00", "1.25", "1.50", "1.75", "2.00", "2.25", "2.50", "2.75", "3.00"]:
+        return float(final_grade)
+    elif initial_grade == "5.00":
+        return 5.00
+    else:
+        return None
+def calc_gpa(grades_df):
+    gpa_data = []
+    for student_id, group in grades_df.groupby('StudentID', observed=True):
+        valid_grades = group[~group['CourseCode'].isin(['NST001', 'NST002'])]
+        valid_grades['GradePoint'] = valid_grades.apply(lambda row: get_initial_grade_value(row['Grade'], row['FinalGrade']), axis=1)
+        valid_grades.dropna(subset=['GradePoint'], inplace=True)
+        total_units = valid_grades['Units'].sum()
+        weighted_sum = (valid_grades['Units'] * valid_grades['GradePoint']).sum()
+        if total_units > 0:
+            gpa = weighted_sum / total_units
+            gpa_data.append((student_id, gpa))
+    return pd.DataFrame(gpa_data, columns=['StudentID', 'GPA'])
+
+def calc_cgpa(grades_df):
+    cgpa_data = []
+    for student_id, group in grades_df.groupby('StudentID', observed=True):
+        running_total_units = 0
+        running_weighted_sum = 0
+        valid_grades = group[~group['CourseCode'].isin(['NST001', 'NST002'])]
+        valid_grades['GradePoint'] = valid_grades.apply(lambda row: get_initial_grade_value(row['Grade'], row['FinalGrade']), axis=1)
+        valid_grades.dropna(subset=['GradePoint'], inplace=True)
+        running_total_units += valid_grades['Units'].sum()
+        running_weighted_sum += (valid_grades['Units'] * valid_grades['GradePoint']).sum()
+        if running_total_units > 0:
+            cgpa = round(running_weighted_sum / running_total_units, 5)
+            cgpa_data.append((student_id, cgpa))
+    return pd.DataFrame(cgpa_data, columns=['StudentID', 'CGPA'])
+
+def get_all_student_grades(program=None, adviser=None):
+    where, params = _program_filter(program, "ca.StudentID")
+    adviser_where, adviser_params = _adviser_filter(adviser, "ca.StudentID")
+    where += adviser_where
+    params += adviser_params
+    query = """
+        SELECT ca.StudentID, ca.CourseCode, p.Units, ca.Grade, ca.FinalGrade, ca.YearLevel, ca.Semester
+        FROM courseassignment ca
+        JOIN prospectus p ON ca.CourseCode = p.CourseCode
+        WHERE 1 = 1""" + where
+    grade_df = Frames.read_sql(query, Replica.connect(), params=params,
+                               dtypes={"StudentID": "category", "CourseCode": "category"})
+    return grade_df
+
+def calculate_average_gpa_cgpa_all(program=None, adviser=None):
+    final_grades_df = get_all_student_grades(program, adviser)
+    all_year_levels = final_grades_df['YearLevel'].unique()
+    all_semesters = final_grades_df['Semester'].unique()
+    
+    avg_gpa_cgpa_data = []
+    
+    for year_level in all_year_levels:
+        for semester in all_semesters:
+            selected_grades_df = final_grades_df[(final_grades_df['YearLevel'] == year_level) & 
+                                                (final_grades_df['Semester'] == semester)]
+            gpa_df = calc_gpa(selected_grades_df)
+            cgpa_df = calc_cgpa(selected_grades_df)
+            avg_gpa = gpa_df['GPA'].mean() if not gpa_df.empty else None
+            avg_cgpa = cgpa_df['CGPA'].mean() if not cgpa_df.empty else None
+            avg_gpa_cgpa_data.append((year_level, semester, avg_gpa, avg_cgpa))
+    
+    avg_gpa_cgpa_df = pd.DataFrame(avg_gpa_cgpa_data, columns=['YearLevel', 'Semester', 'AverageGPA', 'AverageCGPA'])
+    return avg_gpa_cgpa_df
+
+
+# Number of students above/below a 2.50 GPA and CGPA for one year level and semester,
+# counting the students with an academic record, from term_gpa
+def gpa_distribution(year_level, semester, adviser=None):
+    cur = Replica.connect().cursor()
+    where, params = _adviser_filter(adviser)
+    cur.execute("""
+        SELECT COALESCE(SUM(GPA > 2.5), 0), COALESCE(SUM(GPA <= 2.5), 0),
+               COALESCE(SUM(CGPA > 2.5), 0), COALESCE(SUM(CGPA <= 2.5), 0)
+        FROM term_gpa WHERE YearLevel = ? AND SemesterCode = ?
+          AND StudentID IN (SELECT StudentID FROM academicrecords_base)""" + where,
+        (year_level, Database.code("semestercode", semester)) + params)
+    below_25_gpa, above_25_gpa, below_25_cgpa, above_25_cgpa = cur.fetchone()
+
+    return {
+        "below_25_gpa": below_25_gpa,
+        "above_25_gpa": above_25_gpa,
+        "below_25_cgpa": below_25_cgpa,
+        "above_25_cgpa": above_25_cgpa
+    }
+
+
+# calculate_counts() and gpa_distribution() for many terms at once, from one pass
+# over the grades instead of a query per student and term. Used by the batch
+# adviser report; returns {(year_level, semester): {...}} for every requested term.
+def term_metrics(terms, program=None):
+    cur = Replica.connect().cursor()
+    where, params = _program_filter(program, "ca.StudentID")
+    cur.execute("""
+        SELECT ca.StudentID, ca.YearLevel, ca.Semester, ca.CourseCode, ca.Grade, ca.FinalGrade, ca.GradeStatus, p.Units
+        FROM courseassignment ca
+        LEFT JOIN prospectus p ON ca.CourseCode = p.CourseCode
+        WHERE 1 = 1""" + where, params)
+
+    inc_counts = defaultdict(int)
+    fail_counts = defaultdict(int)
+    term_students = defaultdict(set)
+    gpa_rows = defaultdict(list)
+    cgpa_rows = defaultdict(list)
+    for student_id, year_level, semester, course_code, grade, final_grade, grade_status, units in cur.fetchall():
+        term = (str(year_level), semester)
+        if grade == 'INC':
+            inc_counts[term] += 1
+        if grade_status == 'Failed':
+            fail_counts[term] += 1
+        term_students[term].add(student_id)
+        if units is None:
+            continue  # Course missing from the prospectus, same as the inner join in calculate_gpa
+        cgpa_rows[term + (student_id,)].append((grade, final_grade, units))
+        if grade is not None and grade not in NON_GPA_GRADES and course_code not in NSTP_COURSES:
+            gpa_rows[term + (student_id,)].append((grade, final_grade, units))
+
+    where, params = _program_filter(program)
+    cur.execute("""
+        SELECT YearLevel, Semester, COUNT(StudentID) FROM academicrecords
+        WHERE ScholasticStatus = 'Withdrawn'""" + where + """
+        GROUP BY YearLevel, Semester""", params)
+    withdrawn_counts = {(str(year_level), semester): count for year_level, semester, count in cur.fetchall()}
+
+    cur.execute("SELECT DISTINCT StudentID FROM academicrecords WHERE 1 = 1" + where, params)
+    record_students = [row[0] for row in cur.fetchall()]
+
+    results = {}
+    for year_level, semester in terms:
+        term = (str(year_level), semester)
+        metrics = {
+            "inc_count": inc_counts[term],
+            "withdrawn_count": withdrawn_counts.get(term, 0),
+            "fail_count": fail_counts[term],
+            "rl_count": 0, "cl_count": 0, "dl_count": 0,
+            "below_25_gpa": 0, "above_25_gpa": 0, "below_25_cgpa": 0, "above_25_cgpa": 0,
+        }
+
+        # Same bands as calculate_awardees()
+        for student_id in term_students[term]:
+            gpa = _gpa_from_rows(gpa_rows.get(term + (student_id,)))
+            if gpa is not None:
+                if 1.0 <= gpa <= 1.20:
+                    metrics["rl_count"] += 1
+                elif 1.21 <= gpa <= 1.45:
+                    metrics["cl_count"] += 1
+                elif 1.46 <= gpa <= 1.75:
+                    metrics["dl_count"] += 1
+
+        # Same split as gpa_distribution()
+        for student_id in record_students:
+            gpa = _gpa_from_rows(gpa_rows.get(term + (student_id,)))
+            cgpa = _cgpa_from_rows(cgpa_rows.get(term + (student_id,), []))
+            if gpa is not None:
+                if gpa > 2.5:
+                    metrics["below_25_gpa"] += 1
+                else:
+                    metrics["above_25_gpa"] += 1
+            if cgpa is not None:
+                if cgpa > 2.5:
+                    metrics["below_25_cgpa"] += 1
+                else:
+                    metrics["above_25_cgpa"] += 1
+
+        results[(year_level, semester)] = metrics
+    return results
+
+
+
+# term_gpa rows of the given students, or of everyone when student_ids is None. Same
+# arithmetic as calculate_gpa() and calculate_cgpa(), one row per student and term
+# with course assignments.
+def _refresh_term_gpa(conn, student_ids=None):
+    if student_ids is None:
+        conn.execute("DELETE FROM term_gpa")
+        where = ""
+    else:
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS term_gpa_students (StudentID TEXT PRIMARY KEY)")
+        conn.execute("DELETE FROM temp.term_gpa_students")
+        conn.executemany("INSERT OR IGNORE INTO temp.term_gpa_students (StudentID) VALUES (?)",
+                         [(student_id,) for student_id in student_ids])
+        conn.execute("DELETE FROM term_gpa WHERE StudentID IN (SELECT StudentID FROM temp.term_gpa_students)")
+        where = " AND ca.StudentID IN (SELECT StudentID FROM temp.term_gpa_students)"
+    cur = conn.execute("""
+        SELECT ca.StudentID, ca.YearLevel, ca.SemesterCode, ca.CourseCode, g.Label, f.Label, p.Units
+        FROM courseassignment_base ca
+        LEFT JOIN prospectus_base p ON p.CourseCode = ca.CourseCode
+        LEFT JOIN gradecode g ON g.Code = ca.GradeCode
+        LEFT JOIN gradecode f ON f.Code = ca.FinalGradeCode
+        WHERE ca.YearLevel IS NOT NULL AND ca.SemesterCode IS NOT NULL""" + where)
+
+    gpa_rows = defaultdict(list)
+    cgpa_rows = defaultdict(list)
+    for student_id, year_level, semester_code, course_code, grade, final_grade, units in cur.fetchall():
+        term = (student_id, year_level, semester_code)
+        cgpa_rows[term]
+        if units is None:
+            continue  # Course missing from the prospectus, same as the inner join in calculate_gpa
+        cgpa_rows[term].append((grade, final_grade, units))
+        if grade is not None and grade not in NON_GPA_GRADES and course_code not in NSTP_COURSES:
+            gpa_rows[term].append((grade, final_grade, units))
+    conn.executemany("INSERT INTO term_gpa (StudentID, YearLevel, SemesterCode, GPA, CGPA) VALUES (?, ?, ?, ?, ?)",
+                     [term + (_gpa_from_rows(gpa_rows.get(term)), _cgpa_from_rows(rows))
+                      for term, rows in cgpa_rows.items()])
+
+
+# Changelog consumer for term_gpa: recomputes the students whose course assignments
+# changed and the students taking a course whose units changed
+def apply_term_gpa_changes(conn, changes):
+    student_ids = set()
+    course_codes = set()
+    for change in changes:
+        changed = change["Changes"] or {}
+        if change["TableName"] == "prospectus_base":
+            if change["Operation"] != "U" or "Units" in changed or "CourseCode" in changed:
+                course_codes.add(change["RowKey"])
+                if "CourseCode" in changed and change["Operation"] == "U":
+                    course_codes.add(changed["CourseCode"][0])
+        else:
+            student_ids.add(change["StudentID"])
+            if "StudentID" in changed and change["Operation"] == "U":
+                student_ids.add(str(changed["StudentID"][0]))
+    if course_codes:
+        cur = conn.execute(f"SELECT DISTINCT StudentID FROM courseassignment_base WHERE CourseCode IN "
+                           f"({', '.join('?' * len(course_codes))})", list(course_codes))
+        student_ids.update(row[0] for row in cur.fetchall())
+    if student_ids:
+        _refresh_term_gpa(conn, student_ids)
+
+
+def rebuild_term_gpa(conn):
+    _refresh_term_gpa(conn)
+
+
+Changelog.register("term_gpa", apply_term_gpa_changes, rebuild_term_gpa,
+                   tables=("courseassignment_base", "prospectus_base"))
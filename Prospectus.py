@@ -1,129 +1,78 @@
 import streamlit as st
-import calendar
-from datetime import datetime
 import pandas as pd
-import numpy as np
 from streamlit_option_menu import option_menu
-import pickle
-from pathlib import Path
-import streamlit_authenticator as stauth
-from streamlit_pandas_profiling import st_profile_report
-import sqlite3
-import plotly.express as px
+import Database
+import Queries
+import Writer
 import re
 
+# Parameters of the prospectus_term query
+def term_params(lvl, sem):
+    return (sem, lvl, Database.code("semestercode", sem))
 
-conn = sqlite3.connect('studentmonitor.db', check_same_thread=False)
-cur = conn.cursor()
 
-def app():
-    def createProspectus():
-        cur.execute(
-            """CREATE TABLE IF NOT EXISTS prospectus (
-            CourseCode TEXT NOT NULL UNIQUE,
-            CourseDesc TEXT NOT NULL,
-            Units INTEGER NOT NULL,
-            Semester TEXT NOT NULL,
-            YearLevel TEXT NOT NULL,
-            Classification TEXT NOT NULL,
-            PRIMARY KEY(CourseCode))"""
-        )
+# Rows where every search term appears (case-insensitively) in the course code,
+# description or classification, or equals the units, like the old LIKE filter
+def search_courses(df, search_terms):
+    mask = pd.Series(True, index=df.index)
+    for term in search_terms:
+        term_mask = pd.Series(False, index=df.index)
+        for column in ("CourseCode", "CourseDesc", "Classification"):
+            term_mask |= df[column].astype(str).str.contains(term, case=False, regex=False)
+        try:
+            term_mask |= df["Units"] == float(term)
+        except ValueError:
+            pass
+        mask &= term_mask
+    return df[mask].reset_index(drop=True)
+
 
+def app():
+    # 0 rows written means the CourseCode was taken (insert) or not found (update, delete)
     def addProspectus(CourseCode, CourseDesc, Units, Semester, YearLevel, Classification):
-        cur.execute("SELECT CourseCode FROM prospectus WHERE CourseCode=?", (CourseCode,))
-        if cur.fetchone():
+        if not Writer.write("prospectus_insert", (CourseCode, CourseDesc, Units, Semester, YearLevel, Classification)):
             st.warning("This CourseCode already exists.")
             return False
-        cur.execute("INSERT INTO prospectus (CourseCode, CourseDesc, Units, Semester, YearLevel, Classification) VALUES (?,?,?,?,?,?)",
-                    (CourseCode, CourseDesc, Units, Semester, YearLevel, Classification))
-        conn.commit()
         return True
 
     def updateProspectus(CourseCode, CourseDesc, Units, Semester, YearLevel, Classification):
-        cur.execute("SELECT CourseCode FROM prospectus WHERE CourseCode=?", (CourseCode,))
-        if cur.fetchone() is None:
+        if not Writer.write("prospectus_update", (CourseDesc, Units, Semester, YearLevel, Classification, CourseCode)):
             st.warning("This CourseCode does not exist.")
             return False
-        cur.execute("UPDATE prospectus SET CourseDesc=?, Units=?, Semester=?, YearLevel=?, Classification=? WHERE CourseCode=?",
-                    (CourseDesc, Units, Semester, YearLevel, Classification, CourseCode))
-        conn.commit()
         return True
 
     def deleteProspectus(CourseCode):
-        cur.execute("SELECT CourseCode FROM prospectus WHERE CourseCode=?", (CourseCode,))
-        if cur.fetchone() is None:
+        if not Writer.write("prospectus_delete", (CourseCode,)):
             st.warning("This CourseCode does not exist.")
             return False
-        cur.execute("DELETE FROM prospectus WHERE CourseCode=?", (CourseCode,))
-        conn.commit()
-        return True       
+        return True
 
     def get_prospectus_details(CourseCode):
-        cur.execute("SELECT * FROM prospectus WHERE CourseCode=?", (CourseCode,))
-        return cur.fetchone()
-
-    def fetch_prospectus_data(lvl, sem):
-        query = f"""
-        SELECT p.CourseCode, p.Units, p.Semester, p.YearLevel, p.Classification, r.Prerequisite, r.Corequisite
-        FROM prospectus p
-        LEFT JOIN requisite r ON p.CourseCode = r.CourseCode
-        WHERE p.YearLevel LIKE '%{lvl}%' AND p.Semester LIKE '%{sem}%'
-        """
-        prospectus = pd.read_sql_query(query, conn)
-        return prospectus
+        return Queries.fetchone("prospectus_details", (CourseCode,))
 
     def fetch_all_prospectus_data():
-        query = """
-        SELECT p.CourseCode, p.CourseDesc, p.Units, p.Semester, p.YearLevel, p.Classification, r.Prerequisite, r.Corequisite
-        FROM prospectus p
-        LEFT JOIN requisite r ON p.CourseCode = r.CourseCode"""
-        all_prospectus = pd.read_sql_query(query, conn)
-        return all_prospectus
+        return Queries.read_sql("prospectus_with_requisites")
 
     def get_summer_record_count(lvl):
-        cur.execute(f"SELECT COUNT(*) FROM prospectus WHERE YearLevel LIKE '%{lvl}%' AND Semester LIKE '%Summer%'")
-        return cur.fetchone()[0]
-
-    def createRequisite():
-        cur.execute(
-            """CREATE TABLE IF NOT EXISTS requisite (
-            CourseCode TEXT,
-            Corequisite TEXT,
-            Prerequisite TEXT,
-            FOREIGN KEY(CourseCode) REFERENCES prospectus(CourseCode))"""
-        )
+        return Queries.fetchone("prospectus_term_count", (lvl, Database.code("semestercode", "Summer")))[0]
 
     def updateRequisite(CourseCode, Prerequisite, Corequisite):
-        cur.execute("SELECT CourseCode FROM requisite WHERE CourseCode=?", (CourseCode,))
-        if cur.fetchone() is None:
-            cur.execute("INSERT INTO requisite (CourseCode, Prerequisite, Corequisite) VALUES (?,?,?)",
-                        (CourseCode, Prerequisite, Corequisite))
-        else:
-            cur.execute("UPDATE requisite SET Prerequisite=?, Corequisite=? WHERE CourseCode=?",
-                        (Prerequisite, Corequisite, CourseCode))
-        conn.commit()
+        Writer.write("requisite_upsert", (CourseCode, Prerequisite, Corequisite))
 
     def get_prerequisite_details(CourseCode):
-        cur.execute("SELECT Prerequisite FROM requisite WHERE CourseCode=?", (CourseCode,))
-        req = cur.fetchone()
+        req = Queries.fetchone("requisite_prerequisite", (CourseCode,))
         if req:
             return req
         else:
             return []
     
     def get_corequisite_details(CourseCode):
-        cur.execute("SELECT Corequisite FROM requisite WHERE CourseCode=?", (CourseCode,))
-        req = cur.fetchone()
+        req = Queries.fetchone("requisite_corequisite", (CourseCode,))
         if req:
             return req
         else:
             return []
 
-    def fetch_all_prospectus():
-        query = "SELECT CourseCode, CourseDesc FROM prospectus"
-        prospectus = pd.read_sql_query(query, conn)
-        return prospectus
-
     # Set up session state to store operation success
     if 'operation_success' not in st.session_state:
         st.session_state.operation_success = None
@@ -156,8 +105,7 @@ def app():
         # ------------ INPUT AND SAVE PERIODS ------------
         st.header("Course Registration")
 
-        cur.execute("SELECT CourseCode, CourseDesc FROM prospectus")
-        prospectus = cur.fetchall()
+        prospectus = Queries.fetchall("prospectus_courses")
         prospectus_dict = {coursecode: sid for sid, coursecode in prospectus}
 
         selected_coursedesc = st.selectbox("Select Course to Update", options=[""] + list(prospectus_dict.keys()))
@@ -269,38 +217,23 @@ def app():
         # Search term input
         search_query = st.text_input("Search", "")
 
+        # Requisites are stored as descriptions, shown as course codes
+        requisite_dict = prospectus_data.set_index('CourseDesc')['CourseCode'].to_dict()
+
         all_data = []
         for lvl in yearlevel:
             for sem in semester:
                 if sem == "Summer" and get_summer_record_count(lvl) == 0:
                     continue
 
-                # Construct SQL query with filters
-                query = f"""
-                SELECT p.CourseCode, p.CourseDesc, p.Units, p.Semester, p.YearLevel, p.Classification, 
-                    r.Prerequisite AS PrereqCode, r.Corequisite AS CoreqCode
-                FROM prospectus p
-                LEFT JOIN requisite r ON p.CourseCode = r.CourseCode
-                WHERE p.YearLevel LIKE '%{lvl}%' AND p.Semester LIKE '%{sem}%'"""
+                prospectus_data = Queries.read_sql("prospectus_term", term_params(lvl, sem), categorize=False)
 
                 # Add search condition if search_query is not empty
                 if search_query:
                     # Split search_query into individual terms
-                    search_terms = search_query.split()
-                    conditions = []
-
-                    for term in search_terms:
-                        conditions.append(f"(p.CourseCode LIKE '%{term}%' OR p.CourseDesc LIKE '%{term}%' OR p.Units = '{term}' OR p.Classification LIKE '%{term}%')")
-
-                    query += " AND " + " AND ".join(conditions)
-
-                # Fetch data based on constructed query
-                prospectus_data = pd.read_sql_query(query, conn)
+                    prospectus_data = search_courses(prospectus_data, search_query.split())
 
                 if not prospectus_data.empty:
-                    requisite_data = fetch_all_prospectus_data()
-                    requisite_dict = requisite_data.set_index('CourseDesc')['CourseCode'].to_dict()
-
                     def map_requisites(requisites):
                         if requisites:
                             return ', '.join([requisite_dict.get(req.strip(), req.strip()) for req in requisites.split(', ')])
@@ -327,4 +260,4 @@ def app():
                 data=csv_data,
                 file_name="Prospectus.csv",
                 mime="text/csv",
-            )
\ No newline at end of file
+            )
\ No newline at end of file
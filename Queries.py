@@ -0,0 +1,526 @@
+import threading
+import time
+import Database
+
+# Named SQL for the pages. Every statement is a fixed, parameterized string, so the
+# sqlite3 statement cache of each connection (Database.STATEMENT_CACHE_SIZE entries,
+# keyed by the SQL text) prepares it once and reuses it on every rerun. Calls go
+# through execute()/fetchone()/fetchall()/read_sql() by name, which also keep per
+# name call counts and timings for the Admin page.
+#
+# Queries on the *_base tables take lookup codes (Database.code) instead of labels.
+#
+# Writes are one statement each, so they are atomic on their own and their rowcount
+# tells the page whether anything matched: inserts upsert on the table's unique key
+# (Database.NATURAL_KEYS) and report 0 rows for an existing key. They go to the
+# *_base tables because writes through the views always report 0 rows and cannot
+# upsert; labels are turned into codes in the statement (execute() first adds the
+# labels that are new, see LABEL_PARAMS) and TermKey comes from Database.term_key_sql.
+#
+# Queries named "<name>_of_adviser" are <name> limited to the students assigned to
+# one adviser (adviser_student), driven by its (UserName, StudentID) key. They take
+# the adviser's UserName as the last parameter, see scoped().
+
+# Code of a label in one of Database.CODE_TABLES
+def _code(table, label):
+    return f"(SELECT Code FROM {table} WHERE Label = {label})"
+
+
+# Database.ADMIN_USERS as an SQL list of lower case string literals
+def _reserved_usernames():
+    return ", ".join("'" + name.lower().replace("'", "''") + "'" for name in Database.ADMIN_USERS)
+
+
+QUERIES = {
+    # adviser (login screen)
+    "adviser_login": "SELECT * FROM adviser WHERE Username=? AND Password=?",
+    # Nothing is written for a taken or reserved username (Database.ADMIN_USERS)
+    "adviser_insert": (
+        "INSERT INTO adviser (Username, Password, Random_authenticator) SELECT ?1, ?2, ?3 "
+        f"WHERE lower(?1) NOT IN ({_reserved_usernames()}) ON CONFLICT (UserName) DO NOTHING"
+    ),
+    "adviser_authenticator": "SELECT Random_authenticator FROM adviser WHERE Username=? AND Random_authenticator=?",
+    "adviser_set_password": "UPDATE adviser SET Password=? WHERE Username=?",
+    "adviser_names": "SELECT UserName FROM adviser ORDER BY UserName",
+
+    # adviser_student (Admin page)
+    "adviser_student_ids": "SELECT StudentID FROM adviser_student WHERE UserName=?",
+    "adviser_has_students": "SELECT 1 FROM adviser_student WHERE UserName=? LIMIT 1",
+    "adviser_student_insert": (
+        "INSERT INTO adviser_student (UserName, StudentID) VALUES (?, ?) ON CONFLICT (UserName, StudentID) DO NOTHING"
+    ),
+    "adviser_student_delete": "DELETE FROM adviser_student WHERE UserName=? AND StudentID=?",
+    "adviser_student_delete_of_student": "DELETE FROM adviser_student WHERE StudentID=?",
+    "adviser_student_counts": (
+        "SELECT a.UserName, COUNT(s.StudentID) AS Students FROM adviser a "
+        "LEFT JOIN adviser_student s ON s.UserName = a.UserName GROUP BY a.UserName ORDER BY a.UserName"
+    ),
+
+    # student
+    "student_names": "SELECT StudentID, Name FROM student",
+    "student_names_of_adviser": (
+        "SELECT s.StudentID, s.Name FROM adviser_student a JOIN student s ON s.StudentID = a.StudentID WHERE a.UserName = ?"
+    ),
+    "student_programs": "SELECT DISTINCT Program FROM student ORDER BY Program",
+    "student_details": "SELECT * FROM student WHERE StudentID=?",
+    "student_insert": (
+        "INSERT INTO student (StudentID, Name, BirthDate, Sex, Gender, Religion, Region, Province, Municipality, Barangay, "
+        "Track, Program, ContactNumber, PGName, PGNumber) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?) "
+        "ON CONFLICT (StudentID) DO NOTHING"
+    ),
+    "student_update": (
+        "UPDATE student SET Name=?, BirthDate=?, Sex=?, Gender=?, Religion=?, Region=?, Province=?, Municipality=?, "
+        "Barangay=?, Track=?, Program=?, ContactNumber=?, PGName=?, PGNumber=? WHERE StudentID=?"
+    ),
+    "student_delete": "DELETE FROM student WHERE StudentID=?",
+
+    # academicrecords
+    # Archived years too, needs a connection with the archive attached (Replica.connect)
+    "academic_years": "SELECT DISTINCT AcademicYear FROM history_academicrecords ORDER BY AcademicYear",
+    "academic_record_insert": f"""
+        INSERT INTO academicrecords_base (StudentID, ScholasticStatus, ScholarshipStatus, TermKey, YearLevel, SemesterCode)
+        SELECT g.StudentID, g.ScholasticStatus, g.ScholarshipStatus, {Database.term_key_sql("g.AcademicYear", "s.Code")}, g.YearLevel, s.Code
+        FROM (SELECT ? AS StudentID, ? AS ScholasticStatus, ? AS ScholarshipStatus, ? AS AcademicYear, ? AS YearLevel, ? AS Semester) g
+        LEFT JOIN semestercode s ON s.Label = g.Semester
+        WHERE true
+        ON CONFLICT (StudentID, TermKey) DO NOTHING""",
+    # The term is matched by the academic year as the pages show it (see the term table)
+    "academic_record_update": f"""
+        UPDATE academicrecords_base SET YearLevel=?, ScholasticStatus=?, ScholarshipStatus=?
+        WHERE StudentID=? AND TermKey = (SELECT TermKey FROM term WHERE AcademicYear = ? AND SemesterCode = {_code("semestercode", "?")})""",
+    "academic_record_delete": f"""
+        DELETE FROM academicrecords_base
+        WHERE StudentID=? AND TermKey = (SELECT TermKey FROM term WHERE AcademicYear = ? AND SemesterCode = {_code("semestercode", "?")})""",
+    "academic_record_terms": """
+        SELECT ar.AcademicYear, ar.Semester
+        FROM academicrecords ar
+        WHERE ar.StudentID = ?
+        GROUP BY ar.AcademicYear, ar.Semester
+        ORDER BY MIN(ar.TermKey)""",
+    "academic_record_of_term": """
+        SELECT ar.YearLevel, ar.ScholasticStatus, ar.ScholarshipStatus
+        FROM academicrecords ar
+        WHERE ar.StudentID = ? AND ar.AcademicYear=? AND ar.Semester = ?""",
+    "academic_records_of_student": (
+        "SELECT ar.AcademicYear, ar.YearLevel, ar.Semester, ar.ScholasticStatus, ar.ScholarshipStatus "
+        "FROM academicrecords ar "
+        "WHERE ar.StudentID = ? "
+        "ORDER BY ar.TermKey"
+    ),
+    "student_directory": (
+        "SELECT s.StudentID, s.Name, s.Sex, s.Gender, s.Religion, s.Region, s.Province, s.Municipality, s.Barangay, "
+        "s.Track, s.Program, ar.ScholasticStatus, ar.ScholarshipStatus, s.ContactNumber, s.PGName, s.PGNumber, "
+        "ar.AcademicYear, ar.Semester, ar.YearLevel, "
+        "ROW_NUMBER() OVER(PARTITION BY ar.AcademicYear, ar.YearLevel, ar.Semester ORDER BY ar.TermKey, ar.YearLevel) AS SemesterSequence "
+        "FROM academicrecords ar "
+        "JOIN student s ON ar.StudentID = s.StudentID "
+        "ORDER BY ar.TermKey"
+    ),
+    "student_directory_of_adviser": (
+        "SELECT s.StudentID, s.Name, s.Sex, s.Gender, s.Religion, s.Region, s.Province, s.Municipality, s.Barangay, "
+        "s.Track, s.Program, ar.ScholasticStatus, ar.ScholarshipStatus, s.ContactNumber, s.PGName, s.PGNumber, "
+        "ar.AcademicYear, ar.Semester, ar.YearLevel, "
+        "ROW_NUMBER() OVER(PARTITION BY ar.AcademicYear, ar.YearLevel, ar.Semester ORDER BY ar.TermKey, ar.YearLevel) AS SemesterSequence "
+        "FROM adviser_student a "
+        "JOIN student s ON s.StudentID = a.StudentID "
+        "JOIN academicrecords ar ON ar.StudentID = a.StudentID "
+        "WHERE a.UserName = ? "
+        "ORDER BY ar.TermKey"
+    ),
+
+    # prospectus and requisite
+    "prospectus_courses": "SELECT CourseCode, CourseDesc FROM prospectus",
+    "prospectus_courses_of_term": "SELECT CourseCode, CourseDesc FROM prospectus WHERE YearLevel = ? AND Semester = ?",
+    "prospectus_details": "SELECT * FROM prospectus WHERE CourseCode=?",
+    "prospectus_insert": f"""
+        INSERT INTO prospectus_base (CourseCode, CourseDesc, Units, SemesterCode, YearLevel, Classification)
+        VALUES (?, ?, ?, {_code("semestercode", "?")}, ?, ?)
+        ON CONFLICT (CourseCode) DO NOTHING""",
+    "prospectus_update": (
+        f"UPDATE prospectus_base SET CourseDesc=?, Units=?, SemesterCode={_code('semestercode', '?')}, YearLevel=?, "
+        "Classification=? WHERE CourseCode=?"
+    ),
+    "prospectus_delete": "DELETE FROM prospectus_base WHERE CourseCode=?",
+    "prospectus_total_units": "SELECT SUM(Units) as TotalUnits FROM prospectus",
+    "prospectus_with_requisites": """
+        SELECT p.CourseCode, p.CourseDesc, p.Units, p.Semester, p.YearLevel, p.Classification, r.Prerequisite, r.Corequisite
+        FROM prospectus p
+        LEFT JOIN requisite r ON p.CourseCode = r.CourseCode""",
+    # Courses of one year level and semester with their requisites. Exact matches on
+    # the base table columns so idx_prospectus_term is used; params: (semester label,
+    # year level, semester code)
+    "prospectus_term": """
+        SELECT p.CourseCode, p.CourseDesc, p.Units, ? AS Semester, CAST(p.YearLevel AS TEXT) AS YearLevel, p.Classification,
+            r.Prerequisite AS PrereqCode, r.Corequisite AS CoreqCode
+        FROM prospectus_base p
+        LEFT JOIN requisite r ON p.CourseCode = r.CourseCode
+        WHERE p.YearLevel = ? AND p.SemesterCode = ?""",
+    "prospectus_term_count": "SELECT COUNT(*) FROM prospectus_base WHERE YearLevel = ? AND SemesterCode = ?",
+    "requisite_of_course": "SELECT Prerequisite, Corequisite FROM requisite WHERE CourseCode = ?",
+    "requisite_upsert": (
+        "INSERT INTO requisite (CourseCode, Prerequisite, Corequisite) VALUES (?,?,?) "
+        "ON CONFLICT (CourseCode) DO UPDATE SET Prerequisite = excluded.Prerequisite, Corequisite = excluded.Corequisite"
+    ),
+    "requisite_prerequisite": "SELECT Prerequisite FROM requisite WHERE CourseCode=?",
+    "requisite_corequisite": "SELECT Corequisite FROM requisite WHERE CourseCode=?",
+
+    # courseassignment
+    "course_taken": "SELECT EnrollID FROM courseassignment WHERE StudentID = ? AND CourseCode = ?",
+    # Nothing is written when the student already has the course in that term
+    "course_assignment_insert": f"""
+        INSERT INTO courseassignment_base
+            (StudentID, CourseCode, GradeCode, FinalGradeCode, GradeStatusCode, TermKey, YearLevel, SemesterCode)
+        SELECT g.StudentID, g.CourseCode, {_code("gradecode", "g.Grade")}, {_code("gradecode", "g.FinalGrade")},
+            {_code("gradestatuscode", "g.GradeStatus")}, {Database.term_key_sql("g.AcademicYear", "s.Code")}, g.YearLevel, s.Code
+        FROM (SELECT ? AS StudentID, ? AS CourseCode, ? AS Grade, ? AS FinalGrade, ? AS GradeStatus, ? AS AcademicYear,
+            ? AS YearLevel, ? AS Semester) g
+        LEFT JOIN semestercode s ON s.Label = g.Semester
+        WHERE true
+        ON CONFLICT (StudentID, CourseCode, TermKey) DO NOTHING""",
+    # By EnrollID, so a retake and the first attempt of a course are changed separately
+    "course_assignment_delete": "DELETE FROM courseassignment_base WHERE EnrollID = ?",
+    # Moves the row to another semester of the same academic year; params: (semester,
+    # year level, EnrollID)
+    "course_assignment_set_term": f"""
+        UPDATE courseassignment_base
+        SET YearLevel = ?2, SemesterCode = {_code("semestercode", "?1")}, TermKey = TermKey / 100 * 100 + {_code("semestercode", "?1")}
+        WHERE EnrollID = ?3""",
+    "course_assignment_set_grade": (
+        f"UPDATE courseassignment_base SET GradeCode = {_code('gradecode', '?')}, FinalGradeCode = {_code('gradecode', '?')}, "
+        f"GradeStatusCode = {_code('gradestatuscode', '?')} WHERE EnrollID = ?"
+    ),
+    "course_assignment_years": (
+        "SELECT DISTINCT AcademicYear FROM courseassignment WHERE AcademicYear IS NOT NULL ORDER BY AcademicYear"
+    ),
+    "course_assignments": (
+        "SELECT ca.EnrollID, ca.StudentID, ca.CourseCode, ca.Semester, ca.YearLevel, ca.AcademicYear "
+        "FROM courseassignment ca "
+        "ORDER BY ca.YearLevel DESC, ca.Semester DESC"
+    ),
+    "course_assignments_of_adviser": (
+        "SELECT ca.EnrollID, ca.StudentID, ca.CourseCode, ca.Semester, ca.YearLevel, ca.AcademicYear "
+        "FROM adviser_student a "
+        "JOIN courseassignment ca ON ca.StudentID = a.StudentID "
+        "WHERE a.UserName = ? "
+        "ORDER BY ca.YearLevel DESC, ca.Semester DESC"
+    ),
+    "course_units_of_student": (
+        "SELECT ca.StudentID, ca.CourseCode, p.CourseDesc, p.Units "
+        "FROM courseassignment ca "
+        "JOIN prospectus p ON ca.CourseCode = p.CourseCode "
+        "WHERE ca.StudentID = ?"
+    ),
+    "course_directory_of_student": (
+        "SELECT ca.StudentID, ca.CourseCode, p.CourseDesc, ca.Semester, ca.YearLevel, p.Units "
+        "FROM courseassignment ca "
+        "JOIN prospectus p ON ca.CourseCode = p.CourseCode "
+        "WHERE ca.StudentID = ? "
+        "ORDER BY ca.YearLevel DESC, ca.Semester DESC"
+    ),
+    "course_assignment_counts": (
+        "SELECT AcademicYear, Semester, CourseCode, COUNT(*) as Count "
+        "FROM courseassignment "
+        "WHERE AcademicYear IS NOT NULL "
+        "GROUP BY AcademicYear, Semester, CourseCode"
+    ),
+    "course_assignment_counts_of_adviser": (
+        "SELECT ca.AcademicYear, ca.Semester, ca.CourseCode, COUNT(*) as Count "
+        "FROM adviser_student a "
+        "JOIN courseassignment ca ON ca.StudentID = a.StudentID "
+        "WHERE ca.AcademicYear IS NOT NULL AND a.UserName = ? "
+        "GROUP BY ca.AcademicYear, ca.Semester, ca.CourseCode"
+    ),
+    "course_assignment_students": "SELECT COUNT(DISTINCT StudentID) as TotalStudents FROM courseassignment",
+    "course_assignment_students_of_adviser": (
+        "SELECT COUNT(DISTINCT a.StudentID) as TotalStudents FROM adviser_student a "
+        "WHERE a.UserName = ? AND EXISTS (SELECT 1 FROM courseassignment_base ca WHERE ca.StudentID = a.StudentID)"
+    ),
+    # params: (number of students, academic year, semester)
+    "course_not_taken_of_term": (
+        "SELECT CourseCode, ? - COUNT(*) as NotTaken "
+        "FROM courseassignment "
+        "WHERE AcademicYear = ? AND Semester = ? "
+        "GROUP BY CourseCode"
+    ),
+    "course_not_taken_of_term_of_adviser": (
+        "SELECT ca.CourseCode, ? - COUNT(*) as NotTaken "
+        "FROM adviser_student a "
+        "JOIN courseassignment ca ON ca.StudentID = a.StudentID "
+        "WHERE ca.AcademicYear = ? AND ca.Semester = ? AND a.UserName = ? "
+        "GROUP BY ca.CourseCode"
+    ),
+    "grades_of_student": """
+        SELECT ca.EnrollID, ca.StudentID, ca.CourseCode, p.CourseDesc, ca.Grade, ca.FinalGrade, ca.GradeStatus, p.Units, ca.Semester, ca.YearLevel
+        FROM courseassignment ca
+        JOIN prospectus p ON ca.CourseCode = p.CourseCode
+        WHERE ca.StudentID = ?
+        ORDER BY ca.YearLevel, ca.Semester""",
+    # Per course pass/fail/drop counts of one term for the Counts tab, answered from
+    # idx_courseassignment_term_course alone; params: (semester label, Passed, Failed,
+    # Dropout, Withdrawn, Passed status codes, year level, semester code)
+    "course_status_counts": """
+        SELECT p.CourseCode, p.CourseDesc, p.Units, ? AS Semester, CAST(ca.YearLevel AS TEXT) AS YearLevel,
+        SUM(CASE WHEN ca.GradeStatusCode = ? THEN 1 ELSE 0 END) as PassedCount,
+        SUM(CASE WHEN ca.GradeStatusCode = ? THEN 1 ELSE 0 END) as FailedCount,
+        SUM(CASE WHEN ca.GradeStatusCode = ? THEN 1 ELSE 0 END) as DroppedCount,
+        SUM(CASE WHEN ca.GradeStatusCode = ? THEN 1 ELSE 0 END) as WithdrawnCount,
+        SUM(CASE WHEN ca.GradeStatusCode != ? THEN 1 ELSE 0 END) as RetakeCount
+        FROM courseassignment_base ca
+        JOIN prospectus_base p ON p.CourseCode = ca.CourseCode
+        WHERE ca.YearLevel = ? AND ca.SemesterCode = ?
+        GROUP BY ca.CourseCode""",
+    "course_status_counts_of_adviser": """
+        SELECT p.CourseCode, p.CourseDesc, p.Units, ? AS Semester, CAST(ca.YearLevel AS TEXT) AS YearLevel,
+        SUM(CASE WHEN ca.GradeStatusCode = ? THEN 1 ELSE 0 END) as PassedCount,
+        SUM(CASE WHEN ca.GradeStatusCode = ? THEN 1 ELSE 0 END) as FailedCount,
+        SUM(CASE WHEN ca.GradeStatusCode = ? THEN 1 ELSE 0 END) as DroppedCount,
+        SUM(CASE WHEN ca.GradeStatusCode = ? THEN 1 ELSE 0 END) as WithdrawnCount,
+        SUM(CASE WHEN ca.GradeStatusCode != ? THEN 1 ELSE 0 END) as RetakeCount
+        FROM adviser_student a
+        JOIN courseassignment_base ca ON ca.StudentID = a.StudentID
+        JOIN prospectus_base p ON p.CourseCode = ca.CourseCode
+        WHERE ca.YearLevel = ? AND ca.SemesterCode = ? AND a.UserName = ?
+        GROUP BY ca.CourseCode""",
+
+    # promotion: one row per student with courses in the term, promotion_upsert keeps
+    # one decision per student and term
+    "promotion_candidates": """
+        SELECT ca.AcademicYear, ca.Semester, ca.StudentID, s.Name, MAX(ca.YearLevel) AS YearLevel
+        FROM courseassignment ca
+        JOIN student s ON ca.StudentID = s.StudentID
+        WHERE ca.AcademicYear = ? AND ca.Semester = ?
+        GROUP BY ca.StudentID""",
+    "promotion_candidates_of_adviser": """
+        SELECT ca.AcademicYear, ca.Semester, ca.StudentID, s.Name, MAX(ca.YearLevel) AS YearLevel
+        FROM adviser_student a
+        JOIN student s ON s.StudentID = a.StudentID
+        JOIN courseassignment ca ON ca.StudentID = a.StudentID
+        WHERE ca.AcademicYear = ? AND ca.Semester = ? AND a.UserName = ?
+        GROUP BY ca.StudentID""",
+    # Promoting the same students again replaces their earlier decision for that term
+    "promotion_upsert": f"""
+        INSERT INTO promotion_base (StudentID, TermKey, SemesterCode, PromotionStatus)
+        SELECT g.StudentID, {Database.term_key_sql("g.AcademicYear", "s.Code")}, s.Code, g.PromotionStatus
+        FROM (SELECT ? AS StudentID, ? AS AcademicYear, ? AS Semester, ? AS PromotionStatus) g
+        LEFT JOIN semestercode s ON s.Label = g.Semester
+        WHERE true
+        ON CONFLICT (StudentID, TermKey) DO UPDATE SET PromotionStatus = excluded.PromotionStatus""",
+
+    # jobs (see Jobs.py), the writes of the pages. Workers update the jobs they run on
+    # their own connection.
+    "job_insert": (
+        "INSERT INTO jobs (Kind, Params, Status, MaxAttempts, CreatedBy, CreatedAt, Message) VALUES (?,?,?,?,?,?,?)"
+    ),
+    "job_cancel_queued": "UPDATE jobs SET Status=?, FinishedAt=?, Message=? WHERE JobID=? AND Status=?",
+    "job_cancel_running": "UPDATE jobs SET CancelRequested=1 WHERE JobID=? AND Status=?",
+    "job_retry": (
+        "UPDATE jobs SET Status=?, Attempts=0, NotBefore=0, CancelRequested=0, Progress=0, Error=NULL, Message=?, "
+        "StartedAt=NULL, FinishedAt=NULL WHERE JobID=? AND Status IN (?, ?)"
+    ),
+
+    # rerunlog (see Tracing.log_slow_rerun)
+    "rerunlog_insert": (
+        "INSERT INTO rerunlog (LoggedAt, UserName, Page, DurationMs, QueryCount, QueryMs, Sections, WidgetState, Error) "
+        "VALUES (?,?,?,?,?,?,?,?,?)"
+    ),
+    "rerunlog_rotate": "DELETE FROM rerunlog WHERE LogID <= (SELECT MAX(LogID) FROM rerunlog) - ?",
+
+    # exports (see Exports.py). Read row by row into the file, so they are ordered by
+    # an index instead of sorted as a whole: records by idx_academicrecords_termkey,
+    # course assignments by student (idx_courseassignment_student_term)
+    "export_student_directory": """
+        SELECT s.StudentID, s.Name, s.Sex, s.Gender, s.Religion, s.Region, s.Province, s.Municipality, s.Barangay,
+               s.Track, s.Program, ar.ScholasticStatus, ar.ScholarshipStatus, s.ContactNumber, s.PGName, s.PGNumber,
+               ar.AcademicYear, ar.Semester, ar.YearLevel
+        FROM academicrecords ar
+        JOIN student s ON ar.StudentID = s.StudentID
+        ORDER BY ar.TermKey""",
+    "export_student_directory_of_adviser": """
+        SELECT s.StudentID, s.Name, s.Sex, s.Gender, s.Religion, s.Region, s.Province, s.Municipality, s.Barangay,
+               s.Track, s.Program, ar.ScholasticStatus, ar.ScholarshipStatus, s.ContactNumber, s.PGName, s.PGNumber,
+               ar.AcademicYear, ar.Semester, ar.YearLevel
+        FROM adviser_student a
+        JOIN student s ON s.StudentID = a.StudentID
+        JOIN academicrecords ar ON ar.StudentID = a.StudentID
+        WHERE a.UserName = ?
+        ORDER BY ar.TermKey""",
+    "export_course_directory": """
+        SELECT ca.StudentID, s.Name, ca.AcademicYear, ca.YearLevel, ca.Semester, ca.CourseCode, p.CourseDesc, p.Units
+        FROM courseassignment ca
+        JOIN student s ON s.StudentID = ca.StudentID
+        JOIN prospectus p ON p.CourseCode = ca.CourseCode
+        ORDER BY ca.StudentID, ca.TermKey""",
+    "export_course_directory_of_adviser": """
+        SELECT ca.StudentID, s.Name, ca.AcademicYear, ca.YearLevel, ca.Semester, ca.CourseCode, p.CourseDesc, p.Units
+        FROM adviser_student a
+        JOIN student s ON s.StudentID = a.StudentID
+        JOIN courseassignment ca ON ca.StudentID = a.StudentID
+        JOIN prospectus p ON p.CourseCode = ca.CourseCode
+        WHERE a.UserName = ?
+        ORDER BY a.StudentID, ca.TermKey""",
+    "export_grades": """
+        SELECT ca.StudentID, s.Name, s.Program, ca.AcademicYear, ca.YearLevel, ca.Semester, ca.CourseCode, p.CourseDesc,
+               p.Units, ca.Grade, ca.FinalGrade, ca.GradeStatus
+        FROM courseassignment ca
+        JOIN student s ON s.StudentID = ca.StudentID
+        JOIN prospectus p ON p.CourseCode = ca.CourseCode
+        ORDER BY ca.StudentID, ca.TermKey""",
+    "export_grades_of_adviser": """
+        SELECT ca.StudentID, s.Name, s.Program, ca.AcademicYear, ca.YearLevel, ca.Semester, ca.CourseCode, p.CourseDesc,
+               p.Units, ca.Grade, ca.FinalGrade, ca.GradeStatus
+        FROM adviser_student a
+        JOIN student s ON s.StudentID = a.StudentID
+        JOIN courseassignment ca ON ca.StudentID = a.StudentID
+        JOIN prospectus p ON p.CourseCode = ca.CourseCode
+        WHERE a.UserName = ?
+        ORDER BY a.StudentID, ca.TermKey""",
+}
+
+# Column dtypes of the frames read_sql() returns, see Frames.astype; the _of_adviser
+# variants use the entry of their query. Labels that repeat down the rows are
+# categoricals, free text is "string". Semester, YearLevel, Grade, FinalGrade and
+# GradeStatus are always ordered categoricals (Frames.CATEGORY_ORDER).
+DTYPES = {
+    "student_directory": {
+        "StudentID": "category", "Name": "category", "Sex": "category", "Gender": "category",
+        "Religion": "category", "Region": "category", "Province": "category", "Municipality": "category",
+        "Barangay": "category", "Track": "category", "Program": "category", "ScholasticStatus": "category",
+        "ScholarshipStatus": "category", "ContactNumber": "category", "PGName": "category",
+        "PGNumber": "category", "AcademicYear": "category", "SemesterSequence": "int32",
+    },
+    "course_assignments": {
+        "EnrollID": "int32", "StudentID": "category", "CourseCode": "category", "AcademicYear": "category",
+    },
+    "course_directory_of_student": {"StudentID": "category", "CourseCode": "category", "CourseDesc": "string"},
+    "prospectus_with_requisites": {
+        "CourseCode": "string", "CourseDesc": "string", "Classification": "category",
+        "Prerequisite": "string", "Corequisite": "string",
+    },
+}
+
+# Parameters of the writes above that are labels of a Database.CODE_TABLES table, by
+# position. execute() gives a label that is not in its table yet the next free code
+# before the write, as the INSTEAD OF triggers of the views do, so both write paths
+# store new labels (a "Midyear" semester, the blank grade) instead of NULL.
+LABEL_PARAMS = {
+    "academic_record_insert": {5: "semestercode"},
+    "prospectus_insert": {3: "semestercode"},
+    "prospectus_update": {2: "semestercode"},
+    "course_assignment_insert": {2: "gradecode", 3: "gradecode", 4: "gradestatuscode", 7: "semestercode"},
+    "course_assignment_set_term": {0: "semestercode"},
+    "course_assignment_set_grade": {0: "gradecode", 1: "gradecode", 2: "gradestatuscode"},
+    "promotion_upsert": {2: "semestercode"},
+}
+
+# name -> [calls, total seconds, slowest call in seconds, rows]
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def sql(name):
+    return QUERIES[name]
+
+
+# Name and params of a query for one adviser's students, or of the query itself when
+# adviser is None (the department-wide view)
+def scoped(name, params=(), adviser=None):
+    if adviser is None:
+        return name, tuple(params)
+    return f"{name}_of_adviser", tuple(params) + (adviser,)
+
+
+def dtypes(name):
+    return DTYPES.get(name.removesuffix("_of_adviser"))
+
+
+def _record(name, elapsed, rows):
+    with _stats_lock:
+        stats = _stats.setdefault(name, [0, 0.0, 0.0, 0])
+        stats[0] += 1
+        stats[1] += elapsed
+        stats[2] = max(stats[2], elapsed)
+        stats[3] += rows
+
+
+def _add_labels(conn, name, params):
+    for index, table in LABEL_PARAMS.get(name, {}).items():
+        label = params[index]
+        if label is not None and label not in Database.CODE_TABLES[table]:
+            conn.execute(f"INSERT OR IGNORE INTO {table} (Label) VALUES (?)", (label,))
+
+
+# Runs a named query and returns the cursor, for INSERT/UPDATE/DELETE. conn defaults
+# to the shared page connection.
+def execute(name, params=(), conn=None):
+    conn = conn or Database.connect()
+    _add_labels(conn, name, params)
+    cur = conn.cursor()
+    start = time.perf_counter()
+    try:
+        cur.execute(QUERIES[name], params)
+    finally:
+        _record(name, time.perf_counter() - start, max(cur.rowcount, 0))
+    return cur
+
+
+def fetchone(name, params=(), conn=None):
+    cur = (conn or Database.connect()).cursor()
+    start = time.perf_counter()
+    row = None
+    try:
+        row = cur.execute(QUERIES[name], params).fetchone()
+    finally:
+        _record(name, time.perf_counter() - start, 0 if row is None else 1)
+    return row
+
+
+def fetchall(name, params=(), conn=None):
+    cur = (conn or Database.connect()).cursor()
+    start = time.perf_counter()
+    rows = []
+    try:
+        rows = cur.execute(QUERIES[name], params).fetchall()
+    finally:
+        _record(name, time.perf_counter() - start, len(rows))
+    return rows
+
+
+# DataFrame of a named query. The coded columns come back as ordered categoricals
+# (see Frames.read_sql, columns limits which ones), categorize=False keeps plain
+# object columns.
+def read_sql(name, params=None, conn=None, columns=None, categorize=True):
+    # Imported here so the login screen does not load pandas
+    import pandas as pd
+    import Frames
+
+    conn = conn or Database.connect()
+    start = time.perf_counter()
+    df = None
+    try:
+        if categorize:
+            df = Frames.read_sql(QUERIES[name], conn, params=params, columns=columns, dtypes=dtypes(name))
+        else:
+            df = pd.read_sql_query(QUERIES[name], conn, params=params)
+    finally:
+        _record(name, time.perf_counter() - start, 0 if df is None else len(df))
+    return df
+
+
+# Per name totals since server start, slowest in total first
+def stats():
+    with _stats_lock:
+        snapshot = {name: list(values) for name, values in _stats.items()}
+    rows = [{
+        "Query": name,
+        "Calls": calls,
+        "TotalMs": round(total * 1000, 2),
+        "AvgMs": round(total * 1000 / calls, 3),
+        "MaxMs": round(slowest * 1000, 2),
+        "Rows": rows,
+    } for name, (calls, total, slowest, rows) in snapshot.items()]
+    return sorted(rows, key=lambda row: row["TotalMs"], reverse=True)
+
+
+def reset():
+    with _stats_lock:
+        _stats.clear()
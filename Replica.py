@@ -0,0 +1,212 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+import Archive
+import Changelog
+import Database
+
+# Read replica for the dashboards and the adviser reports. A background thread
+# copies the live database into a separate file every REFRESH_SECONDS with the
+# sqlite3 online backup API, PAGES_PER_STEP pages at a time so grade entry is only
+# paused for one small step at a time. Analytics reads (Metrics, Home, Reports) go
+# to the copy through connect(), so they no longer compete with data entry for the
+# live database. Wrap a dashboard tab or a report in snapshot() to run all of its
+# queries in one read transaction: every number then comes from the same moment.
+# The figures can be up to REFRESH_SECONDS old. Set STUDENTMONITOR_READ_REPLICA=0
+# to read the live database instead. Every connection handed out has the archive
+# attached, with its history_* views (see Archive.py). The archive is copied along
+# with the live database, both from one read transaction, so a student moved by
+# Archive.run() is in exactly one of the two copies. Until the first copy is made
+# the live database is served.
+#
+# Summary tables fed from the changelog are brought up to date by the same thread,
+# right before each copy, or every REFRESH_SECONDS when the replica is off (see
+# Changelog.py). Page reruns never run the consumers themselves.
+
+ENABLED = os.environ.get("STUDENTMONITOR_READ_REPLICA", "1") != "0"
+REFRESH_SECONDS = float(os.environ.get("STUDENTMONITOR_REPLICA_REFRESH", "30"))
+PAGES_PER_STEP = int(os.environ.get("STUDENTMONITOR_REPLICA_PAGES", "1024"))
+STEP_SLEEP_SECONDS = 0.005
+# Idle reader connections kept open for the next snapshot
+POOL_SIZE = 8
+
+_refresher = None
+_refresher_lock = threading.Lock()
+_stopping = threading.Event()
+_refresh_lock = threading.Lock()
+_status = {"RefreshedAt": None, "Seconds": None, "Pages": None, "Refreshes": 0, "Error": None}
+_pool = []
+_pool_lock = threading.Lock()
+_shared = None
+_live_attached = None
+_local = threading.local()
+
+
+# Next to the live database unless STUDENTMONITOR_REPLICA_DB says otherwise.
+# Looked up on every call, scripts may point Database.DB_PATH elsewhere.
+def replica_path():
+    return os.environ.get("STUDENTMONITOR_REPLICA_DB") or os.path.splitext(Database.DB_PATH)[0] + ".replica.db"
+
+
+# Copy of the archive, attached to the replica connections
+def replica_archive_path():
+    return os.path.splitext(replica_path())[0] + ".archive.db"
+
+
+# Copies the live database and the archive into the replica files. Readers of the
+# replica keep their snapshot while it is rewritten (the copies are in WAL mode).
+def refresh():
+    with _refresh_lock:
+        start = time.perf_counter()
+        Changelog.run_consumers()
+        pages = {}
+        source = Database.open_connection()
+        try:
+            Archive.attach(source)
+            # One read transaction over both files, held for both copies
+            source.execute("BEGIN")
+            for schema in ("main", "archive"):
+                source.execute(f"SELECT COUNT(*) FROM {schema}.sqlite_master").fetchone()
+            for schema, path in (("main", replica_path()), ("archive", replica_archive_path())):
+                target = sqlite3.connect(path)
+                try:
+                    target.execute("PRAGMA journal_mode = WAL")
+                    source.backup(target, pages=PAGES_PER_STEP, name=schema, sleep=STEP_SLEEP_SECONDS,
+                                  progress=lambda status, remaining, total, schema=schema: pages.update({schema: total}))
+                finally:
+                    target.close()
+            source.rollback()
+        finally:
+            source.close()
+        _status.update(RefreshedAt=time.strftime("%Y-%m-%d %H:%M:%S"), Seconds=round(time.perf_counter() - start, 3),
+                       Pages=sum(pages.values()) if pages else None, Refreshes=_status["Refreshes"] + 1, Error=None)
+
+
+# Makes the first copy right away (a file left by an earlier run may be old), then
+# one every REFRESH_SECONDS
+def _refresh_loop():
+    if ENABLED and _status["Refreshes"]:
+        # A script or Archive.run() has just made one
+        _stopping.wait(REFRESH_SECONDS)
+    while not _stopping.is_set():
+        try:
+            if ENABLED:
+                refresh()
+            else:
+                Changelog.run_consumers()
+        except Exception as e:
+            # Keep serving the previous copy, or the live database before the first
+            _status["Error"] = str(e)
+            print(f"Error refreshing read replica: {str(e)}")
+        _stopping.wait(REFRESH_SECONDS)
+
+
+def ensure_refresher():
+    global _refresher
+    with _refresher_lock:
+        if _refresher is None:
+            _refresher = threading.Thread(target=_refresh_loop, name="replica-refresh", daemon=True)
+            _refresher.start()
+
+
+# Ends the refresh thread and closes the reader connections, e.g. before a script or
+# a test points Database.DB_PATH at another file. The next read starts it again.
+def stop():
+    global _refresher, _shared, _live_attached
+    with _refresher_lock:
+        if _refresher is not None:
+            _stopping.set()
+            _refresher.join()
+            _stopping.clear()
+            _refresher = None
+    with _pool_lock:
+        for conn in _pool + ([_shared] if _shared is not None else []):
+            conn.close()
+        _pool.clear()
+        _shared = None
+    _live_attached = None
+    _status.update(RefreshedAt=None, Seconds=None, Pages=None, Refreshes=0, Error=None)
+
+
+def _open_reader():
+    conn = sqlite3.connect(replica_path(), check_same_thread=False, cached_statements=Database.STATEMENT_CACHE_SIZE,
+                           factory=Database.TracingConnection)
+    profile = Database.STORAGE_PROFILES[Database.STORAGE_PROFILE]
+    for pragma in ("cache_size", "mmap_size", "temp_store", "busy_timeout"):
+        conn.execute(f"PRAGMA {pragma} = {profile[pragma]}")
+    # Before query_only, creating the history views writes to the temp schema
+    Archive.attach(conn, replica_archive_path())
+    conn.execute("PRAGMA query_only = 1")
+    return conn
+
+
+# The live database, when the replica is off or has no copy yet
+def _live():
+    global _live_attached
+    conn = Database.connect()
+    if _live_attached is not conn:
+        Archive.attach(conn)
+        _live_attached = conn
+    return conn
+
+
+def _serving_live():
+    return not ENABLED or not _status["Refreshes"]
+
+
+# Connection for analytics reads: the snapshot of the current thread inside
+# snapshot(), otherwise a shared replica connection (one read per statement)
+def connect():
+    global _shared
+    conn = getattr(_local, "snapshot", None)
+    if conn is not None:
+        return conn
+    ensure_refresher()
+    if _serving_live():
+        return _live()
+    with _pool_lock:
+        if _shared is None:
+            _shared = _open_reader()
+    return _shared
+
+
+# Runs the enclosed reads in one read transaction on the replica. Nested
+# snapshots reuse the outer one.
+@contextmanager
+def snapshot():
+    if getattr(_local, "snapshot", None) is not None:
+        yield _local.snapshot
+        return
+    ensure_refresher()
+    if _serving_live():
+        yield _live()
+        return
+    with _pool_lock:
+        conn = _pool.pop() if _pool else None
+    if conn is None:
+        conn = _open_reader()
+    conn.execute("BEGIN")
+    _local.snapshot = conn
+    try:
+        yield conn
+    finally:
+        _local.snapshot = None
+        # Nothing was written, this only ends the read transaction
+        conn.rollback()
+        with _pool_lock:
+            if len(_pool) < POOL_SIZE:
+                _pool.append(conn)
+                conn = None
+        if conn is not None:
+            conn.close()
+
+
+# When the figures being shown were copied, for a caption under the dashboards
+def refreshed_at():
+    return _status["RefreshedAt"]
+
+
+def status():
+    return dict(_status, Enabled=ENABLED, RefreshSeconds=REFRESH_SECONDS, Path=replica_path())
@@ -0,0 +1,300 @@
+import io
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import docx
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.shared import Pt, RGBColor, Inches
+from docx.oxml.ns import qn
+from docx.oxml import OxmlElement
+import Metrics
+import Replica
+import Templates
+import Tracing
+
+# Adviser's report: the metrics that go into it and the python-docx template it is
+# rendered from (see Templates.py).
+# Runs in a job worker (see Jobs.py), so nothing in here may use Streamlit.
+
+LOGO_PATH = 'seal-02.png'
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+ZIP_MIME = "application/zip"
+
+# Terms covered by the batch report, same choices as the Adviser's Report tab
+YEAR_LEVELS = ["1", "2", "3", "4"]
+SEMESTERS = ["1st Sem", "2nd Sem", "Summer"]
+
+# Processes building documents for the batch report (0 = one per CPU)
+REPORT_PROCESSES = int(os.environ.get("STUDENTMONITOR_REPORT_PROCESSES", "0")) or os.cpu_count() or 1
+
+# Text inputs of the Adviser's Report tab, in the order they appear on the form
+REPORT_FIELDS = [
+    "program_title", "department", "college", "academic_year", "reporting_period", "submission_date",
+    "objectives", "co_act", "accomplishments", "program_outputs", "deliverables",
+    "date_cons", "nature_advising", "action_taken",
+    "risk_challenges", "collab_linkages", "problem_encountered", "recom", "program_plans",
+    "prog_adv", "dept_chairperson",
+]
+
+
+def set_text_properties(paragraph, bold=False, size=11, alignment=None, color=RGBColor(0, 0, 0)):
+    for run in paragraph.runs:
+        run.font.bold = bold
+        run.font.size = Pt(size)
+        run.font.color.rgb = color
+        if alignment:
+            paragraph.alignment = alignment
+
+
+def set_column_width(cell, width):
+    cell_width = OxmlElement('w:tcW')
+    cell_width.set(qn('w:w'), str(width))
+    cell_width.set(qn('w:type'), 'dxa')
+    cell._element.get_or_add_tcPr().append(cell_width)
+
+
+# Every number in the Program Academic Performance Profile table, all read from
+# one replica snapshot so the counts and rates agree with each other
+def adviser_report_metrics(academic_year, year_level, semester, progress=None):
+    def step(fraction, message):
+        if progress:
+            progress(fraction, message)
+
+    with Replica.snapshot():
+        step(0.05, "Counting INC, withdrawn, failing grades and awardees")
+        counts = Metrics.calculate_counts(year_level, semester)
+
+        step(0.3, "Calculating rates")
+        rates = Metrics.calculate_rates(academic_year)
+
+        step(0.45, "Calculating average GPA and CGPA")
+        averages = average_gpa_cgpa()
+
+        step(0.6, "Calculating GPA distribution")
+        distribution = Metrics.gpa_distribution(year_level, semester)
+
+    return {
+        **counts,
+        **rates,
+        **distribution,
+        **averages,
+    }
+
+
+def average_gpa_cgpa(program=None):
+    avg_gpa_cgpa_df = Metrics.calculate_average_gpa_cgpa_all(program)
+    if not avg_gpa_cgpa_df.empty:
+        average_gpa = avg_gpa_cgpa_df['AverageGPA'].values[0]
+        average_cgpa = avg_gpa_cgpa_df['AverageCGPA'].values[0]
+    else:
+        average_gpa = 0
+        average_cgpa = 0
+    return {
+        "average_gpa": float(average_gpa) if average_gpa is not None else 0.0,
+        "average_cgpa": float(average_cgpa) if average_cgpa is not None else 0.0,
+    }
+
+
+# Metrics for every program, year level and semester of the batch report.
+# Rates and averages do not depend on the term so they are computed once per
+# program, and the per-term numbers come from one pass over the grades.
+def batch_report_metrics(academic_year, programs):
+    terms = [(year_level, semester) for year_level in YEAR_LEVELS for semester in SEMESTERS]
+    reports = []
+    for program in programs:
+        rates = Metrics.calculate_rates(academic_year, program)
+        averages = average_gpa_cgpa(program)
+        per_term = Metrics.term_metrics(terms, program)
+        for year_level, semester in terms:
+            reports.append((program, year_level, semester, {**per_term[(year_level, semester)], **rates, **averages}))
+    return reports
+
+
+# Label and placeholder pairs of the Program Academic Performance Profile table, two per row
+METRICS_TABLE = [
+    ('Total Program Enrollees:', 'student_total', 'Number of Students with INC:', 'inc_count'),
+    ('Retention Rate:', 'retention_rate', 'Number of Students withdraw from the program:', 'withdrawn_count'),
+    ('Completion Rate:', 'completion_rate', 'Number of Students with failing grades:', 'fail_count'),
+    ('Promotion Rate:', 'promotion_rate', 'Number of Rizal Excellence Awardees (1.0 – 1.20):', 'rl_count'),
+    ('Failure Rate:', 'failure_rate', 'Number of Chancellor’s Excellence Awardees (1.21 – 1.45):', 'cl_count'),
+    ('Dropout Rate:', 'dropout_rate', 'Number of Dean’s Excellence Awardees (1.46 – 1.75):', 'dl_count'),
+    ('Average GPA of Students:', 'average_gpa', 'Number of Students with GPA below 2.50:', 'below_25_gpa'),
+    ('Average CGPA of Students:', 'average_cgpa', 'Number of Students with CGPA below 2.50:', 'below_25_cgpa'),
+]
+
+# Report sections: heading, then (bold label or None, field) paragraphs
+REPORT_SECTIONS = [
+    ('II. Program Engagement & Activities', [
+        ('Objectives: ', 'objectives'),
+        ('Curricular & Co-Curricular Activities: ', 'co_act'),
+        ('Accomplishments: ', 'accomplishments'),
+    ]),
+    ('III: Program Outputs and Deliverables', [
+        ('Program Outputs: ', 'program_outputs'),
+        ('Deliverables: ', 'deliverables'),
+    ]),
+    ('IV. Consultation & Advising', [
+        ('Date of Consultation: ', 'date_cons'),
+        ('Nature of Advising: ', 'nature_advising'),
+        ('Action Taken: ', 'action_taken'),
+    ]),
+    ('V. Risks & Challenges', [(None, 'risk_challenges')]),
+    ('VI. Collaboration & Linkages', [(None, 'collab_linkages')]),
+    ('VII. Problems Encountered', [(None, 'problem_encountered')]),
+    ('VIII. Recommendations', [(None, 'recom')]),
+    ('IX. Program Plans', [(None, 'program_plans')]),
+]
+
+
+def add_labelled_paragraph(doc, label, name, size=12):
+    # Bold label followed by the value, e.g. "Program Title: {{program_title}}"
+    paragraph = doc.add_paragraph()
+    for text, bold in ((label, True), (Templates.placeholder(name), False)):
+        run = paragraph.add_run(text)
+        run.bold = bold
+        run.font.size = Pt(size)
+        run.font.color.rgb = RGBColor(0, 0, 0)
+    return paragraph
+
+
+def add_heading(doc, text, level=2):
+    heading = doc.add_heading(text, level)
+    set_text_properties(heading, bold=True, size=12)
+    return heading
+
+
+# The adviser report with placeholders for every field and metric. Only runs once
+# per process (see Templates.load), reports are filled-in copies of it.
+def adviser_report_template():
+    doc = docx.Document()
+
+    # Add logo and aligned text in the header
+    header = doc.sections[0].header
+    header_table = header.add_table(rows=1, cols=2, width=5)
+
+    set_column_width(header_table.columns[0].cells[0], 1000)  # Width in twips (1/20 of a point)
+    set_column_width(header_table.columns[1].cells[0], 7000)
+
+    logo_cell = header_table.cell(0, 0)
+    logo_cell.vertical_alignment = WD_ALIGN_PARAGRAPH.LEFT
+    logo_cell.paragraphs[0].add_run().add_picture(LOGO_PATH, width=Inches(0.95))
+
+    text_paragraph = header_table.cell(0, 1).paragraphs[0]
+    header_lines = [
+        ('MSU – ILIGAN INSTITUTE OF TECHNOLOGY\n', True),
+        ('OFFICE OF THE VICE CHANCELLOR FOR ACADEMIC AFFAIRS\n', False),
+        ('OFFICE OF THE DIRECTOR FOR UNDERGRADUATE PROGRAMS\n', False),
+        ('Iligan City, Philippines', False),
+    ]
+    for text, bold in header_lines:
+        run = text_paragraph.add_run(text)
+        run.bold = bold
+        run.font.size = Pt(10)
+        run.font.color.rgb = RGBColor(0, 0, 0)
+    text_paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
+
+    headingc = doc.add_heading('ACADEMIC PROGRAM ADVISING PROGRESS REPORT', 0)
+    set_text_properties(headingc, size=12, bold=True, alignment=WD_ALIGN_PARAGRAPH.CENTER)
+
+    add_labelled_paragraph(doc, 'Program Title: ', 'program_title')
+    add_labelled_paragraph(doc, 'Department: ', 'department')
+    add_labelled_paragraph(doc, 'College: ', 'college')
+    add_labelled_paragraph(doc, 'Academic Year: ', 'academic_year')
+    add_labelled_paragraph(doc, 'Reporting Period: ', 'reporting_period')
+    add_labelled_paragraph(doc, 'Report Submission Date: ', 'submission_date')
+
+    add_heading(doc, 'I. Program Academic Performance Profile')
+    table = doc.add_table(rows=len(METRICS_TABLE), cols=4)
+    for column, width in enumerate([5000, 1000, 5000, 1000]):
+        set_column_width(table.columns[column].cells[0], width)
+    for row, (label1, name1, label2, name2) in zip(table.rows, METRICS_TABLE):
+        row.cells[0].text = label1
+        row.cells[1].text = Templates.placeholder(name1)
+        row.cells[2].text = label2
+        row.cells[3].text = Templates.placeholder(name2)
+
+    for title, paragraphs in REPORT_SECTIONS:
+        add_heading(doc, title)
+        for label, name in paragraphs:
+            paragraph = doc.add_paragraph()
+            if label:
+                paragraph.add_run(label).bold = True
+            paragraph.add_run(Templates.placeholder(name))
+            paragraph.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
+
+    add_labelled_paragraph(doc, 'Name of Program Adviser: ', 'prog_adv')
+    add_heading(doc, 'Signature and Date:')
+    add_labelled_paragraph(doc, 'Department Chairperson:', 'dept_chairperson')
+    add_heading(doc, 'Signature and Date:')
+    return doc
+
+
+# Placeholder values: the form fields plus the metrics formatted for the table
+def adviser_report_data(fields, metrics):
+    data = dict(fields)
+    for name, value in metrics.items():
+        data[name] = str(value)
+    for name in ("retention_rate", "completion_rate", "promotion_rate", "failure_rate", "dropout_rate"):
+        data[name] = f'{metrics[name]:.2f}%'
+    for name in ("average_gpa", "average_cgpa"):
+        data[name] = f'{metrics[name]:.3f}'
+    return data
+
+
+def build_adviser_report(fields, metrics, out=None):
+    return Templates.render("adviser_report", adviser_report_template, adviser_report_data(fields, metrics), out)
+
+
+def report_file_name(year_level, semester):
+    return f"adviser_report_{year_level}_{semester}.docx"
+
+
+# Job entry point, see Jobs.JOB_KINDS
+def adviser_report_job(job, academic_year, year_level, semester, fields):
+    metrics = adviser_report_metrics(academic_year, year_level, semester, progress=job.progress)
+    job.progress(0.85, "Building document")
+    with Tracing.section("DOCX build"):
+        data = build_adviser_report(fields, metrics)
+    return report_file_name(year_level, semester), DOCX_MIME, data
+
+
+def batch_file_name(academic_year):
+    return f"adviser_reports_{academic_year}.zip"
+
+
+# Job entry point for the "Generate All Terms" button: one report per program, year
+# level and semester in a single ZIP. The documents are built in worker processes;
+# build_adviser_report is CPU bound and python-docx holds the GIL.
+def adviser_report_batch_job(job, academic_year, fields, programs=None):
+    job.progress(0.05, "Calculating metrics for all terms")
+    # Every report of the ZIP from the same replica snapshot
+    with Tracing.section("Batch metrics"), Replica.snapshot():
+        if not programs:
+            programs = Metrics.list_programs()
+        reports = batch_report_metrics(academic_year, programs)
+    if not reports:
+        raise ValueError("No programs to report on")
+
+    job.progress(0.3, f"Building {len(reports)} documents")
+    archive = io.BytesIO()
+    # spawn instead of fork: the Streamlit server is multi-threaded
+    context = multiprocessing.get_context("spawn")
+    with Tracing.section("DOCX build"), \
+            ProcessPoolExecutor(max_workers=min(REPORT_PROCESSES, len(reports)), mp_context=context) as pool, \
+            zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        futures = {}
+        for program, year_level, semester, metrics in reports:
+            report_fields = dict(fields, program_title=program)
+            future = pool.submit(build_adviser_report, report_fields, metrics)
+            futures[future] = f"{program}/{report_file_name(year_level, semester)}"
+        try:
+            for done, future in enumerate(as_completed(futures), 1):
+                zip_file.writestr(futures[future], future.result())
+                job.progress(0.3 + 0.65 * done / len(futures), f"Built {done} of {len(futures)} documents")
+        except BaseException:
+            # Do not wait for the remaining documents when cancelled or failed
+            for future in futures:
+                future.cancel()
+            raise
+    return batch_file_name(academic_year), ZIP_MIME, archive.getvalue()
@@ -0,0 +1,49 @@
+import streamlit as st
+import Queries
+
+# Which students a session works with. An adviser sees the students assigned to them
+# on the Admin page (adviser_student), about 40 instead of the whole department, so
+# the student lists, directories and dashboards only load those rows. The sidebar
+# toggle switches the session to the department-wide view of every student. An
+# adviser without assigned students gets the department-wide view.
+#
+# This narrows what the pages load, it is not access control: every adviser can turn
+# the toggle on, and the pages that take a StudentID do not check the assignment.
+
+
+def _has_students(username):
+    return Queries.fetchone("adviser_has_students", (username,)) is not None
+
+
+# UserName to limit the pages to, None in the department-wide view
+def adviser():
+    if st.session_state.get("department_view"):
+        return None
+    username = st.session_state.get("username")
+    if not username or not _has_students(username):
+        return None
+    return username
+
+
+def render_toggle():
+    username = st.session_state.get("username")
+    if username and not _has_students(username):
+        st.sidebar.toggle("Department-wide view", value=True, disabled=True, key="department_view_unassigned",
+                          help="No students are assigned to you yet, ask an admin to assign them on the Admin page")
+        return
+    st.sidebar.toggle("Department-wide view", key="department_view",
+                      help="Show every student instead of the students assigned to you")
+
+
+# Queries.fetchall/fetchone/read_sql of the scoped variant of a named query (see Queries.scoped)
+def fetchall(name, params=(), conn=None):
+    return Queries.fetchall(*Queries.scoped(name, params, adviser()), conn=conn)
+
+
+def fetchone(name, params=(), conn=None):
+    return Queries.fetchone(*Queries.scoped(name, params, adviser()), conn=conn)
+
+
+def read_sql(name, params=(), conn=None, columns=None, categorize=True):
+    name, params = Queries.scoped(name, params, adviser())
+    return Queries.read_sql(name, params, conn=conn, columns=columns, categorize=categorize)
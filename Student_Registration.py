@@ -1,84 +1,42 @@
 import streamlit as st
-import calendar
 from datetime import datetime
-import pandas as pd
-import numpy as np
 from streamlit_option_menu import option_menu
-import pickle
-from pathlib import Path
-import streamlit_authenticator as stauth
-from streamlit_pandas_profiling import st_profile_report
-import sqlite3
-import plotly.express as px
-import re
+import Exports
+import Queries
+import Scope
+import Writer
 
-conn = sqlite3.connect('studentmonitor.db', check_same_thread=False)
-cur = conn.cursor()
 
 def app():
-    def createStudent():
-        cur.execute(
-            """CREATE TABLE IF NOT EXISTS student (
-            StudentID TEXT NOT NULL UNIQUE,
-            Name TEXT NOT NULL,
-            BirthDate TEXT NOT NULL,
-            Sex TEXT NOT NULL,
-            Gender TEXT NOT NULL,
-            Religion TEXT NOT NULL,
-            Region TEXT NOT NULL,
-            Province TEXT NOT NULL,
-            Municipality TEXT NOT NULL,
-            Barangay TEXT NOT NULL,
-            Track TEXT NOT NULL,
-            Program TEXT NOT NULL,
-            ContactNumber TEXT NOT NULL,
-            PGName TEXT NOT NULL,
-            PGNumber TEXT NOT NULL,
-            PRIMARY KEY(StudentID))"""
-        )
-        conn.commit()
-
     # Function definitions
+    # The writes report how many rows they changed, 0 means the StudentID was taken
+    # (insert) or not found (update, delete)
     def addStudent(StudentID, Name, BirthDate, Sex, Gender, Religion, Region, Province, Municipality, Barangay, Track, Program, ContactNumber, PGName, PGNumber):
-        # Check if StudentID already exists
-        cur.execute("SELECT StudentID FROM student WHERE StudentID=?", (StudentID,))
-        if cur.fetchone():
+        if not Writer.write(
+                "student_insert",
+                (StudentID, Name, BirthDate, Sex, Gender, Religion, Region, Province, Municipality, Barangay, Track, Program, ContactNumber, PGName, PGNumber)):
             st.warning("A student with this ID already exists.")
             return False
-        cur.execute(
-            "INSERT INTO student (StudentID, Name, BirthDate, Sex, Gender, Religion, Region, Province, Municipality, Barangay, Track, Program, ContactNumber, PGName, PGNumber) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
-            (StudentID, Name, BirthDate, Sex, Gender, Religion, Region, Province, Municipality, Barangay, Track, Program, ContactNumber, PGName, PGNumber))
-        conn.commit()
+        # Advisers keep the students they register on their list
+        Writer.write("adviser_student_insert", (st.session_state.get("username"), StudentID))
         return True
 
     def updateStudent(StudentID, Name, BirthDate, Sex, Gender, Religion, Region, Province, Municipality, Barangay, Track, Program, ContactNumber, PGName, PGNumber):
-        cur.execute("SELECT StudentID FROM student WHERE StudentID=?", (StudentID,))
-        if cur.fetchone() is None:
+        if not Writer.write(
+                "student_update",
+                (Name, BirthDate, Sex, Gender, Religion, Region, Province, Municipality, Barangay, Track, Program, ContactNumber, PGName, PGNumber, StudentID)):
             st.warning("Student ID not found.")
             return False
-        cur.execute(
-            "UPDATE student SET Name=?, BirthDate=?, Sex=?, Gender=?, Religion=?, Region=?, Province=?, Municipality=?, Barangay=?, Track=?, Program=?, ContactNumber=?, PGName=?, PGNumber=? WHERE StudentID=?",
-            (Name, BirthDate, Sex, Gender, Religion, Region, Province, Municipality, Barangay, Track, Program, ContactNumber, PGName, PGNumber, StudentID))
-        conn.commit()
         return True
 
     def deleteStudent(StudentID):
-        cur.execute("SELECT StudentID FROM student WHERE StudentID=?", (StudentID,))
-        if cur.fetchone() is None:
+        if not Writer.write_many([("student_delete", (StudentID,)), ("adviser_student_delete_of_student", (StudentID,))])[0]:
             st.warning("Student ID not found.")
             return False
-        cur.execute("DELETE FROM student WHERE StudentID=?", (StudentID,))
-        conn.commit()
         return True
 
-    def get_students_by_semester_year(AcademicYear, Semester, StudentID):
-        cur.execute("SELECT * FROM academicrecords WHERE AcademicYear=? AND Semester=? AND StudentID=?", (AcademicYear, Semester, StudentID))
-        return cur.fetchall()
-
-
     def get_student_details(StudentID):
-        cur.execute("SELECT * FROM student WHERE StudentID=?", (StudentID,))
-        return cur.fetchone()
+        return Queries.fetchone("student_details", (StudentID,))
         
 
     # Set up session state to store operation success
@@ -113,8 +71,7 @@ def app():
         st.header("Demographics")
 
         # Fetch all students for selection
-        cur.execute("SELECT StudentID, Name FROM student")
-        students = cur.fetchall()
+        students = Scope.fetchall("student_names")
         sorted_students = sorted(students, key=lambda x: x[1])
         # Create a dictionary for mapping student name to ID
         student_dict = {name: sid for sid, name in sorted_students}
@@ -212,85 +169,34 @@ def app():
     elif selected == "Academic Records":
         # Function to create academic records
         def createAcademicRecords(StudentID, AcademicYear, YearLevel, Semester, ScholasticStatus, ScholarshipStatus):
-            # Create the academicrecords table if it doesn't exist
-            cur.execute(
-                """CREATE TABLE IF NOT EXISTS academicrecords (
-                RecordID INTEGER PRIMARY KEY AUTOINCREMENT,
-                StudentID TEXT NOT NULL,
-                ScholasticStatus TEXT NOT NULL,
-                ScholarshipStatus TEXT,
-                AcademicYear TEXT NOT NULL,
-                YearLevel INTEGER NOT NULL,
-                Semester TEXT NOT NULL,
-                UNIQUE(StudentID, AcademicYear, Semester),
-                FOREIGN KEY(StudentID) REFERENCES student(StudentID)
-                )"""
-            )
-            
-            # Check if the record already exists for the given StudentID
-            cur.execute(
-                "SELECT * FROM academicrecords WHERE StudentID = ? AND AcademicYear = ? AND Semester = ?",
-                (StudentID, AcademicYear, Semester)
-            )
-            if cur.fetchone() is None:
-                # If no record exists, insert the new academic record
-                cur.execute(
-                    "INSERT INTO academicrecords (StudentID, ScholasticStatus, ScholarshipStatus, AcademicYear, YearLevel, Semester) VALUES (?, ?, ?, ?, ?, ?)",
-                    (StudentID, ScholasticStatus, ScholarshipStatus, AcademicYear, YearLevel, Semester)
-                )
-                conn.commit()
-                return True
-            return False
+            # Nothing is written (0 rows) if the student already has a record for the term
+            return Writer.write(
+                "academic_record_insert",
+                (StudentID, ScholasticStatus, ScholarshipStatus, AcademicYear, YearLevel, Semester)
+            ) > 0
         
         # Function to delete academic record
         def deleteAcademicRecords(StudentID, AcademicYear, Semester):
             try:
-                # Check if the academic record exists for the given student, academic year, and semester
-                cur.execute("SELECT StudentID FROM academicrecords WHERE StudentID=? AND AcademicYear=? AND Semester=?",
-                            (StudentID, AcademicYear, Semester,))
-                if cur.fetchone() is None:
+                if not Writer.write("academic_record_delete", (StudentID, AcademicYear, Semester)):
                     st.warning("Academic record not found for the student, academic year, and semester.")
                     return False
-                # Update the academic record
-                cur.execute(
-                    """DELETE FROM academicrecords WHERE StudentID=? AND AcademicYear = ? AND Semester=?""",
-                    (StudentID, AcademicYear, Semester,)
-                )
-                
-                conn.commit()                    
                 return True  # Return True to indicate success
                 
             except Exception as e:
                 # Handle any exceptions (e.g., SQL errors, database connection issues)
                 print(f"Error deleting academic records: {str(e)}")
-                conn.rollback()  # Rollback changes if an error occurs
                 return False
 
 
-        def get_academic_record_details(StudentID):
-            cur.execute("SELECT * FROM academicrecords WHERE StudentID=?", (StudentID,))
-            return cur.fetchone()
-            
-
         # Function to update academic record
         def updateAcademicRecords(StudentID, AcademicYear, Semester, YearLevel, ScholasticStatus, ScholarshipStatus):
             try:
-                # Check if the academic record exists for the given student, academic year, and semester
-                cur.execute("SELECT StudentID FROM academicrecords WHERE StudentID=? AND AcademicYear=? AND Semester=?",
-                            (StudentID, AcademicYear, Semester))
-                existing_record = cur.fetchone()
-                print(f"Existing Record: {existing_record}")  # Log the existing record found
-                
-                if existing_record:
-                    # Update the academic record
-                    cur.execute(
-                        """UPDATE academicrecords 
-                        SET YearLevel=?, ScholasticStatus=?, ScholarshipStatus=?
-                        WHERE StudentID=? AND AcademicYear=? AND Semester=?""",
-                        (YearLevel, ScholasticStatus, ScholarshipStatus, StudentID, AcademicYear, Semester)
-                    )
-                    
-                    conn.commit()
+                # 0 rows updated means there is no record for the student, academic year, and semester
+                if Writer.write(
+                    "academic_record_update",
+                    (YearLevel, ScholasticStatus, ScholarshipStatus, StudentID, AcademicYear, Semester)
+                ):
                     return True  # Return True to indicate success
                 else:
                     st.warning("Academic record not found for the student, academic year, and semester.")
@@ -299,7 +205,6 @@ def app():
             except Exception as e:
                 # Handle any exceptions (e.g., SQL errors, database connection issues)
                 print(f"Error updating academic records: {str(e)}")
-                conn.rollback()  # Rollback changes if an error occurs
                 return False
 
         if 'operation_success' not in st.session_state:
@@ -313,8 +218,7 @@ def app():
         semester = ["1st Sem", "2nd Sem", "Summer"]
 
         # Fetching student IDs and names
-        cur.execute("SELECT StudentID, Name FROM student")
-        students = cur.fetchall()
+        students = Scope.fetchall("student_names")
         student_ids = [student[0] for student in students]
         student_names = {student[0]: student[1] for student in students}  # Dictionary for mapping StudentID to StudentName
 
@@ -332,8 +236,7 @@ def app():
                 st.header("Assign")
                 
                 # Fetch all students for selection
-                cur.execute("SELECT StudentID, Name FROM student")
-                students = cur.fetchall()
+                students = Scope.fetchall("student_names")
                 sorted_students = sorted(students, key=lambda x: x[1])
                 # Create a dictionary for mapping student name to ID
                 student_dict = {name: sid for sid, name in sorted_students}
@@ -376,8 +279,7 @@ def app():
                 st.header("Manage Academic Records")
 
                 # Fetching student IDs and names
-                cur.execute("SELECT StudentID, Name FROM student")
-                students = cur.fetchall()
+                students = Scope.fetchall("student_names")
                 sorted_students = sorted(students, key=lambda x: x[1])
                 # Create a dictionary for mapping student name to ID
                 student_dict = {name: sid for sid, name in sorted_students}
@@ -391,13 +293,7 @@ def app():
                     selected_student_id = student_dict[selected_student_name]
 
                     # Fetch year levels and semesters for the selected student
-                    cur.execute("""
-                        SELECT DISTINCT ar.AcademicYear, ar.Semester 
-                        FROM academicrecords ar 
-                        WHERE ar.StudentID = ? 
-                        ORDER BY ar.AcademicYear, ar.Semester
-                    """, (selected_student_id,))
-                    acadyear_levels_and_semesters = cur.fetchall()
+                    acadyear_levels_and_semesters = Queries.fetchall("academic_record_terms", (selected_student_id,))
 
                     if not acadyear_levels_and_semesters:
                         st.warning(f"No academic records found for {selected_student_name}.")
@@ -419,13 +315,7 @@ def app():
                     selected_student_id = student_dict[selected_student_name]
 
                     # Fetch the academic record for the selected student, year level, and semester
-                    cur.execute("""
-                        SELECT ar.YearLevel, ar.ScholasticStatus, ar.ScholarshipStatus 
-                        FROM academicrecords ar 
-                        WHERE ar.StudentID = ? AND ar.AcademicYear=? AND ar.Semester = ?
-                    """, (selected_student_id, selected_acad_year, selected_semester))
-
-                    record = cur.fetchone()
+                    record = Queries.fetchone("academic_record_of_term", (selected_student_id, selected_acad_year, selected_semester))
                     if record:
                         year_level_value = record[0]
                         scholastic_status_value = record[1]
@@ -492,8 +382,7 @@ def app():
 
 
         # Fetching student IDs and names
-        cur.execute("SELECT StudentID, Name FROM student")
-        students = cur.fetchall()
+        students = Scope.fetchall("student_names")
         sorted_students = sorted(students, key=lambda x: x[1])
         # Create a dictionary for mapping student name to ID
         student_dict = {name: sid for sid, name in sorted_students}
@@ -526,32 +415,23 @@ def app():
 
 
             # Fetch the academic records for the selected student
-            assignments = pd.read_sql_query(
-                "SELECT ar.AcademicYear, ar.YearLevel, ar.Semester, ar.ScholasticStatus, ar.ScholarshipStatus "
-                "FROM academicrecords ar "
-                "WHERE ar.StudentID = ? "
-                "ORDER BY ar.AcademicYear AND ar.Semester", conn, params=(selected_student_id,)
-            )
+            assignments = Queries.read_sql("academic_records_of_student", (selected_student_id,))
 
             if not assignments.empty:
                 # Group by Year Level and Semester
-                grouped_records = assignments.groupby(['AcademicYear','YearLevel', 'Semester'])
+                grouped_records = assignments.groupby(['AcademicYear','YearLevel', 'Semester'], observed=True)
                 for (acad_year, year_level, semester), group in grouped_records:
                     st.markdown(f"**{acad_year} - Year Level {year_level} - {semester}**")
                     st.dataframe(group)   
             else:
                 st.warning(f"No academic records found for {selected_student_name}.")
         else:
-            all_assignments = pd.read_sql_query(
-                "SELECT s.StudentID, s.Name, s.Sex, s.Gender, s.Religion, s.Region, s.Province, s.Municipality, s.Barangay, s.Track, s.Program, ar.ScholasticStatus, ar.ScholarshipStatus, s.ContactNumber, s.PGName, s.PGNumber, ar.AcademicYear, ar.Semester, ar.YearLevel,     ROW_NUMBER() OVER(PARTITION BY ar.AcademicYear, ar.YearLevel, ar.Semester ORDER BY ar.AcademicYear, ar.YearLevel, ar.Semester) AS SemesterSequence "
-                "FROM academicrecords ar "
-                "JOIN student s ON ar.StudentID = s.StudentID "  # Correct join condition
-                "ORDER BY ar.AcademicYear, ar.Semester", conn
-            )
+            Exports.render("student_directory", key="student_directory_export")
+            all_assignments = Scope.read_sql("student_directory")
 
             if not all_assignments.empty:
                 # Group by Year Level and Semester
-                grouped_all_records = all_assignments.groupby(['AcademicYear', 'YearLevel', 'Semester'])
+                grouped_all_records = all_assignments.groupby(['AcademicYear', 'YearLevel', 'Semester'], observed=True)
                 for (acad_year, year_level, semester), group in grouped_all_records:
                     st.markdown(f"**{acad_year} - Year Level {year_level} - {semester}**")
                     total_students = group.shape[0]  # Number of rows in the dataframe
@@ -0,0 +1,104 @@
+import io
+import os
+import re
+import threading
+import docx
+
+# DOCX template engine for generated reports.
+# A template is a .docx with {{name}} placeholders in its paragraphs, tables and
+# header. templates/<name>.docx is used when it exists (so the layout can be edited
+# in Word), otherwise the builder function passed in creates it. Either way it is
+# loaded once per process and kept as bytes, logo and styles included, and every
+# report is a copy of it with the placeholders filled in.
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+
+_PLACEHOLDER = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+_templates = {}
+_templates_lock = threading.Lock()
+
+
+def placeholder(name):
+    return "{{" + name + "}}"
+
+
+def template_path(name):
+    return os.path.join(TEMPLATE_DIR, f"{name}.docx")
+
+
+def load(name, builder):
+    with _templates_lock:
+        if name not in _templates:
+            path = template_path(name)
+            if os.path.exists(path):
+                with open(path, "rb") as template_file:
+                    _templates[name] = template_file.read()
+            else:
+                template_io = io.BytesIO()
+                builder().save(template_io)
+                _templates[name] = template_io.getvalue()
+        return _templates[name]
+
+
+# Writes the built-in template to templates/<name>.docx as a starting point for editing
+def export(name, builder):
+    os.makedirs(TEMPLATE_DIR, exist_ok=True)
+    builder().save(template_path(name))
+    with _templates_lock:
+        _templates.pop(name, None)
+    return template_path(name)
+
+
+def _iter_paragraphs(doc):
+    def from_container(container):
+        yield from container.paragraphs
+        for table in container.tables:
+            for row in table.rows:
+                for cell in row.cells:
+                    yield from from_container(cell)
+
+    yield from from_container(doc)
+    for section in doc.sections:
+        # Touching a linked header/footer would add an empty one to the document
+        for part in (section.header, section.footer):
+            if not part.is_linked_to_previous:
+                yield from from_container(part)
+
+
+def _fill_paragraph(paragraph, data):
+    text = paragraph.text
+    if "{{" not in text:
+        return
+
+    def value(match):
+        return str(data.get(match.group(1), ""))
+
+    expected = len(_PLACEHOLDER.findall(text))
+    in_runs = sum(len(_PLACEHOLDER.findall(run.text)) for run in paragraph.runs)
+    if expected == in_runs:
+        # Every placeholder sits inside one run, replacing per run keeps its formatting
+        for run in paragraph.runs:
+            if "{{" in run.text:
+                run.text = _PLACEHOLDER.sub(value, run.text)
+    else:
+        # Word split a placeholder over several runs, the paragraph takes the first run's formatting
+        runs = paragraph.runs
+        runs[0].text = _PLACEHOLDER.sub(value, text)
+        for run in runs[1:]:
+            run.text = ""
+
+
+# Fills the template with data and saves it to out (a file-like object, e.g. the
+# response buffer). Returns the document bytes when out is not given.
+def render(name, builder, data, out=None):
+    doc = docx.Document(io.BytesIO(load(name, builder)))
+    for paragraph in _iter_paragraphs(doc):
+        _fill_paragraph(paragraph, data)
+
+    if out is not None:
+        doc.save(out)
+        return None
+    doc_io = io.BytesIO()
+    doc.save(doc_io)
+    return doc_io.getvalue()
@@ -0,0 +1,269 @@
+import math
+import os
+import re
+import sys
+import threading
+import time
+import itertools
+from collections import deque, defaultdict
+from contextlib import contextmanager
+
+# Query tracing for the shared database connection.
+# Every statement that goes through Database.connect() is recorded here with its
+# normalized text, the page function that issued it, the row count and wall time.
+# Page reruns and named sections inside pages are timed here as well; reruns slower
+# than SLOW_RERUN_MS are written to the rerunlog table.
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+TRACE_CAPACITY = int(os.environ.get("STUDENTMONITOR_TRACE_CAPACITY", "50000"))
+N_PLUS_ONE_THRESHOLD = int(os.environ.get("STUDENTMONITOR_N_PLUS_ONE", "25"))
+SLOW_RERUN_MS = float(os.environ.get("STUDENTMONITOR_SLOW_RERUN_MS", "1000"))
+RERUN_LOG_ROWS = int(os.environ.get("STUDENTMONITOR_RERUN_LOG_ROWS", "5000"))
+RUN_HISTORY = 2000
+
+enabled = os.environ.get("STUDENTMONITOR_TRACE", "1") != "0"
+
+_records = deque(maxlen=TRACE_CAPACITY)
+_runs = deque(maxlen=RUN_HISTORY)
+_lock = threading.Lock()
+_local = threading.local()
+_run_ids = itertools.count(1)
+
+# Modules whose frames are skipped when looking for the caller of a query
+_INTERNAL_FILES = {"Database.py", "Tracing.py"}
+
+_string_literal = re.compile(r"'(?:[^']|'')*'")
+_number_literal = re.compile(r"\b\d+(?:\.\d+)?\b")
+_in_list = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_whitespace = re.compile(r"\s+")
+
+# Streamlit stops a script run with these exceptions on st.rerun()/st.stop(), they are not errors
+_CONTROL_FLOW_EXCEPTIONS = {"RerunException", "StopException"}
+# Session state keys that must never end up in the log
+_SECRET_KEY_PARTS = ("password", "authenticator")
+
+
+class QueryRecord:
+    __slots__ = ("shape", "caller", "page", "run_id", "rows", "elapsed", "started")
+
+    def __init__(self, shape, caller, page, run_id, elapsed):
+        self.shape = shape
+        self.caller = caller
+        self.page = page
+        self.run_id = run_id
+        self.rows = 0
+        self.elapsed = elapsed
+        self.started = time.time() - elapsed
+
+
+class RunInfo:
+    def __init__(self, page, username):
+        self.page = page
+        self.username = username
+        self.run_id = next(_run_ids)
+        self.started = time.time()
+        self.duration = 0.0
+        self.sections = []
+        self.query_count = 0
+        self.query_time = 0.0
+        self.error = None
+
+
+def normalize_sql(sql):
+    # Collapse literals and whitespace so that f-string queries with different
+    # values end up in the same bucket as their parameterized equivalents
+    shape = _string_literal.sub("?", sql)
+    shape = _number_literal.sub("?", shape)
+    shape = _in_list.sub("IN (...)", shape)
+    return _whitespace.sub(" ", shape).strip()
+
+
+def _find_caller():
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (filename.startswith(APP_DIR) and "site-packages" not in filename
+                and os.path.basename(filename) not in _INTERNAL_FILES):
+            module = os.path.splitext(os.path.basename(filename))[0]
+            return f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return "<unknown>"
+
+
+def record(sql, elapsed):
+    current = getattr(_local, "current", None)
+    if current is not None:
+        current.query_count += 1
+        current.query_time += elapsed
+    if not enabled:
+        return None
+    entry = QueryRecord(
+        normalize_sql(sql),
+        _find_caller(),
+        current.page if current else None,
+        current.run_id if current else None,
+        elapsed,
+    )
+    with _lock:
+        _records.append(entry)
+    return entry
+
+
+def summarize_state(state, limit=500):
+    # Compact "key=value" summary of the scalar widget values in st.session_state
+    parts = []
+    for key in sorted(state.keys(), key=str):
+        if any(part in str(key).lower() for part in _SECRET_KEY_PARTS):
+            continue
+        value = state[key]
+        if value is None or isinstance(value, (str, int, float, bool)):
+            text = str(value)
+            if len(text) > 40:
+                text = text[:37] + "..."
+            parts.append(f"{key}={text}")
+    return "; ".join(parts)[:limit]
+
+
+# Queued on the writer thread (see Writer.py) without waiting for the commit, the
+# rerun that is being logged is already slow
+def log_slow_rerun(info, widget_state):
+    # Imported here, Writer imports Database, which imports this module
+    import Writer
+    sections = "; ".join(f"{name}={elapsed * 1000:.0f}ms" for name, elapsed in info.sections)
+    row = (time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(info.started)), info.username, info.page,
+           round(info.duration * 1000, 1), info.query_count, round(info.query_time * 1000, 1),
+           sections, widget_state, info.error)
+    try:
+        # Rotation: only the newest RERUN_LOG_ROWS entries are kept
+        Writer.submit([("rerunlog_insert", row), ("rerunlog_rotate", (RERUN_LOG_ROWS,))])
+    except Exception as e:
+        print(f"Error writing rerun log: {str(e)}")
+
+
+@contextmanager
+def run(page, username=None, state=None, log_slow=False):
+    # Times one page rerun and groups every query issued during it (used for N+1 detection)
+    previous = getattr(_local, "current", None)
+    info = RunInfo(page, username)
+    _local.current = info
+    start = time.perf_counter()
+    try:
+        yield info
+    except BaseException as e:
+        if type(e).__name__ not in _CONTROL_FLOW_EXCEPTIONS:
+            info.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        info.duration = time.perf_counter() - start
+        _local.current = previous
+        with _lock:
+            _runs.append(info)
+        if log_slow and info.duration * 1000 >= SLOW_RERUN_MS:
+            log_slow_rerun(info, summarize_state(state) if state is not None else None)
+
+
+@contextmanager
+def section(name):
+    # Times a named block inside a page, e.g. the Counts tab or the DOCX build
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        current = getattr(_local, "current", None)
+        if current is not None:
+            current.sections.append((name, time.perf_counter() - start))
+
+
+def reset():
+    with _lock:
+        _records.clear()
+        _runs.clear()
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    # Nearest-rank percentile
+    rank = max(1, math.ceil(q * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def query_stats():
+    with _lock:
+        records = list(_records)
+
+    grouped = defaultdict(list)
+    for entry in records:
+        grouped[entry.shape].append(entry)
+
+    stats = []
+    for shape, entries in grouped.items():
+        timings = sorted(entry.elapsed * 1000 for entry in entries)
+        per_run = defaultdict(int)
+        for entry in entries:
+            if entry.run_id is not None:
+                per_run[(entry.run_id, entry.caller)] += 1
+        max_per_run = max(per_run.values()) if per_run else 0
+        callers = sorted({entry.caller for entry in entries})
+        pages = sorted({entry.page for entry in entries if entry.page})
+        stats.append({
+            "Query": shape,
+            "Callers": ", ".join(callers),
+            "Pages": ", ".join(pages),
+            "Calls": len(entries),
+            "TotalMs": round(sum(timings), 3),
+            "P50Ms": round(_percentile(timings, 0.50), 3),
+            "P95Ms": round(_percentile(timings, 0.95), 3),
+            "P99Ms": round(_percentile(timings, 0.99), 3),
+            "AvgRows": round(sum(entry.rows for entry in entries) / len(entries), 1),
+            "MaxPerRun": max_per_run,
+            "NPlusOne": max_per_run >= N_PLUS_ONE_THRESHOLD,
+        })
+    stats.sort(key=lambda row: row["TotalMs"], reverse=True)
+    return stats
+
+
+def recent_queries(limit=200):
+    with _lock:
+        records = list(_records)[-limit:]
+    return [{
+        "Started": time.strftime("%H:%M:%S", time.localtime(entry.started)),
+        "Page": entry.page,
+        "Caller": entry.caller,
+        "Query": entry.shape,
+        "Rows": entry.rows,
+        "Ms": round(entry.elapsed * 1000, 3),
+    } for entry in reversed(records)]
+
+
+def rerun_stats():
+    with _lock:
+        runs = list(_runs)
+
+    grouped = defaultdict(list)
+    for info in runs:
+        grouped[info.page].append(info.duration * 1000)
+        for name, elapsed in info.sections:
+            grouped[f"{info.page} / {name}"].append(elapsed * 1000)
+
+    stats = []
+    for name, timings in grouped.items():
+        timings.sort()
+        stats.append({
+            "Page": name,
+            "Runs": len(timings),
+            "P50Ms": round(_percentile(timings, 0.50), 1),
+            "P95Ms": round(_percentile(timings, 0.95), 1),
+            "MaxMs": round(timings[-1], 1),
+        })
+    stats.sort(key=lambda row: row["Page"])
+    return stats
+
+
+def slow_reruns(conn, limit=500):
+    cur = conn.execute(
+        "SELECT LoggedAt, UserName, Page, DurationMs, QueryCount, QueryMs, Sections, WidgetState, Error FROM rerunlog ORDER BY LogID DESC LIMIT ?",
+        (limit,)
+    )
+    columns = [column[0] for column in cur.description]
+    return [dict(zip(columns, row)) for row in cur.fetchall()]
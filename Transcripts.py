@@ -0,0 +1,238 @@
+import argparse
+import csv
+import io
+import multiprocessing
+import re
+import sys
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+import docx
+from docx.shared import Pt
+import Archive
+import Database
+import Metrics
+import Reports
+
+# Per-student grade slips for a whole cohort, as DOCX or CSV files in one ZIP.
+# All grade rows are loaded with a single query, GPA and CGPA per term follow the
+# Grade Evaluation screen, and the files are rendered in worker processes.
+# Runs as a job (see Jobs.JOB_KINDS) or from the command line:
+#
+#     python Transcripts.py --program "BS Statistics" --format docx --out grade_slips.zip
+
+YEAR_LEVELS = ["1", "2", "3", "4"]
+SEMESTERS = ["1st Sem", "2nd Sem", "Summer"]
+FORMATS = ["docx", "csv"]
+
+CSV_COLUMNS = ["StudentID", "Name", "Program", "YearLevel", "Semester", "AcademicYear", "CourseCode",
+               "CourseDesc", "Units", "Grade", "FinalGrade", "GradeStatus", "TermGPA", "CGPA"]
+
+_unsafe_file_chars = re.compile(r"[^\w\- ]+")
+
+
+# Every grade row of the cohort in one query, ordered by student then term.
+# Archived students are included, see Archive.py.
+def load_cohort(conn, program=None, academic_year=None):
+    Archive.attach(conn)
+    query = """
+        SELECT s.StudentID, s.Name, s.Program, ca.YearLevel, ca.Semester, ca.AcademicYear, ca.CourseCode,
+               p.CourseDesc, p.Units, ca.Grade, ca.FinalGrade, ca.GradeStatus
+        FROM history_student s
+        JOIN history_courseassignment ca ON ca.StudentID = s.StudentID
+        JOIN prospectus p ON p.CourseCode = ca.CourseCode
+        WHERE 1 = 1"""
+    params = []
+    if program:
+        query += " AND s.Program = ?"
+        params.append(program)
+    if academic_year:
+        # Students enrolled in that academic year, with their full record
+        query += " AND s.StudentID IN (SELECT StudentID FROM history_courseassignment WHERE AcademicYear = ?)"
+        params.append(academic_year)
+    query += " ORDER BY s.Name, s.StudentID"
+    cur = conn.execute(query, params)
+    columns = [column[0] for column in cur.description]
+    return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+
+# Same arithmetic as calculate_gpa() on the Grade Evaluation screen: every non-NSTP
+# course counts towards the units, only graded courses towards the grade points
+def term_gpa(courses):
+    counted = [course for course in courses if course["CourseCode"] not in Metrics.NSTP_COURSES]
+    total_units = sum(course["Units"] for course in counted)
+    weighted_sum = 0
+    for course in counted:
+        point = Metrics.grade_point(course["Grade"], course["FinalGrade"])
+        if point is not None:
+            weighted_sum += course["Units"] * point
+    return round(weighted_sum / total_units, 5) if total_units > 0 else 0
+
+
+def build_transcripts(rows):
+    students = {}
+    for row in rows:
+        student = students.setdefault(row["StudentID"], {
+            "StudentID": row["StudentID"], "Name": row["Name"], "Program": row["Program"], "terms": []
+        })
+        student.setdefault("courses", []).append(row)
+
+    transcripts = []
+    for student in students.values():
+        courses = student.pop("courses")
+        running_total_units = 0
+        running_weighted_sum = 0
+        for year_level in YEAR_LEVELS:
+            for semester in SEMESTERS:
+                term_courses = [course for course in courses
+                                if str(course["YearLevel"]) == year_level and course["Semester"] == semester]
+                if not term_courses:
+                    continue
+                # CGPA runs over graded non-NSTP courses only, as on the screen
+                for course in term_courses:
+                    point = Metrics.grade_point(course["Grade"], course["FinalGrade"])
+                    if course["CourseCode"] not in Metrics.NSTP_COURSES and point is not None:
+                        running_total_units += course["Units"]
+                        running_weighted_sum += course["Units"] * point
+                student["terms"].append({
+                    "YearLevel": year_level,
+                    "Semester": semester,
+                    "courses": term_courses,
+                    "GPA": term_gpa(term_courses),
+                    "CGPA": round(running_weighted_sum / running_total_units, 5) if running_total_units > 0 else 0,
+                })
+        student["OverallCGPA"] = term_gpa(courses)
+        transcripts.append(student)
+    return transcripts
+
+
+def render_csv(transcript):
+    csv_io = io.StringIO()
+    writer = csv.writer(csv_io)
+    writer.writerow(CSV_COLUMNS)
+    for term in transcript["terms"]:
+        for course in term["courses"]:
+            writer.writerow([transcript["StudentID"], transcript["Name"], transcript["Program"], term["YearLevel"],
+                             term["Semester"], course["AcademicYear"], course["CourseCode"], course["CourseDesc"],
+                             course["Units"], course["Grade"], course["FinalGrade"], course["GradeStatus"],
+                             term["GPA"], term["CGPA"]])
+    return csv_io.getvalue().encode("utf-8")
+
+
+def render_docx(transcript):
+    doc = docx.Document()
+    doc.add_heading("Grade Slip", 0)
+    paragraph = doc.add_paragraph()
+    paragraph.add_run(f"{transcript['Name']} ({transcript['StudentID']})").bold = True
+    paragraph.add_run(f"\n{transcript['Program']}")
+
+    for term in transcript["terms"]:
+        doc.add_heading(f"{term['YearLevel']} YearLevel - {term['Semester']}", level=2)
+        table = doc.add_table(rows=1, cols=5)
+        table.style = "Table Grid"
+        for cell, title in zip(table.rows[0].cells, ["Course Code", "Description", "Units", "Grade", "Final Grade"]):
+            cell.text = title
+            cell.paragraphs[0].runs[0].bold = True
+        for course in term["courses"]:
+            cells = table.add_row().cells
+            cells[0].text = course["CourseCode"]
+            cells[1].text = course["CourseDesc"]
+            cells[2].text = str(course["Units"])
+            cells[3].text = course["Grade"] or ""
+            cells[4].text = course["FinalGrade"] or ""
+        doc.add_paragraph(f"GPA: {term['GPA']} | CGPA: {term['CGPA']}")
+
+    run = doc.add_paragraph().add_run(f"Overall CGPA: {transcript['OverallCGPA']}")
+    run.bold = True
+    run.font.size = Pt(12)
+
+    doc_io = io.BytesIO()
+    doc.save(doc_io)
+    return doc_io.getvalue()
+
+
+def file_name(transcript, file_format):
+    name = _unsafe_file_chars.sub("_", f"{transcript['StudentID']} {transcript['Name']}").strip()
+    program = _unsafe_file_chars.sub("_", transcript["Program"] or "No Program").strip()
+    return f"{program}/{name}.{file_format}"
+
+
+# Worker process entry point, must stay a module level function so it can be pickled
+def render(transcript, file_format):
+    data = render_docx(transcript) if file_format == "docx" else render_csv(transcript)
+    return file_name(transcript, file_format), data
+
+
+def export_zip(transcripts, file_format, out, processes=None, progress=None):
+    if file_format not in FORMATS:
+        raise ValueError(f"Unknown format: {file_format}")
+    processes = max(1, min(processes or Reports.REPORT_PROCESSES, len(transcripts)))
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        if processes == 1:
+            results = (render(transcript, file_format) for transcript in transcripts)
+            _write_results(zip_file, results, len(transcripts), progress)
+        else:
+            # spawn instead of fork: the Streamlit server is multi-threaded
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=processes, mp_context=context) as pool:
+                chunksize = max(1, len(transcripts) // (processes * 4))
+                results = pool.map(render, transcripts, [file_format] * len(transcripts), chunksize=chunksize)
+                _write_results(zip_file, results, len(transcripts), progress)
+
+
+def _write_results(zip_file, results, total, progress):
+    for done, (name, data) in enumerate(results, 1):
+        zip_file.writestr(name, data)
+        if progress and (done % 25 == 0 or done == total):
+            progress(done, total)
+
+
+def zip_file_name(program, academic_year, file_format):
+    parts = ["grade_slips", program or "all_programs", academic_year or "all_years", file_format]
+    return _unsafe_file_chars.sub("_", "_".join(parts)) + ".zip"
+
+
+# Job entry point, see Jobs.JOB_KINDS
+def transcripts_job(job, program=None, academic_year=None, file_format="docx"):
+    job.progress(0.05, "Loading grades")
+    transcripts = build_transcripts(load_cohort(job.conn, program, academic_year))
+    if not transcripts:
+        raise ValueError("No grades found for the selected students")
+
+    def progress(done, total):
+        job.progress(0.1 + 0.85 * done / total, f"Rendered {done} of {total} grade slips")
+
+    archive = io.BytesIO()
+    export_zip(transcripts, file_format, archive, progress=progress)
+    return zip_file_name(program, academic_year, file_format), Reports.ZIP_MIME, archive.getvalue()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export grade slips for a cohort as a ZIP of DOCX or CSV files.")
+    parser.add_argument("--program", help="only students of this program, e.g. 'BS Statistics'")
+    parser.add_argument("--academic-year", help="only students enrolled in this academic year")
+    parser.add_argument("--format", choices=FORMATS, default="docx")
+    parser.add_argument("--processes", type=int, help="worker processes (default: one per CPU)")
+    parser.add_argument("--db", help=f"database file (default: {Database.DB_PATH})")
+    parser.add_argument("--out", help="output ZIP file (default: a name built from the filters)")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        Database.DB_PATH = args.db
+    transcripts = build_transcripts(load_cohort(Database.connect(), args.program, args.academic_year))
+    if not transcripts:
+        print("No grades found for the selected students", file=sys.stderr)
+        return 1
+
+    out_path = args.out or zip_file_name(args.program, args.academic_year, args.format)
+
+    def progress(done, total):
+        print(f"\r{done}/{total} grade slips", end="", file=sys.stderr, flush=True)
+
+    with open(out_path, "wb") as out:
+        export_zip(transcripts, args.format, out, processes=args.processes, progress=progress)
+    print(f"\nWrote {out_path}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
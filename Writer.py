@@ -0,0 +1,255 @@
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+import Database
+import Queries
+
+# Single writer for the page sessions. Every session used to commit on the shared
+# connection from its own thread, so two advisers saving grades at once raced for
+# the write lock and one of them failed with "database is locked". Pages now hand
+# their writes (named queries from Queries.QUERIES) to one writer thread through a
+# queue. The writer takes whatever has queued up within GROUP_COMMIT_MS and commits
+# it as one transaction; each request runs in its own savepoint, so a failing
+# request is rolled back and reported to its caller without failing the others.
+# When the lock is held elsewhere (job workers, a script) the whole group is retried
+# with exponential backoff, at most LOCK_RETRIES times.
+#
+# If the writer cannot open its connection, or stops on an unexpected error, the
+# requests waiting for it fail at once with WriterUnavailable instead of timing out,
+# and the next submit() starts a new writer thread.
+#
+# Every write of the page sessions goes through here, the job list's enqueue, cancel
+# and retry and the slow rerun log included. The exceptions are background work on
+# connections of its own, which the page sessions never wait on: job workers
+# updating their job (progress, result), the changelog consumers and the replica
+# refresh (Replica.py), archiving (Archive.py), the analytics export watermark and
+# schema migrations at startup. Their writes are short or rare; when one holds the
+# lock the writer's retries wait for it.
+
+GROUP_COMMIT_MS = float(os.environ.get("STUDENTMONITOR_GROUP_COMMIT_MS", "5"))
+MAX_GROUP_SIZE = int(os.environ.get("STUDENTMONITOR_MAX_GROUP_SIZE", "200"))
+LOCK_RETRIES = int(os.environ.get("STUDENTMONITOR_WRITE_RETRIES", "6"))
+BACKOFF_MS = 20
+MAX_BACKOFF_MS = 1000
+# SQLite's own wait for the lock on each attempt. Short, so that all attempts with
+# their backoff stay well inside the time a page waits for its write.
+LOCK_WAIT_MS = 1000
+# How long a page waits for its write before giving up
+WRITE_TIMEOUT_SECONDS = float(os.environ.get("STUDENTMONITOR_WRITE_TIMEOUT", "30"))
+
+_queue = queue.Queue()
+_writer = None
+_writer_lock = threading.Lock()
+# Put on the queue by stop()
+_STOP = object()
+# Committed groups, requests in them, requests that failed, retries of a locked group,
+# writer threads started and the error that ended the last one
+_stats = {"Groups": 0, "Requests": 0, "Failed": 0, "LockRetries": 0, "Starts": 0, "LastError": None}
+_stats_lock = threading.Lock()
+
+
+class WriteTimeout(Exception):
+    pass
+
+
+class WriterUnavailable(Exception):
+    pass
+
+
+# One submitted batch of statements, committed all together or not at all
+class WriteRequest:
+    def __init__(self, statements):
+        self.statements = statements
+        self.rowcounts = None
+        self.lastrowid = None
+        self.error = None
+        self._done = threading.Event()
+
+    def _finish(self, rowcounts=None, lastrowid=None, error=None):
+        self.rowcounts = rowcounts
+        self.lastrowid = lastrowid
+        self.error = error
+        self._done.set()
+
+    # Rows changed by each statement. Raises the statement's own exception (e.g.
+    # sqlite3.IntegrityError) in the calling session if the request failed.
+    def result(self, timeout=WRITE_TIMEOUT_SECONDS):
+        if not self._done.wait(timeout):
+            raise WriteTimeout(f"Write not committed within {timeout:g}s")
+        if self.error is not None:
+            raise self.error
+        return self.rowcounts
+
+
+# Queues statements, a list of (query name, params), as one all-or-nothing request
+def submit(statements):
+    if not statements:
+        raise ValueError("Nothing to write")
+    for name, _ in statements:
+        Queries.sql(name)
+    request = WriteRequest(list(statements))
+    # Under the lock, so a writer that is stopping cannot miss the request
+    with _writer_lock:
+        _start_writer()
+        _queue.put(request)
+    return request
+
+
+# Runs one named write and waits for its commit, returns the changed row count
+def write(name, params=()):
+    return submit([(name, params)]).result()[0]
+
+
+# Runs several named writes in one transaction and waits for the commit
+def write_many(statements):
+    return submit(statements).result()
+
+
+def _is_locked(error):
+    return isinstance(error, sqlite3.OperationalError) and ("locked" in str(error) or "busy" in str(error))
+
+
+def _run_request(conn, request):
+    rowcounts = []
+    conn.execute("SAVEPOINT write_request")
+    try:
+        for name, params in request.statements:
+            cur = Queries.execute(name, params, conn=conn)
+            rowcounts.append(cur.rowcount)
+    except Exception as e:
+        conn.execute("ROLLBACK TO write_request")
+        conn.execute("RELEASE write_request")
+        if _is_locked(e):
+            raise
+        return None, None, e
+    conn.execute("RELEASE write_request")
+    return rowcounts, cur.lastrowid, None
+
+
+def _commit_group(conn, group):
+    for attempt in range(LOCK_RETRIES + 1):
+        results = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for request in group:
+                results.append(_run_request(conn, request))
+            conn.execute("COMMIT")
+            return results
+        except sqlite3.OperationalError as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            if not _is_locked(e) or attempt == LOCK_RETRIES:
+                raise
+            with _stats_lock:
+                _stats["LockRetries"] += 1
+            delay = min(BACKOFF_MS * 2 ** attempt, MAX_BACKOFF_MS) / 1000
+            # Jitter so several processes waiting on each other do not retry in step
+            time.sleep(delay * random.uniform(0.5, 1.0))
+
+
+def _collect():
+    group = [_queue.get()]
+    deadline = time.monotonic() + GROUP_COMMIT_MS / 1000
+    while len(group) < MAX_GROUP_SIZE:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            group.append(_queue.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return group
+
+
+def _write_group(conn, group):
+    try:
+        results = _commit_group(conn, group)
+    except Exception as e:
+        print(f"Error committing {len(group)} write(s): {str(e)}")
+        results = [(None, None, e)] * len(group)
+    failed = 0
+    for request, (rowcounts, lastrowid, error) in zip(group, results):
+        request._finish(rowcounts, lastrowid, error)
+        failed += error is not None
+    with _stats_lock:
+        _stats["Groups"] += 1
+        _stats["Requests"] += len(group)
+        _stats["Failed"] += failed
+
+
+def _write_loop():
+    global _writer
+    conn = None
+    group = []
+    error = None
+    try:
+        conn = Database.open_connection()
+        # Transactions are opened and committed explicitly in _commit_group
+        conn.isolation_level = None
+        conn.execute(f"PRAGMA busy_timeout = {LOCK_WAIT_MS}")
+        while True:
+            group = _collect()
+            stopping = _STOP in group
+            group = [request for request in group if request is not _STOP]
+            if group:
+                _write_group(conn, group)
+            if stopping:
+                break
+    except Exception as e:
+        print(f"Error in the database writer: {str(e)}")
+        error = WriterUnavailable(f"The database writer stopped: {str(e)}")
+        with _stats_lock:
+            _stats["LastError"] = str(e)
+    finally:
+        with _writer_lock:
+            _writer = None
+            # Nothing is left waiting for this thread, the next submit() starts a new one
+            pending = [request for request in group if not request._done.is_set()]
+            while True:
+                try:
+                    pending.append(_queue.get_nowait())
+                except queue.Empty:
+                    break
+            for request in pending:
+                if request is not _STOP:
+                    request._finish(error=error or WriterUnavailable("The database writer was stopped"))
+        if conn is not None:
+            conn.close()
+
+
+# Must hold _writer_lock
+def _start_writer():
+    global _writer
+    if _writer is None:
+        _writer = threading.Thread(target=_write_loop, name="db-writer", daemon=True)
+        _writer.start()
+        with _stats_lock:
+            _stats["Starts"] += 1
+
+
+def ensure_writer():
+    with _writer_lock:
+        _start_writer()
+
+
+# Lets the writer commit what is queued and end its thread, e.g. before a script or
+# a test points Database.DB_PATH at another file. The next submit() starts it again.
+def stop(timeout=WRITE_TIMEOUT_SECONDS):
+    with _writer_lock:
+        writer = _writer
+        if writer is None:
+            return
+        _queue.put(_STOP)
+    writer.join(timeout)
+
+
+# Counters since server start, for the Admin page
+def stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["Queued"] = _queue.qsize()
+    stats["AvgGroupSize"] = round(stats["Requests"] / stats["Groups"], 2) if stats["Groups"] else 0.0
+    return stats
@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import Database
+import Replica
+import Writer
+
+
+# A fresh database file for one test. Database.connect(), open_connection() and the
+# modules that put their files next to Database.DB_PATH (Replica, Archive) use it.
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    path = str(tmp_path / "studentmonitor.db")
+    monkeypatch.setattr(Database, "DB_PATH", path)
+    monkeypatch.setattr(Database, "_connection", None)
+    monkeypatch.setattr(Database, "_codes", {})
+    yield path
+    # The writer and the replica keep connections they opened on the file of this test
+    Writer.stop()
+    Replica.stop()
+    if Database._connection is not None:
+        Database._connection.close()
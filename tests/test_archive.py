@@ -0,0 +1,89 @@
+import sqlite3
+
+import pytest
+
+import Archive
+import Database
+import Queries
+import Replica
+
+
+def _student(conn, student_id, status, academic_year):
+    Queries.execute("student_insert", (student_id, "Name", "2005-01-01", "Male", "Male", "Catholic", "Region IV-A",
+                                       "Laguna", "Los Banos", "Batong Malake", "STEM", "BS Statistics", "0917", "PG",
+                                       "0917"), conn=conn)
+    Queries.execute("academic_record_insert", (student_id, status, None, academic_year, 4, "2nd Sem"), conn=conn)
+    Queries.execute("course_assignment_insert", (student_id, "STT101", "1.25", None, "Passed", academic_year, 4,
+                                                 "2nd Sem"), conn=conn)
+    Queries.execute("promotion_upsert", (student_id, academic_year, "2nd Sem", 1), conn=conn)
+
+
+# S1 graduated long ago, S2 graduated this year, S3 is enrolled
+@pytest.fixture
+def students(db):
+    conn = Database.connect()
+    Queries.execute("prospectus_insert", ("STT101", "Statistics", 3, "1st Sem", 1, "Major"), conn=conn)
+    _student(conn, "S1", "Graduate", "2015-2016")
+    _student(conn, "S2", "Graduate", "2024-2025")
+    _student(conn, "S3", "Regular", "2015-2016")
+    conn.commit()
+    return conn
+
+
+def test_dry_run_only_counts(students):
+    counts = Archive.run(before_year=2020, dry_run=True)
+    assert counts == {"student": 1, "academicrecords_base": 1, "courseassignment_base": 1, "promotion_base": 1}
+    assert students.execute("SELECT COUNT(*) FROM student").fetchone()[0] == 3
+
+
+def test_closed_students_are_moved_with_their_rows(students, monkeypatch):
+    monkeypatch.setattr(Replica, "ENABLED", False)
+    Archive.run(before_year=2020)
+
+    assert [row[0] for row in students.execute("SELECT StudentID FROM student ORDER BY StudentID")] == ["S2", "S3"]
+    conn = Archive.attach(Database.open_connection())
+    try:
+        for table in Archive.STUDENT_TABLES:
+            assert conn.execute(f"SELECT StudentID FROM archive.{table}").fetchall() == [("S1",)], table
+        # The archived grades keep their labels
+        assert conn.execute("SELECT Grade, GradeStatus, AcademicYear, Semester FROM archive.courseassignment"
+                            ).fetchall() == [("1.25", "Passed", "2015-2016", "2nd Sem")]
+        assert conn.execute("SELECT COUNT(*) FROM history_courseassignment").fetchone()[0] == 3
+        # Only the moved tables, no changelog triggers writing to a log nobody reads
+        assert conn.execute("SELECT COUNT(*) FROM archive.sqlite_master WHERE type = 'trigger'").fetchone()[0] == 0
+        for table in ("changelog", "changelog_consumer", "term_gpa", "jobs", "adviser", "adviser_student"):
+            assert conn.execute("SELECT 1 FROM archive.sqlite_master WHERE name = ?", (table,)).fetchone() is None, table
+    finally:
+        conn.close()
+
+    # Nothing left to move
+    assert Archive.run(before_year=2020)["student"] == 0
+
+
+def test_history_views_of_the_replica_count_moved_students_once(students, monkeypatch):
+    monkeypatch.setattr(Replica, "ENABLED", True)
+    Replica.refresh()
+    assert Replica.connect().execute("SELECT COUNT(*) FROM history_student").fetchone()[0] == 3
+
+    Archive.run(before_year=2020)
+    conn = Replica.connect()
+    assert conn.execute("SELECT COUNT(*) FROM main.student").fetchone()[0] == 2
+    assert conn.execute("SELECT COUNT(*) FROM archive.student").fetchone()[0] == 1
+    assert conn.execute("SELECT COUNT(*) FROM history_student").fetchone()[0] == 3
+
+
+def test_archive_of_an_earlier_version_loses_the_changelog(students, monkeypatch):
+    monkeypatch.setattr(Replica, "ENABLED", False)
+    # Earlier versions created the archive with the whole live schema
+    older = sqlite3.connect(Archive.archive_path())
+    Database.init_schema(older)
+    older.close()
+
+    Archive.run(before_year=2020)
+    conn = Archive.attach(Database.open_connection())
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM archive.sqlite_master WHERE type = 'trigger'").fetchone()[0] == 0
+        assert conn.execute("SELECT 1 FROM archive.sqlite_master WHERE name = 'changelog'").fetchone() is None
+        assert conn.execute("SELECT StudentID FROM archive.courseassignment").fetchall() == [("S1",)]
+    finally:
+        conn.close()
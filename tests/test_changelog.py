@@ -0,0 +1,112 @@
+import pytest
+
+import Changelog
+import Database
+import Queries
+
+
+def _enroll(conn, student_id, grade, academic_year="2023-2024", semester="1st Sem"):
+    Queries.execute("student_insert", (student_id, "Name", "2005-01-01", "Male", "Male", "Catholic", "Region IV-A",
+                                       "Laguna", "Los Banos", "Batong Malake", "STEM", "BS Statistics", "0917", "PG",
+                                       "0917"), conn=conn)
+    Queries.execute("course_assignment_insert", (student_id, "STT101", grade, None, "Passed", academic_year, 1,
+                                                 semester), conn=conn)
+
+
+@pytest.fixture
+def conn(db):
+    conn = Database.connect()
+    Queries.execute("prospectus_insert", ("STT101", "Statistics", 3, "1st Sem", 1, "Major"), conn=conn)
+    conn.commit()
+    return conn
+
+
+# A consumer that records what it was given
+@pytest.fixture
+def consumer(monkeypatch):
+    monkeypatch.setattr(Changelog, "_consumers", {})
+    calls = []
+    Changelog.register("test", lambda conn, changes: calls.append(changes), lambda conn: calls.append("rebuild"),
+                       tables=("courseassignment_base",))
+    return calls
+
+
+def test_changes_record_the_old_values(conn):
+    _enroll(conn, "S1", "1.25")
+    conn.execute("UPDATE courseassignment_base SET GradeCode = ?", (Database.code("gradecode", "1.50"),))
+    conn.execute("DELETE FROM courseassignment_base")
+    conn.commit()
+
+    rows = Changelog.changes(tables=("courseassignment_base",), conn=conn)
+    assert [(row["Operation"], row["StudentID"]) for row in rows] == [("I", "S1"), ("U", "S1"), ("D", "S1")]
+    assert rows[1]["Changes"] == {"GradeCode": [Database.code("gradecode", "1.25"), Database.code("gradecode", "1.50")]}
+    assert rows[2]["Changes"]["CourseCode"] == "STT101"
+
+
+def test_consumer_gets_only_new_changes_of_its_tables(conn, consumer):
+    _enroll(conn, "S1", "1.25")
+    conn.commit()
+    # No watermark yet
+    assert Changelog.consume(conn, "test") is None
+    assert consumer == ["rebuild"]
+    assert Changelog.watermark("test", conn) == Changelog.latest(conn)
+
+    assert Changelog.consume(conn, "test") == 0
+    _enroll(conn, "S2", "2.00")
+    conn.commit()
+    # The student row is logged too, but only the course assignment is passed on
+    assert Changelog.consume(conn, "test") == 1
+    assert [change["StudentID"] for change in consumer[1]] == ["S2"]
+    assert Changelog.watermark("test", conn) == Changelog.latest(conn)
+
+
+def test_consumer_far_behind_is_rebuilt(conn, consumer, monkeypatch):
+    Changelog.consume(conn, "test")
+    monkeypatch.setattr(Changelog, "REBUILD_AFTER", 2)
+    for student_id in ("S1", "S2"):
+        _enroll(conn, student_id, "1.25")
+    conn.commit()
+    assert Changelog.consume(conn, "test") is None
+    assert consumer == ["rebuild", "rebuild"]
+
+
+def test_failed_apply_keeps_the_watermark(conn, consumer, monkeypatch):
+    Changelog.consume(conn, "test")
+    mark = Changelog.watermark("test", conn)
+
+    def fail(conn, changes):
+        raise RuntimeError("broken")
+    monkeypatch.setitem(Changelog._consumers, "test", (fail, None, None))
+    _enroll(conn, "S1", "1.25")
+    conn.commit()
+    # run_consumers() reports the error and goes on
+    Changelog.run_consumers()
+    assert Changelog.watermark("test", conn) == mark
+
+
+def test_term_gpa_follows_grade_changes(conn):
+    pytest.importorskip("pandas")
+    import Metrics
+
+    _enroll(conn, "S1", "1.25")
+    _enroll(conn, "S2", "2.00")
+    conn.commit()
+    Changelog.consume(conn, "term_gpa")
+    gpa = "SELECT StudentID, GPA FROM term_gpa ORDER BY StudentID"
+    assert conn.execute(gpa).fetchall() == [("S1", 1.25), ("S2", 2.0)]
+
+    enroll_id = conn.execute("SELECT EnrollID FROM courseassignment_base WHERE StudentID = 'S1'").fetchone()[0]
+    Queries.execute("course_assignment_set_grade", ("1.50", None, "Passed", enroll_id), conn=conn)
+    conn.commit()
+    assert Changelog.consume(conn, "term_gpa") > 0
+    assert conn.execute(gpa).fetchall() == [("S1", 1.5), ("S2", 2.0)]
+
+    # Units changed in the prospectus
+    conn.execute("UPDATE prospectus_base SET Units = 5 WHERE CourseCode = 'STT101'")
+    conn.execute("DELETE FROM courseassignment_base WHERE StudentID = 'S2'")
+    conn.commit()
+    Changelog.consume(conn, "term_gpa")
+    incremental = conn.execute("SELECT * FROM term_gpa ORDER BY StudentID").fetchall()
+    Metrics.rebuild_term_gpa(conn)
+    assert conn.execute("SELECT * FROM term_gpa ORDER BY StudentID").fetchall() == incremental
+    assert [row[0] for row in incremental] == ["S1"]
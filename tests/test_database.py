@@ -0,0 +1,35 @@
+import sqlite3
+
+import Database
+import Queries
+
+
+def test_reserved_usernames_cannot_register(db):
+    assert Queries.execute("adviser_insert", ("admin", "hash", "token")).rowcount == 0
+    assert Queries.execute("adviser_insert", ("Admin", "hash", "token")).rowcount == 0
+    assert Queries.execute("adviser_insert", ("jdoe", "hash", "token")).rowcount == 1
+    # Taken
+    assert Queries.execute("adviser_insert", ("jdoe", "hash", "token")).rowcount == 0
+
+
+def test_admin_rights_come_from_the_flag(db):
+    Queries.execute("adviser_insert", ("jdoe", "hash", "token"))
+    assert not Database.is_admin("jdoe")
+    assert Database.set_admin("jdoe")
+    assert Database.is_admin("jdoe")
+    assert Database.set_admin("jdoe", admin=False)
+    assert not Database.is_admin("jdoe")
+    assert not Database.set_admin("nobody")
+    assert not Database.is_admin(None)
+
+
+def test_admin_accounts_of_an_older_file_keep_their_rights(db):
+    conn = sqlite3.connect(db)
+    conn.execute("CREATE TABLE adviser (UserName TEXT NOT NULL, Password TEXT NOT NULL, "
+                 "Random_authenticator TEXT NOT NULL, PRIMARY KEY(UserName))")
+    conn.executemany("INSERT INTO adviser VALUES (?, 'hash', 'token')", [("admin",), ("jdoe",)])
+    conn.commit()
+    conn.close()
+
+    assert Database.is_admin("admin")
+    assert not Database.is_admin("jdoe")
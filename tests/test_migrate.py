@@ -0,0 +1,84 @@
+import sqlite3
+
+import Database
+
+
+# Tables as the pages created them before Database.py (a version 0 file)
+LEGACY_SCHEMA = [
+    """CREATE TABLE prospectus (
+    CourseCode TEXT NOT NULL UNIQUE,
+    CourseDesc TEXT NOT NULL,
+    Units INTEGER NOT NULL,
+    Semester TEXT NOT NULL,
+    YearLevel TEXT NOT NULL,
+    Classification TEXT NOT NULL,
+    PRIMARY KEY(CourseCode))""",
+    """CREATE TABLE requisite (
+    CourseCode TEXT,
+    Corequisite TEXT,
+    Prerequisite TEXT,
+    FOREIGN KEY(CourseCode) REFERENCES prospectus(CourseCode))""",
+    """CREATE TABLE courseassignment (
+    EnrollID INTEGER PRIMARY KEY AUTOINCREMENT,
+    StudentID TEXT NOT NULL,
+    CourseCode TEXT NOT NULL,
+    Grade TEXT,
+    FinalGrade TEXT,
+    GradeStatus TEXT,
+    AcademicYear TEXT,
+    YearLevel TEXT,
+    Semester TEXT)""",
+]
+
+
+def legacy_file(path):
+    conn = sqlite3.connect(path)
+    for statement in LEGACY_SCHEMA:
+        conn.execute(statement)
+    conn.executemany("INSERT INTO prospectus VALUES (?, ?, 3, '1st Sem', '1', 'Major')",
+                     [("MAT101", "Algebra"), ("ENG101", "English")])
+    conn.executemany("INSERT INTO requisite VALUES (?, NULL, ?)",
+                     [("MAT101", None), ("MAT101", "ENG101"), ("ENG101", None)])
+    conn.executemany("INSERT INTO courseassignment (StudentID, CourseCode, Grade, FinalGrade, GradeStatus, "
+                     "AcademicYear, YearLevel, Semester) VALUES (?, ?, ?, ?, ?, ?, '1', ?)", [
+                         ("S1", "MAT101", "3.0", "3.0", "Passed", "2023-2024", "1st Sem"),
+                         # Entered twice, the second time with the corrected grade
+                         ("S1", "MAT101", "2.0", "2.0", "Passed", "2023-2024", "1st Sem"),
+                         ("S1", "ENG101", "5.0", "5.0", "Failed", "2023-2024", "1st Sem"),
+                         ("S2", "MAT101", None, None, None, "2023-2024", "1st Sem"),
+                     ])
+    conn.commit()
+    return conn
+
+
+def test_migrate_keeps_the_rows_of_a_version_0_file(db):
+    conn = legacy_file(db)
+    Database.migrate(conn)
+
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == Database.SCHEMA_VERSION
+    rows = conn.execute("SELECT StudentID, CourseCode, Grade, GradeStatus, AcademicYear, Semester "
+                        "FROM courseassignment ORDER BY StudentID, CourseCode").fetchall()
+    assert rows == [
+        ("S1", "ENG101", "5.0", "Failed", "2023-2024", "1st Sem"),
+        ("S1", "MAT101", "2.0", "Passed", "2023-2024", "1st Sem"),
+        ("S2", "MAT101", None, None, "2023-2024", "1st Sem"),
+    ]
+    assert conn.execute("SELECT CourseCode, CourseDesc FROM prospectus ORDER BY CourseCode").fetchall() == [
+        ("ENG101", "English"), ("MAT101", "Algebra")]
+    # Migrating twice does nothing
+    Database.migrate(conn)
+    assert conn.execute("SELECT COUNT(*) FROM courseassignment").fetchone()[0] == 3
+
+
+def test_migrate_moves_duplicates_aside(db):
+    conn = legacy_file(db)
+    Database.migrate(conn)
+
+    dropped = conn.execute("SELECT StudentID, CourseCode, Grade FROM migration_dropped_courseassignment").fetchall()
+    assert dropped == [("S1", "MAT101", "3.0")]
+    dropped = conn.execute("SELECT CourseCode, Prerequisite FROM migration_dropped_requisite").fetchall()
+    assert dropped == [("MAT101", None)]
+    assert conn.execute("SELECT CourseCode, Prerequisite FROM requisite ORDER BY CourseCode").fetchall() == [
+        ("ENG101", None), ("MAT101", "ENG101")]
+    # Nothing was dropped from the prospectus
+    assert Database._object_type(conn, "migration_dropped_prospectus") is None
@@ -0,0 +1,38 @@
+import sqlite3
+
+import pytest
+
+import Archive
+import Database
+import Queries
+from tools import datagen, plan_lint
+
+
+# A generated database with the archive attached, as plan_lint builds it
+@pytest.fixture(scope="module")
+def linted(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp("plan_lint")
+    path = datagen.create(str(workdir / "lint.db"), students=300)
+    conn = sqlite3.connect(path, factory=Database.TracingConnection)
+    Archive.attach(conn, str(workdir / "lint.archive.db"))
+    yield conn, plan_lint.root_pages(conn)
+    conn.close()
+
+
+@pytest.mark.parametrize("name, query", plan_lint.registry(), ids=[name for name, _ in plan_lint.registry()])
+def test_named_query_does_not_scan(linted, name, query):
+    conn, roots = linted
+    scanned, plan = plan_lint.lint(conn, query, roots)
+    if name in plan_lint.ALLOWED_SCANS:
+        return
+    assert not scanned, f"{name} reads {', '.join(scanned)}: {plan}"
+
+
+def test_allowed_scans_name_existing_queries():
+    assert set(plan_lint.ALLOWED_SCANS) <= set(Queries.QUERIES)
+
+
+def test_lint_finds_a_full_scan(linted):
+    conn, roots = linted
+    scanned, _ = plan_lint.lint(conn, "SELECT * FROM courseassignment_base WHERE abs(YearLevel) = 1", roots)
+    assert scanned == ["courseassignment_base"]
@@ -0,0 +1,31 @@
+import sqlite3
+
+import pytest
+
+import Archive
+import Database
+from tools import datagen, plan_check
+
+
+# A generated database with its ANALYZE statistics and an empty archive attached
+@pytest.fixture(scope="module")
+def seeded(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp("plans")
+    path = datagen.create(str(workdir / "seeded.db"), students=300)
+    conn = sqlite3.connect(path, factory=Database.TracingConnection)
+    Archive.attach(conn, str(workdir / "seeded.archive.db"))
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize("name", list(plan_check.CHECKS))
+def test_dashboard_queries_search_their_index(seeded, name):
+    query, index = plan_check.CHECKS[name]
+    ok, plan = plan_check.check(seeded, query, index)
+    assert not plan_check.problems(plan), plan
+    assert ok, f"{name} does not search {index}: {plan}"
+
+
+def test_problems_finds_scans_and_sorts(seeded):
+    plan = plan_check.query_plan(seeded, "SELECT * FROM courseassignment_base ORDER BY GradeCode")
+    assert plan_check.problems(plan) == plan
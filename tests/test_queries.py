@@ -0,0 +1,76 @@
+import Database
+import Queries
+
+STUDENT = ("S1", "Juan Dela Cruz", "2005-01-01", "Male", "Male", "Catholic", "Region IV-A", "Laguna", "Los Banos",
+           "Batong Malake", "STEM", "BS Statistics", "09170000000", "Maria Dela Cruz", "09170000001")
+
+
+def _add_student_and_course(conn):
+    Queries.execute("student_insert", STUDENT, conn=conn)
+    Queries.execute("prospectus_insert", ("STT101", "Statistics", 3, "1st Sem", 1, "Major"), conn=conn)
+
+
+def test_upserts_report_existing_keys(db):
+    conn = Database.connect()
+    _add_student_and_course(conn)
+    row = ("S1", "STT101", "1.25", None, "Passed", "2023-2024", 1, "1st Sem")
+    assert Queries.execute("course_assignment_insert", row, conn=conn).rowcount == 1
+    assert Queries.execute("course_assignment_insert", row, conn=conn).rowcount == 0
+    # A retake in a later term is another attempt
+    retake = ("S1", "STT101", "2.00", None, "Passed", "2024-2025", 1, "1st Sem")
+    assert Queries.execute("course_assignment_insert", retake, conn=conn).rowcount == 1
+
+    Queries.execute("promotion_upsert", ("S1", "2023-2024", "2nd Sem", 0), conn=conn)
+    Queries.execute("promotion_upsert", ("S1", "2023-2024", "2nd Sem", 1), conn=conn)
+    assert conn.execute("SELECT StudentID, AcademicYear, Semester, PromotionStatus FROM promotion").fetchall() == [
+        ("S1", "2023-2024", "2nd Sem", "1")]
+
+
+def test_known_labels_are_stored_as_their_codes(db):
+    conn = Database.connect()
+    _add_student_and_course(conn)
+    Queries.execute("course_assignment_insert", ("S1", "STT101", "INC", "3.00", "To be Determined", "2023-2024", 1,
+                                                 "2nd Sem"), conn=conn)
+    assert conn.execute("SELECT GradeCode, FinalGradeCode, GradeStatusCode, TermKey, SemesterCode "
+                        "FROM courseassignment_base").fetchone() == (
+        Database.GRADES.index("INC") + 1, Database.GRADES.index("3.00") + 1,
+        Database.GRADE_STATUSES.index("To be Determined") + 1, 202302, 2)
+
+
+def test_new_labels_get_a_code_instead_of_null(db):
+    conn = Database.connect()
+    _add_student_and_course(conn)
+    Queries.execute("course_assignment_insert", ("S1", "STT101", "", None, "Passed", "2023-2024", 1, "Midyear"),
+                    conn=conn)
+    row = conn.execute("SELECT Grade, Semester, AcademicYear, TermKey FROM courseassignment").fetchone()
+    assert row[:3] == ("", "Midyear", "2023-2024")
+    assert row[3] == 202300 + Database.code("semestercode", "Midyear")
+
+    Queries.execute("academic_record_insert", ("S1", "Regular", None, "2023-2024", 1, "Midyear"), conn=conn)
+    assert conn.execute("SELECT Semester, AcademicYear FROM academicrecords").fetchone() == ("Midyear", "2023-2024")
+
+
+def test_both_write_paths_share_codes(db):
+    conn = Database.connect()
+    _add_student_and_course(conn)
+    conn.execute("INSERT INTO courseassignment (StudentID, CourseCode, Grade, AcademicYear, YearLevel, Semester) "
+                 "VALUES ('S1', 'STT101', 'AUD', '2023-2024', '1', '1st Sem')")
+    Queries.execute("course_assignment_insert", ("S1", "STT101", "AUD", None, None, "2024-2025", 1, "1st Sem"),
+                    conn=conn)
+    assert conn.execute("SELECT COUNT(DISTINCT GradeCode), MIN(GradeCode) IS NOT NULL "
+                        "FROM courseassignment_base").fetchone() == (1, 1)
+    assert conn.execute("SELECT COUNT(*) FROM gradecode WHERE Label = 'AUD'").fetchone()[0] == 1
+
+
+def test_promotion_candidates_list_a_student_once(db):
+    conn = Database.connect()
+    _add_student_and_course(conn)
+    Queries.execute("prospectus_insert", ("STT102", "Probability", 3, "2nd Sem", 1, "Major"), conn=conn)
+    for course in ("STT101", "STT102"):
+        Queries.execute("course_assignment_insert", ("S1", course, "1.25", None, "Passed", "2023-2024", 1, "2nd Sem"),
+                        conn=conn)
+    Queries.execute("adviser_student_insert", ("jdoe", "S1"), conn=conn)
+
+    for name, params in (("promotion_candidates", ("2023-2024", "2nd Sem")),
+                         ("promotion_candidates_of_adviser", ("2023-2024", "2nd Sem", "jdoe"))):
+        assert Queries.fetchall(name, params, conn=conn) == [("2023-2024", "2nd Sem", "S1", "Juan Dela Cruz", "1")]
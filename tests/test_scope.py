@@ -0,0 +1,28 @@
+import pytest
+
+pytest.importorskip("streamlit")
+
+import Database
+import Queries
+import Scope
+
+
+@pytest.fixture
+def session(db, monkeypatch):
+    state = {"username": "jdoe"}
+    monkeypatch.setattr(Scope.st, "session_state", state)
+    Queries.execute("adviser_insert", ("jdoe", "hash", "token"))
+    Database.connect().commit()
+    return state
+
+
+def test_department_wide_until_students_are_assigned(session):
+    assert Scope.adviser() is None
+    Queries.execute("adviser_student_insert", ("jdoe", "S1"))
+    assert Scope.adviser() == "jdoe"
+
+
+def test_toggle_shows_every_student(session):
+    Queries.execute("adviser_student_insert", ("jdoe", "S1"))
+    session["department_view"] = True
+    assert Scope.adviser() is None
@@ -0,0 +1,65 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import Database
+import Writer
+
+STUDENT = ("S1", "Juan Dela Cruz", "2005-01-01", "Male", "Male", "Catholic", "Region IV-A", "Laguna", "Los Banos",
+           "Batong Malake", "STEM", "BS Statistics", "09170000000", "Maria Dela Cruz", "09170000001")
+
+
+def test_write_reports_changed_rows(db):
+    assert Writer.write("adviser_insert", ("jdoe", "hash", "token")) == 1
+    # Upsert on an existing key
+    assert Writer.write("adviser_insert", ("jdoe", "hash", "token")) == 0
+    assert Database.connect().execute("SELECT COUNT(*) FROM adviser").fetchone()[0] == 1
+
+
+def test_failing_request_does_not_fail_its_group(db):
+    Writer.ensure_writer()
+    broken = Writer.submit([("student_insert", ("S2", None) + STUDENT[2:])])
+    good = Writer.submit([("student_insert", STUDENT)])
+    with pytest.raises(sqlite3.IntegrityError):
+        broken.result()
+    assert good.result() == [1]
+    assert Database.connect().execute("SELECT StudentID FROM student").fetchall() == [("S1",)]
+
+
+def test_request_is_all_or_nothing(db):
+    with pytest.raises(sqlite3.IntegrityError):
+        Writer.write_many([("student_insert", STUDENT), ("student_insert", ("S2", None) + STUDENT[2:])])
+    assert Database.connect().execute("SELECT COUNT(*) FROM student").fetchone()[0] == 0
+
+
+def test_locked_group_is_retried(db, monkeypatch):
+    # SQLite's own wait shorter than the lock is held, so the writer has to retry
+    monkeypatch.setattr(Writer, "LOCK_WAIT_MS", 10)
+    Database.connect()
+    other = sqlite3.connect(db, isolation_level=None, check_same_thread=False)
+    other.execute("BEGIN IMMEDIATE")
+    released = threading.Timer(0.3, other.execute, ("COMMIT",))
+    released.start()
+    retries = Writer.stats()["LockRetries"]
+    try:
+        assert Writer.write("adviser_insert", ("jdoe", "hash", "token")) == 1
+    finally:
+        released.join()
+        other.close()
+    assert Writer.stats()["LockRetries"] > retries
+
+
+def test_writer_that_cannot_start_fails_fast_and_recovers(db, monkeypatch):
+    def unavailable():
+        raise sqlite3.OperationalError("unable to open database file")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(Database, "open_connection", unavailable)
+        start = time.monotonic()
+        with pytest.raises(Writer.WriterUnavailable):
+            Writer.write("adviser_insert", ("jdoe", "hash", "token"))
+        assert time.monotonic() - start < 5
+    # The next write starts a new writer
+    assert Writer.write("adviser_insert", ("jdoe", "hash", "token")) == 1
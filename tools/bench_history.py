@@ -0,0 +1,351 @@
+# Benchmark history: named benchmarks of the dashboard functions and page reruns,
+# run at fixed dataset scales, recorded in a local SQLite file per git commit and
+# compared against an earlier commit. A benchmark is named <benchmark>@<scale>, e.g.
+# calculate_counts@10k or prospectus_page@full. The 1k and 10k scales are generated
+# by tools.datagen with a fixed seed, "full" is a copy of the database given with
+# --db. Every benchmark runs in a fresh interpreter on its own copy of the dataset.
+#
+# compare fails (exit status 1) when the median of a benchmark grew by more than
+# --threshold and a one-sided Mann-Whitney U test says the samples are slower with
+# p below --alpha, so a noisy sample alone does not fail it. Results are only
+# compared between runs on the same host. Uncommitted changes are recorded under
+# the commit with a "+dirty" suffix.
+#
+# Usage: python -m tools.bench_history run [--scales 1k,10k] [--benchmarks calculate_counts,home_page] [--repeat 9]
+#        python -m tools.bench_history compare [--baseline main] [--threshold 0.10] [--alpha 0.05]
+#        python -m tools.bench_history check [--baseline main]    (run, then compare)
+#        python -m tools.bench_history list
+
+import argparse
+import json
+import math
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import Database
+import Replica
+from tools import datagen
+
+HISTORY_PATH = os.environ.get("STUDENTMONITOR_BENCH_HISTORY", os.path.join(ROOT, "bench_history.db"))
+# scale -> number of generated students, None for the database given with --db
+SCALES = {"1k": 1000, "10k": 10000, "full": None}
+DEFAULT_SCALES = ("1k", "10k")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS benchrun (
+    RunID INTEGER PRIMARY KEY,
+    GitCommit TEXT NOT NULL,
+    Host TEXT NOT NULL,
+    Benchmark TEXT NOT NULL,
+    Scale TEXT NOT NULL,
+    RecordedAt TEXT NOT NULL,
+    MedianMs REAL NOT NULL,
+    Samples TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_benchrun_key ON benchrun (Host, GitCommit, Benchmark, Scale, RunID);
+"""
+
+
+# Benchmarks: name -> setup(), run in the worker process once the dataset is in
+# place. setup() returns the function that is timed.
+
+def _metric(function, *args):
+    def setup():
+        import Metrics
+
+        def call():
+            with Replica.snapshot():
+                getattr(Metrics, function)(*args)
+        return call
+    return setup
+
+
+def _rates():
+    import Metrics
+    import Queries
+    academic_year = Queries.fetchall("academic_years", conn=Replica.connect())[0][0]
+
+    def call():
+        with Replica.snapshot():
+            Metrics.calculate_rates(academic_year)
+    return call
+
+
+# One rerun of Main.py showing the page, department-wide, driven as in tools.loadtest
+def _page(page, sub_page=None):
+    def setup():
+        import streamlit_option_menu
+        from streamlit.testing.v1 import AppTest
+        from tools import loadtest
+        streamlit_option_menu.option_menu = loadtest.scripted_menu
+        at = AppTest.from_file(os.path.join(ROOT, "Main.py"), default_timeout=300)
+        at.session_state["authenticated"] = True
+        at.session_state["username"] = "bench"
+        at.session_state["department_view"] = True
+        menus = {"Home": page}
+        if sub_page:
+            menus[sub_page[0]] = sub_page[1]
+        at.session_state[loadtest.MENU_STATE_KEY] = menus
+
+        def call():
+            at.run()
+            if at.exception:
+                raise RuntimeError(at.exception[0].message)
+        return call
+    return setup
+
+
+BENCHMARKS = {
+    "calculate_counts": _metric("calculate_counts", "1", "1st Sem"),
+    "course_status_counts": _metric("course_status_counts", "1", "1st Sem"),
+    "gpa_distribution": _metric("gpa_distribution", "1", "1st Sem"),
+    "calculate_rates": _rates,
+    "average_gpa_cgpa": _metric("calculate_average_gpa_cgpa_all"),
+    "home_page": _page("Home"),
+    "student_registration_page": _page("Student Registration"),
+    "prospectus_page": _page("Prospectus"),
+    "course_assignment_page": _page("Course Assignment"),
+    "grade_evaluation_page": _page("Grade Report", ("Grade Evaluation", "Grade Evaluation")),
+    "promotion_page": _page("Grade Report", ("Grade Evaluation", "Promotion")),
+}
+
+
+def git(*args):
+    return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+
+
+def current_commit():
+    commit = git("rev-parse", "--short", "HEAD")
+    if git("status", "--porcelain", "--untracked-files=no"):
+        commit += "+dirty"
+    return commit
+
+
+def open_history(path=None):
+    conn = sqlite3.connect(path or HISTORY_PATH)
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+# Runs in the worker process: times one benchmark on the database at path
+def sample(path, benchmark, repeat, warmup=1):
+    Database.DB_PATH = path
+    if Replica.ENABLED:
+        Replica.refresh()
+    call = BENCHMARKS[benchmark]()
+    for _ in range(warmup):
+        call()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def run_benchmark(dataset, benchmark, repeat, workdir):
+    # Own copy of the dataset, the pages write to it and the replica and archive go next to it
+    benchdir = tempfile.mkdtemp(prefix=benchmark + "_", dir=workdir)
+    path = os.path.join(benchdir, "bench.db")
+    shutil.copyfile(dataset, path)
+    try:
+        result = subprocess.run(
+            [sys.executable, "-m", "tools.bench_history", "sample", "--db", path,
+             "--benchmarks", benchmark, "--repeat", str(repeat)],
+            cwd=ROOT, capture_output=True, text=True
+        )
+    finally:
+        shutil.rmtree(benchdir, ignore_errors=True)
+    if result.returncode != 0:
+        raise RuntimeError((result.stderr.strip().splitlines() or ["no output"])[-1])
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def record(conn, commit, benchmark, scale, timings):
+    conn.execute("INSERT INTO benchrun (GitCommit, Host, Benchmark, Scale, RecordedAt, MedianMs, Samples) "
+                 "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                 (commit, platform.node(), benchmark, scale, time.strftime("%Y-%m-%d %H:%M:%S"),
+                  statistics.median(timings) * 1000, json.dumps(timings)))
+    conn.commit()
+
+
+def run(scales, benchmarks, repeat, db=None, history=None):
+    conn = open_history(history)
+    commit = current_commit()
+    failed = 0
+    with tempfile.TemporaryDirectory(prefix="bench_history_") as workdir:
+        for scale in scales:
+            if SCALES[scale] is None:
+                if not db or not os.path.exists(db):
+                    print(f"Skipping @{scale}: pass --db with a copy of the database", file=sys.stderr)
+                    continue
+                dataset = db
+            else:
+                dataset = datagen.create(os.path.join(workdir, f"{scale}.db"), SCALES[scale])
+            for benchmark in benchmarks:
+                try:
+                    timings = run_benchmark(dataset, benchmark, repeat, workdir)
+                except RuntimeError as e:
+                    print(f"{benchmark}@{scale:<6} ERROR {e}")
+                    failed += 1
+                    continue
+                record(conn, commit, benchmark, scale, timings)
+                print(f"{benchmark + '@' + scale:<36} median {statistics.median(timings) * 1000:9.2f} ms   "
+                      f"min {min(timings) * 1000:9.2f} ms")
+    conn.close()
+    return failed
+
+
+# One-sided Mann-Whitney U test, normal approximation with tie correction: p-value
+# of the current samples being no slower than the baseline samples
+def mann_whitney_greater(current, baseline):
+    n1, n2 = len(current), len(baseline)
+    if not n1 or not n2:
+        return 1.0
+    values = sorted([(value, 0) for value in current] + [(value, 1) for value in baseline])
+    ranks = [0.0] * len(values)
+    ties = 0.0
+    start = 0
+    while start < len(values):
+        end = start
+        while end + 1 < len(values) and values[end + 1][0] == values[start][0]:
+            end += 1
+        for index in range(start, end + 1):
+            ranks[index] = (start + end) / 2 + 1
+        count = end - start + 1
+        ties += count ** 3 - count
+        start = end + 1
+    u = sum(rank for rank, (_, group) in zip(ranks, values) if group == 0) - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    variance = n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (u - n1 * n2 / 2 - 0.5) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+# Latest samples of each benchmark@scale recorded for the commit on this host
+def latest_results(conn, commit):
+    rows = conn.execute("""
+        SELECT Benchmark, Scale, Samples FROM benchrun r
+        WHERE Host = ? AND GitCommit = ? AND RunID = (
+            SELECT MAX(RunID) FROM benchrun
+            WHERE Host = r.Host AND GitCommit = r.GitCommit AND Benchmark = r.Benchmark AND Scale = r.Scale)""",
+                        (platform.node(), commit)).fetchall()
+    return {f"{benchmark}@{scale}": json.loads(samples) for benchmark, scale, samples in rows}
+
+
+# The commit to compare against: --baseline resolved by git (a stored key such as
+# "abc1234+dirty" is used as is), otherwise the commit recorded last before this one
+def resolve_baseline(conn, baseline, commit):
+    if baseline:
+        if conn.execute("SELECT 1 FROM benchrun WHERE GitCommit = ? LIMIT 1", (baseline,)).fetchone():
+            return baseline
+        return git("rev-parse", "--short", baseline)
+    row = conn.execute("SELECT GitCommit FROM benchrun WHERE Host = ? AND GitCommit != ? ORDER BY RunID DESC LIMIT 1",
+                       (platform.node(), commit)).fetchone()
+    return row[0] if row else None
+
+
+def compare(baseline=None, threshold=0.10, alpha=0.05, history=None, as_json=False):
+    conn = open_history(history)
+    commit = current_commit()
+    baseline = resolve_baseline(conn, baseline, commit)
+    current = latest_results(conn, commit)
+    previous = latest_results(conn, baseline) if baseline else {}
+    conn.close()
+    if not current:
+        print(f"No results recorded for {commit} on this host, run the benchmarks first", file=sys.stderr)
+        return 1
+    if not previous:
+        print(f"No baseline results to compare {commit} with", file=sys.stderr)
+        return 0
+
+    results = []
+    for name in sorted(current.keys() & previous.keys()):
+        before = statistics.median(previous[name])
+        after = statistics.median(current[name])
+        change = after / before - 1 if before else 0.0
+        p_value = mann_whitney_greater(current[name], previous[name])
+        results.append({
+            "benchmark": name,
+            "baseline_ms": round(before * 1000, 3),
+            "current_ms": round(after * 1000, 3),
+            "change": round(change, 4),
+            "p_value": round(p_value, 4),
+            "regression": change > threshold and p_value < alpha,
+        })
+    regressions = [result for result in results if result["regression"]]
+
+    if as_json:
+        print(json.dumps({"commit": commit, "baseline": baseline, "results": results}, indent=2))
+    else:
+        print(f"{commit} against {baseline}, regression above +{threshold:.0%} with p < {alpha:g}")
+        print(f"{'benchmark':<36} {'baseline':>11} {'current':>11} {'change':>8} {'p':>7}")
+        for result in results:
+            flag = "  REGRESSION" if result["regression"] else ""
+            print(f"{result['benchmark']:<36} {result['baseline_ms']:>9.2f}ms {result['current_ms']:>9.2f}ms "
+                  f"{result['change']:>+8.1%} {result['p_value']:>7.3f}{flag}")
+        for name in sorted(current.keys() - previous.keys()):
+            print(f"{name:<36} {'-':>11} {statistics.median(current[name]) * 1000:>9.2f}ms   (new)")
+    return 1 if regressions else 0
+
+
+def list_runs(history=None):
+    conn = open_history(history)
+    rows = conn.execute("""
+        SELECT GitCommit, Host, COUNT(DISTINCT Benchmark || '@' || Scale), MAX(RecordedAt) FROM benchrun
+        GROUP BY GitCommit, Host ORDER BY MAX(RunID) DESC""").fetchall()
+    conn.close()
+    print(f"{'commit':<18} {'host':<20} {'benchmarks':>10}  recorded")
+    for commit, host, count, recorded_at in rows:
+        print(f"{commit:<18} {host:<20} {count:>10}  {recorded_at}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record benchmark results per commit and compare them with a baseline")
+    parser.add_argument("command", choices=["run", "compare", "check", "list", "sample"])
+    parser.add_argument("--scales", default=",".join(DEFAULT_SCALES), help=f"comma separated, of {', '.join(SCALES)}")
+    parser.add_argument("--benchmarks", default=",".join(BENCHMARKS), help="comma separated benchmark names")
+    parser.add_argument("--repeat", type=int, default=9, help="timed runs per benchmark, after one warm-up run")
+    parser.add_argument("--db", help="database for the full scale (a copy is benchmarked)")
+    parser.add_argument("--baseline", help="commit to compare with (default: the last other commit recorded)")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative median slowdown that fails")
+    parser.add_argument("--alpha", type=float, default=0.05, help="significance level of the slowdown")
+    parser.add_argument("--history", help=f"results file (default: {HISTORY_PATH})")
+    parser.add_argument("--json", action="store_true", help="print the comparison as JSON")
+    args = parser.parse_args(argv)
+
+    scales = [scale.strip() for scale in args.scales.split(",") if scale.strip()]
+    benchmarks = [name.strip() for name in args.benchmarks.split(",") if name.strip()]
+    unknown = [scale for scale in scales if scale not in SCALES] + [name for name in benchmarks if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown scale or benchmark: {', '.join(unknown)}")
+
+    if args.command == "sample":
+        # Worker, see run_benchmark()
+        print(json.dumps(sample(args.db, benchmarks[0], args.repeat)))
+        return 0
+    if args.command == "list":
+        return list_runs(args.history)
+    if args.command in ("run", "check"):
+        if run(scales, benchmarks, args.repeat, args.db, args.history):
+            return 1
+    if args.command in ("compare", "check"):
+        return compare(args.baseline, args.threshold, args.alpha, args.history, args.json)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+# Cold start benchmark: time to import what each screen needs in a fresh interpreter.
+# "login" is everything Main.py loads before the login form renders, the other
+# targets are the page modules Main.py imports when they are selected.
+#
+# Usage: python -m tools.bench_startup [--repeat 5] [--json]
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGETS = {
+    "login": ["streamlit", "streamlit_option_menu", "Database", "Tracing", "Queries", "Writer", "Scope"],
+    "Home": ["Home"],
+    "Student_Registration": ["Student_Registration"],
+    "Prospectus": ["Prospectus"],
+    "Course_Assignment": ["Course_Assignment"],
+    "Grade_Report": ["Grade_Report"],
+    "Admin": ["Admin"],
+}
+
+_SNIPPET = "import time; start = time.perf_counter(); import {modules}; print(time.perf_counter() - start)"
+
+
+def time_import(modules):
+    result = subprocess.run(
+        [sys.executable, "-c", _SNIPPET.format(modules=", ".join(modules))],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return float(result.stdout.strip())
+
+
+def run(repeat=5):
+    results = []
+    for name, modules in TARGETS.items():
+        try:
+            timings = [time_import(modules) for _ in range(repeat)]
+        except RuntimeError as e:
+            results.append({"name": f"import_{name}", "error": str(e)})
+            continue
+        results.append({
+            "name": f"import_{name}",
+            "median_s": statistics.median(timings),
+            "min_s": min(timings),
+            "samples": timings,
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold import time of the login screen and each page")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for row in results:
+        if "error" in row:
+            print(f"{row['name']:<28} ERROR {row['error']}")
+        else:
+            print(f"{row['name']:<28} median {row['median_s'] * 1000:8.1f} ms   min {row['min_s'] * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
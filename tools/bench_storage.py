@@ -0,0 +1,143 @@
+# Storage profile benchmark: reader threads run the Counts tab and grade report
+# queries while writer threads update grades, each on its own connection, against
+# a generated database once per profile in Database.STORAGE_PROFILES. Reports
+# throughput, write latency and how often a session gave up on a locked database.
+#
+# Usage: python -m tools.bench_storage [--students 2000] [--readers 4] [--writers 2]
+#                                      [--seconds 5] [--profiles default,wal] [--json]
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import Database
+import Queries
+from tools import datagen
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def status_codes(conn):
+    return dict(conn.execute("SELECT Label, Code FROM gradestatuscode").fetchall())
+
+
+def reader(path, profile, deadline, student_ids, result):
+    conn = sqlite3.connect(path, factory=Database.TracingConnection)
+    Database.apply_storage_profile(conn, profile)
+    codes = status_codes(conn)
+    semesters = dict(conn.execute("SELECT Label, Code FROM semestercode").fetchall())
+    rng = random.Random()
+    while time.perf_counter() < deadline:
+        try:
+            year_level = rng.choice(Database.YEAR_LEVELS)
+            semester = rng.choice(Database.SEMESTERS[:2])
+            conn.execute(Queries.sql("course_status_counts"),
+                         (semester, codes["Passed"], codes["Failed"], codes["Dropout"], codes["Withdrawn"], codes["Passed"],
+                          int(year_level), semesters[semester])).fetchall()
+            conn.execute(Queries.sql("grades_of_student"), (rng.choice(student_ids),)).fetchall()
+            result["reads"] += 2
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e):
+                raise
+            result["locked"] += 1
+    conn.close()
+
+
+def writer(path, profile, deadline, assignments, result):
+    conn = sqlite3.connect(path, factory=Database.TracingConnection)
+    Database.apply_storage_profile(conn, profile)
+    rng = random.Random()
+    while time.perf_counter() < deadline:
+        enroll_id = rng.choice(assignments)
+        grade = rng.choice(["1.50", "2.00", "2.50", "3.00"])
+        start = time.perf_counter()
+        try:
+            conn.execute(Queries.sql("course_assignment_set_grade"), (grade, None, "Passed", enroll_id))
+            conn.commit()
+            result["latencies"].append(time.perf_counter() - start)
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e):
+                raise
+            conn.rollback()
+            result["locked"] += 1
+    conn.close()
+
+
+def run(source, profile, readers, writers, seconds):
+    workdir = tempfile.mkdtemp(prefix="bench_storage_")
+    path = os.path.join(workdir, "bench.db")
+    shutil.copyfile(source, path)
+    conn = sqlite3.connect(path)
+    # journal_mode is stored in the file, set it once before the sessions start
+    Database.apply_storage_profile(conn, profile)
+    student_ids = [row[0] for row in conn.execute("SELECT StudentID FROM student").fetchall()]
+    assignments = [row[0] for row in conn.execute("SELECT EnrollID FROM courseassignment_base").fetchall()]
+    conn.close()
+
+    read_result = {"reads": 0, "locked": 0}
+    write_result = {"latencies": [], "locked": 0}
+    deadline = time.perf_counter() + seconds
+    threads = [threading.Thread(target=reader, args=(path, profile, deadline, student_ids, read_result)) for _ in range(readers)]
+    threads += [threading.Thread(target=writer, args=(path, profile, deadline, assignments, write_result)) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    shutil.rmtree(workdir)
+
+    latencies = write_result["latencies"]
+    return {
+        "profile": profile,
+        "reads_per_s": round(read_result["reads"] / seconds, 1),
+        "writes_per_s": round(len(latencies) / seconds, 1),
+        "write_p50_ms": round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+        "write_p95_ms": round(percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+        "write_mean_ms": round(statistics.mean(latencies) * 1000, 2) if latencies else None,
+        "locked": read_result["locked"] + write_result["locked"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare SQLite storage profiles under concurrent sessions")
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--profiles", default=",".join(Database.STORAGE_PROFILES), help="comma separated profile names")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_storage_") as workdir:
+        source = datagen.create(os.path.join(workdir, "source.db"), args.students)
+        results = [run(source, profile.strip(), args.readers, args.writers, args.seconds) for profile in args.profiles.split(",")]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.students} students, {args.readers} readers, {args.writers} writers, {args.seconds:g} s per profile")
+    print(f"{'profile':<10} {'reads/s':>10} {'writes/s':>10} {'write p50':>10} {'write p95':>10} {'locked':>8}")
+    for result in results:
+        p50 = "-" if result["write_p50_ms"] is None else f"{result['write_p50_ms']:.2f}ms"
+        p95 = "-" if result["write_p95_ms"] is None else f"{result['write_p95_ms']:.2f}ms"
+        print(f"{result['profile']:<10} {result['reads_per_s']:>10} {result['writes_per_s']:>10} {p50:>10} {p95:>10} "
+              f"{result['locked']:>8}")
+
+
+if __name__ == "__main__":
+    main()
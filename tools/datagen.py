@@ -0,0 +1,151 @@
+# Sample database generator for benchmarks and load tests. Builds a curriculum,
+# cohorts of students entering in consecutive years, their academic records per
+# term, course assignments with grades and promotions, all written through the
+# same views and triggers the pages use. The same seed gives the same database.
+#
+# Usage: python -m tools.datagen --students 1000 --out sample.db [--seed 1]
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import Database
+
+PROGRAMS = ["BS Statistics", "BS Mathematics"]
+SCHOLASTIC_STATUSES = ["Regular", "Irregular", "Regular(Shiftee)", "Irregular(Shiftee)", "LOA"]
+# Weighted towards passing grades like a real class
+GRADE_WEIGHTS = {
+    "1.00": 3, "1.25": 5, "1.50": 8, "1.75": 10, "2.00": 12, "2.25": 10, "2.50": 8, "2.75": 6, "3.00": 5,
+    "5.00": 3, "INC": 2, "INPROG": 1, "W": 1, "DRP": 1,
+}
+COURSES_PER_TERM = 7
+SUMMER_COURSES = 2
+FIRST_YEAR = 2018
+
+
+def grade_status(grade):
+    if grade in ("INC", "INPROG"):
+        return "To be Determined"
+    if grade == "W":
+        return "Withdrawn"
+    if grade == "DRP":
+        return "Dropout"
+    return "Failed" if grade == "5.00" else "Passed"
+
+
+def curriculum():
+    # (CourseCode, CourseDesc, Units, Semester, YearLevel, Classification)
+    courses = [("NST001", "National Service Training Program 1", 3, "1st Sem", "1", "Core"),
+               ("NST002", "National Service Training Program 2", 3, "2nd Sem", "1", "Core")]
+    number = 100
+    for year_level in Database.YEAR_LEVELS:
+        for semester in Database.SEMESTERS:
+            # Summer classes only after the third year
+            count = SUMMER_COURSES if semester == "Summer" else COURSES_PER_TERM
+            if semester == "Summer" and year_level != "3":
+                continue
+            for index in range(count):
+                number += 1
+                classification = ["Major", "Minor", "Core"][index % 3]
+                courses.append((f"STT{number}", f"Course {number}", 3 if index % 4 else 4, semester, year_level, classification))
+    return courses
+
+
+def generate(conn, students=1000, seed=1):
+    rng = random.Random(seed)
+    courses = curriculum()
+    conn.executemany("INSERT INTO prospectus (CourseCode, CourseDesc, Units, Semester, YearLevel, Classification) VALUES (?,?,?,?,?,?)",
+                     courses)
+    by_term = {}
+    for course in courses:
+        by_term.setdefault((course[4], course[3]), []).append(course[0])
+    # Each major course of a term requires the one in the same position a term earlier
+    terms = [term for term in ((year_level, semester) for year_level in Database.YEAR_LEVELS for semester in Database.SEMESTERS)
+             if term in by_term]
+    requisites = []
+    for previous, term in zip(terms, terms[1:]):
+        for before, after in zip(by_term[previous], by_term[term]):
+            if after.startswith("STT") and before.startswith("STT"):
+                requisites.append((after, before, None))
+    conn.executemany("INSERT INTO requisite (CourseCode, Prerequisite, Corequisite) VALUES (?,?,?)", requisites)
+
+    grades = list(GRADE_WEIGHTS)
+    weights = list(GRADE_WEIGHTS.values())
+    cohorts = 6
+    for number in range(students):
+        entry_year = FIRST_YEAR + number % cohorts
+        student_id = f"{entry_year}-{number:04d}"
+        conn.execute(
+            "INSERT INTO student (StudentID, Name, BirthDate, Sex, Gender, Religion, Region, Province, Municipality, "
+            "Barangay, Track, Program, ContactNumber, PGName, PGNumber) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+            (student_id, f"Student {number:05d}, Sample", "January 1, 2000", rng.choice(["Female", "Male"]),
+             rng.choice(["Female", "Male", "LGBTQIA+"]), "Roman Catholic", "Region X - Northern Mindanao",
+             "Lanao del Norte", "Iligan", "Tibanga", "Science, Technology, Engineering, and Mathematics (STEM)",
+             rng.choice(PROGRAMS), "09000000000", "Parent, Sample", "09000000000"))
+
+        records = []
+        assignments = []
+        promotions = []
+        for year_level, semester in terms:
+            academic_year = f"{entry_year + int(year_level) - 1}-{entry_year + int(year_level)}"
+            # Later cohorts have not reached the upper years yet
+            if entry_year + int(year_level) - 1 > FIRST_YEAR + cohorts - 1:
+                break
+            status = rng.choice(SCHOLASTIC_STATUSES)
+            last_term = (year_level, semester) == terms[-1]
+            if rng.random() < 0.01:
+                status = rng.choice(["Dropped", "Withdrawn"])
+            elif last_term:
+                status = "Graduate"
+            records.append((student_id, status, rng.choice([None, "Scholar"]), academic_year, int(year_level), semester))
+            for course_code in by_term[(year_level, semester)]:
+                grade = rng.choices(grades, weights)[0]
+                final_grade = rng.choice(["3.00", "5.00"]) if grade == "INC" else None
+                assignments.append((student_id, course_code, grade, final_grade, grade_status(final_grade or grade),
+                                    academic_year, year_level, semester))
+            if semester == "2nd Sem":
+                promotions.append((student_id, academic_year, semester, 1 if rng.random() < 0.9 else 0))
+            if status in ("Dropped", "Withdrawn"):
+                break
+        conn.executemany("INSERT INTO academicrecords (StudentID, ScholasticStatus, ScholarshipStatus, AcademicYear, YearLevel, Semester) "
+                         "VALUES (?,?,?,?,?,?)", records)
+        conn.executemany("INSERT INTO courseassignment (StudentID, CourseCode, Grade, FinalGrade, GradeStatus, AcademicYear, "
+                         "YearLevel, Semester) VALUES (?,?,?,?,?,?,?,?)", assignments)
+        conn.executemany("INSERT INTO promotion (StudentID, AcademicYear, Semester, PromotionStatus) VALUES (?,?,?,?)", promotions)
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.commit()
+
+
+# Creates a fresh database file at path
+def create(path, students=1000, seed=1):
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path, factory=Database.TracingConnection)
+    Database.init_schema(conn)
+    generate(conn, students, seed)
+    conn.close()
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a sample student monitoring database")
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", default="sample.db", help="database file to create (replaced if it exists)")
+    args = parser.parse_args()
+
+    create(args.out, args.students, args.seed)
+    conn = sqlite3.connect(args.out)
+    for table in ("student", "academicrecords", "courseassignment", "promotion"):
+        print(f"{table:<18} {conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]:>8} rows")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
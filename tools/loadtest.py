@@ -0,0 +1,249 @@
+# Load test: concurrent app sessions driven through Streamlit's AppTest against a
+# generated database. Every session logs in as its own adviser (with about
+# --per-adviser assigned students), then repeatedly opens the Home tabs and changes
+# their filters, visits the registration, prospectus and course assignment pages,
+# switches students in Grade Evaluation and submits their grades, and runs a
+# promotion. Sessions are threads in this process, like the sessions of one
+# Streamlit server, so they share the database connection and the writer thread.
+# Reports p50/p95 rerun latency per step, the error rate and how many reruns failed
+# on a locked database or a write that was not committed in time.
+#
+# The sidebar and sub page menus are streamlit_option_menu components, which AppTest
+# cannot click. They are replaced by scripted_menu() for the run, which returns the
+# option the session picked in session_state[MENU_STATE_KEY].
+#
+# Usage: python -m tools.loadtest [--sessions 8] [--iterations 3] [--students 2000]
+#                                 [--think 0.2] [--timeout 60] [--json]
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from hashlib import sha256
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import streamlit as st
+import streamlit_option_menu
+from streamlit.testing.v1 import AppTest
+
+import Database
+import Writer
+from tools import datagen
+from tools.bench_storage import percentile
+
+PASSWORD = "loadtest"
+MENU_STATE_KEY = "loadtest_menu"
+# Messages of the errors counted as lock timeouts: sqlite3 "database is locked" and Writer.WriteTimeout
+LOCK_MESSAGES = ("locked", "not committed within")
+
+
+# Stands in for streamlit_option_menu.option_menu. A menu is identified by its first
+# option, the session picks one with {first option: option} in MENU_STATE_KEY.
+def scripted_menu(menu_title, options, default_index=0, **kwargs):
+    choice = st.session_state.get(MENU_STATE_KEY, {}).get(options[0])
+    return choice if choice in options else options[default_index]
+
+
+def create_database(path, students, sessions, per_adviser):
+    datagen.create(path, students)
+    conn = sqlite3.connect(path)
+    student_ids = [row[0] for row in conn.execute("SELECT StudentID FROM student ORDER BY StudentID").fetchall()]
+    users = []
+    for number in range(sessions):
+        username = f"loadtest{number + 1:02d}"
+        conn.execute("INSERT INTO adviser (Username, Password, Random_authenticator) VALUES (?, ?, ?)",
+                     (username, sha256(PASSWORD.encode()).hexdigest(), "loadtest"))
+        start = (number * per_adviser) % max(len(student_ids), 1)
+        conn.executemany("INSERT OR IGNORE INTO adviser_student (UserName, StudentID) VALUES (?, ?)",
+                         [(username, student_id) for student_id in student_ids[start:start + per_adviser]])
+        users.append(username)
+    conn.commit()
+    conn.close()
+    return users
+
+
+def find(elements, label):
+    return next((element for element in elements if element.label.startswith(label)), None)
+
+
+def new_results():
+    return {"lock": threading.Lock(), "steps": {}, "lock_timeouts": 0, "failed_logins": 0, "messages": {}}
+
+
+class Session:
+    def __init__(self, username, timeout, think, results):
+        self.username = username
+        self.timeout = timeout
+        self.think = think
+        self.results = results
+        self.rng = random.Random(username)
+        self.at = AppTest.from_file(os.path.join(ROOT, "Main.py"), default_timeout=timeout)
+
+    # Reruns the app and records how long it took under the step name
+    def run(self, step, widget=None):
+        time.sleep(self.think * self.rng.uniform(0.5, 1.5))
+        start = time.perf_counter()
+        error = None
+        try:
+            (widget or self.at).run(timeout=self.timeout)
+            if self.at.exception:
+                error = self.at.exception[0].message
+        except Exception as e:
+            error = str(e)
+        elapsed = time.perf_counter() - start
+        with self.results["lock"]:
+            step_result = self.results["steps"].setdefault(step, {"latencies": [], "errors": 0})
+            step_result["latencies"].append(elapsed)
+            if error:
+                step_result["errors"] += 1
+                if any(message in error for message in LOCK_MESSAGES):
+                    self.results["lock_timeouts"] += 1
+                self.results["messages"].setdefault(error.splitlines()[0][:200], 0)
+                self.results["messages"][error.splitlines()[0][:200]] += 1
+        return error is None
+
+    def open(self, step, page, sub_page=None):
+        menus = {"Home": page}
+        if sub_page:
+            menus[sub_page[0]] = sub_page[1]
+        self.at.session_state[MENU_STATE_KEY] = menus
+        return self.run(step)
+
+    # Picks another option of a selectbox and reruns
+    def choose(self, step, label):
+        selectbox = find(self.at.selectbox, label)
+        if selectbox is not None and len(selectbox.options) > 1:
+            self.run(step, selectbox.set_value(self.rng.choice(selectbox.options)))
+
+    def click(self, step, label):
+        button = find(self.at.button, label)
+        if button is not None:
+            self.run(step, button.click())
+
+    def login(self):
+        self.run("login form")
+        self.at.text_input(key="login_username_input").input(self.username)
+        self.at.text_input(key="login_password_input").input(PASSWORD)
+        self.run("login", self.at.button(key="login_button").click())
+        return bool(self.at.session_state["authenticated"])
+
+    def iteration(self, students_per_iteration):
+        if self.open("home", "Home"):
+            self.choose("home counts filter", "Select Year Level:")
+            self.choose("home trends filter", "Select Academic Year:")
+        for page in ("Student Registration", "Prospectus", "Course Assignment"):
+            self.open(page.lower(), page)
+
+        if self.open("grade evaluation", "Grade Report", ("Grade Evaluation", "Grade Evaluation")):
+            for _ in range(students_per_iteration):
+                self.choose("switch student", "Select Student:")
+            # Submits the grades of the first term shown, as loaded
+            self.click("submit grades", "Submit Grades for")
+
+        if self.open("promotion", "Grade Report", ("Grade Evaluation", "Promotion")):
+            self.click("promote students", "Promote Students")
+
+    def __call__(self, iterations, students_per_iteration):
+        try:
+            if not self.login():
+                with self.results["lock"]:
+                    self.results["failed_logins"] += 1
+                return
+            for _ in range(iterations):
+                self.iteration(students_per_iteration)
+        except Exception as e:
+            with self.results["lock"]:
+                self.results["messages"].setdefault(f"session aborted: {str(e)[:200]}", 0)
+                self.results["messages"][f"session aborted: {str(e)[:200]}"] += 1
+
+
+def run(users, iterations, students_per_iteration, think, timeout, ramp):
+    results = new_results()
+    sessions = [Session(username, timeout, think, results) for username in users]
+    threads = []
+    start = time.perf_counter()
+    for number, session in enumerate(sessions):
+        thread = threading.Thread(target=session, args=(iterations, students_per_iteration), name=session.username)
+        thread.start()
+        threads.append(thread)
+        if ramp and number < len(sessions) - 1:
+            time.sleep(ramp / len(sessions))
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+
+    steps = []
+    all_latencies = []
+    errors = 0
+    for step, step_result in results["steps"].items():
+        latencies = step_result["latencies"]
+        all_latencies += latencies
+        errors += step_result["errors"]
+        steps.append({
+            "step": step,
+            "reruns": len(latencies),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+            "max_ms": round(max(latencies) * 1000, 1),
+            "errors": step_result["errors"],
+        })
+    return {
+        "sessions": len(users),
+        "seconds": round(seconds, 1),
+        "reruns": len(all_latencies),
+        "p50_ms": round(percentile(all_latencies, 0.50) * 1000, 1) if all_latencies else None,
+        "p95_ms": round(percentile(all_latencies, 0.95) * 1000, 1) if all_latencies else None,
+        "errors": errors,
+        "error_rate": round(errors / len(all_latencies), 4) if all_latencies else 0.0,
+        "lock_timeouts": results["lock_timeouts"],
+        "failed_logins": results["failed_logins"],
+        "writer": Writer.stats(),
+        "steps": steps,
+        "messages": results["messages"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run concurrent scripted app sessions and report rerun latency")
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--iterations", type=int, default=3, help="rounds through the pages per session")
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--per-adviser", type=int, default=40, help="students assigned to each session's adviser")
+    parser.add_argument("--switches", type=int, default=3, help="students opened in Grade Evaluation per round")
+    parser.add_argument("--think", type=float, default=0.2, help="mean pause before each rerun, in seconds")
+    parser.add_argument("--ramp", type=float, default=2, help="seconds over which the sessions are started")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds before a rerun counts as failed")
+    parser.add_argument("--max-error-rate", type=float, default=0.0, help="exit with 1 above this error rate")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="loadtest_") as workdir:
+        Database.DB_PATH = os.path.join(workdir, "loadtest.db")
+        users = create_database(Database.DB_PATH, args.students, args.sessions, args.per_adviser)
+        streamlit_option_menu.option_menu = scripted_menu
+        result = run(users, args.iterations, args.switches, args.think, args.timeout, args.ramp)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"{result['sessions']} sessions, {args.students} students, {result['reruns']} reruns in {result['seconds']:g} s")
+        print(f"{'step':<22} {'reruns':>7} {'p50':>9} {'p95':>9} {'max':>9} {'errors':>7}")
+        for step in result["steps"]:
+            print(f"{step['step']:<22} {step['reruns']:>7} {step['p50_ms']:>7.1f}ms {step['p95_ms']:>7.1f}ms "
+                  f"{step['max_ms']:>7.1f}ms {step['errors']:>7}")
+        print(f"p50 {result['p50_ms']} ms, p95 {result['p95_ms']} ms, error rate {result['error_rate']:.2%}, "
+              f"lock timeouts {result['lock_timeouts']}, failed logins {result['failed_logins']}")
+        for message, count in sorted(result["messages"].items(), key=lambda item: -item[1]):
+            print(f"{count:>5}  {message}")
+    return 1 if result["error_rate"] > args.max_error_rate or result["failed_logins"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+# Query plan check: runs EXPLAIN QUERY PLAN on the busiest dashboard queries and
+# fails when one of them no longer searches the index it is written for, scans a
+# table or sorts in a temp B-tree, e.g. after a schema change or a LIKE sneaking
+# back in. Checks a fresh in-memory database by default, pass --db to check a real
+# file (with its ANALYZE statistics, if any). tests/test_plans.py runs the same
+# check on a generated database.
+#
+# Usage: python -m tools.plan_check [--db student_monitor.db] [--verbose]
+
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import Archive
+import Database
+import Queries
+
+# name -> (query, index that must be searched)
+CHECKS = {
+    "course_status_counts": (Queries.sql("course_status_counts"), "idx_courseassignment_term_course"),
+    "prospectus_term": (Queries.sql("prospectus_term"), "idx_prospectus_term"),
+    "prospectus_term_count": (Queries.sql("prospectus_term_count"), "idx_prospectus_term"),
+    "term_gpa": ("SELECT COUNT(*) FROM term_gpa WHERE YearLevel = ? AND SemesterCode = ?", "idx_term_gpa_term"),
+    # Must still search the index on both sides of the history view
+    "rates_academic_year": ("SELECT COUNT(StudentID) FROM history_academicrecords_base WHERE TermKey BETWEEN ? AND ?",
+                            "idx_academicrecords_termkey"),
+}
+
+
+def query_plan(conn, query):
+    # Placeholders only need a value to be bound, the plan does not depend on it
+    params = [None] * query.count("?")
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + query, params).fetchall()]
+
+
+# Plan lines that read a whole table or sort in a temp B-tree. Scans of a subquery
+# the plan builds itself (a CO-ROUTINE, e.g. one side of a history view) are fine.
+def problems(plan):
+    subqueries = {line.split(" ", 1)[1] for line in plan if line.startswith(("CO-ROUTINE ", "MATERIALIZE "))}
+    found = [line for line in plan if line.startswith("SCAN ") and line != "SCAN CONSTANT ROW"
+             and line.split()[1] not in subqueries]
+    return found + [line for line in plan if "USE TEMP B-TREE" in line]
+
+
+def check(conn, query, index):
+    plan = query_plan(conn, query)
+    # Tables of an attached database are shown with their schema, e.g. main.academicrecords_base
+    searched = re.compile(rf"^SEARCH [\w.]+ USING (COVERING )?INDEX {index}\b")
+    return any(searched.match(line) for line in plan) and not problems(plan), plan
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that the dashboard queries use their indexes")
+    parser.add_argument("--db", help="database file to check (default: a fresh in-memory database)")
+    parser.add_argument("--verbose", action="store_true", help="print every query plan")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db or ":memory:", factory=Database.TracingConnection)
+    Database.init_schema(conn)
+    archive_dir = tempfile.TemporaryDirectory(prefix="plan_check_")
+    Archive.attach(conn, os.path.join(archive_dir.name, "archive.db"))
+
+    failed = 0
+    for name, (query, index) in CHECKS.items():
+        ok, plan = check(conn, query, index)
+        print(f"{'ok' if ok else 'FAIL':<5} {name:<24} {index}")
+        if args.verbose or not ok:
+            for line in plan:
+                print(f"        {line}")
+        failed += not ok
+    conn.close()
+    archive_dir.cleanup()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+# Query plan lint: compiles every named query in Queries.QUERIES (the _of_adviser
+# variants and the history_* views included, with an archive attached) against a
+# generated database and fails when one of them reads the whole of student,
+# academicrecords_base or courseassignment_base instead of seeking an index, or
+# needs an automatic index. plan_check asserts the exact index of the busiest
+# dashboard queries, this catches a full scan in any query.
+#
+# Scans are found in the bytecode (EXPLAIN): a cursor on one of the tables, or on
+# one of their indexes, that is started with Rewind/Last walks all of it. Triggers
+# are compiled into the statement, so a write whose trigger scans is caught too.
+# Queries that list the whole department on purpose are in ALLOWED_SCANS with the
+# reason.
+#
+# With --trace the ad hoc SQL of the pages is linted as well: one scripted session
+# (see tools/loadtest.py) walks every page as an adviser and the statements Tracing
+# recorded are checked the same way, allowed scans keyed by the calling function.
+#
+# Usage: python -m tools.plan_lint [--students 2000] [--trace] [--verbose]
+
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import Archive
+import Database
+import Queries
+from tools import datagen
+
+# Tables that grow with the number of students
+LINTED_TABLES = ("student", "academicrecords_base", "courseassignment_base")
+
+# Query name or calling function ("Module.function") -> why reading the whole table is intended
+ALLOWED_SCANS = {
+    "student_names": "department-wide student list, the adviser variant seeks adviser_student",
+    "student_programs": "distinct programs of all students",
+    "student_directory": "department-wide directory, the adviser variant seeks adviser_student",
+    "academic_years": "distinct academic years of every record, current and archived",
+    "course_assignment_years": "distinct academic years of every course assignment",
+    "course_assignments": "department-wide Manage Assignments list, the adviser variant seeks adviser_student",
+    "course_assignment_counts": "department-wide Course Directory counts, the adviser variant seeks adviser_student",
+    "course_assignment_students": "department-wide student count, the adviser variant seeks adviser_student",
+    "export_student_directory": "department-wide export, in idx_academicrecords_termkey order",
+    "export_course_directory": "department-wide export, in idx_courseassignment_student_term order",
+    "export_grades": "department-wide export, in idx_courseassignment_student_term order",
+}
+
+_bindings = re.compile(r"uses (\d+)")
+
+
+def _parameter_count(conn, query):
+    # Placeholders only need a value to be bound, the plan does not depend on it.
+    # Numbered placeholders (?1) are counted by SQLite, from the error message.
+    count = query.count("?")
+    try:
+        conn.execute("EXPLAIN " + query, [None] * count)
+    except sqlite3.ProgrammingError as e:
+        match = _bindings.search(str(e))
+        if not match:
+            raise
+        count = int(match.group(1))
+    return count
+
+
+# (database number, root page) -> (table name, "table" or "index") of every attached database
+def root_pages(conn):
+    roots = {}
+    for number, schema, _ in conn.execute("PRAGMA database_list").fetchall():
+        for kind, table, root in conn.execute(
+                f"SELECT type, tbl_name, rootpage FROM {schema}.sqlite_master WHERE rootpage > 0").fetchall():
+            roots[(number, root)] = (table, kind)
+    return roots
+
+
+# Returns the linted tables read from start to end and the plan, for the report
+def lint(conn, query, roots):
+    params = [None] * _parameter_count(conn, query)
+    cursors = {}
+    scanned = set()
+    for _, opcode, p1, p2, p3, _, _, _ in conn.execute("EXPLAIN " + query, params).fetchall():
+        if opcode in ("OpenRead", "OpenWrite"):
+            cursors[p1] = roots.get((p3, p2), (None, None))
+        elif opcode in ("Rewind", "Last") and cursors.get(p1, (None,))[0] in LINTED_TABLES:
+            table, kind = cursors[p1]
+            scanned.add(table if kind == "table" else f"{table} (index)")
+    plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + query, params).fetchall()]
+    scanned.update(f"automatic index: {line}" for line in plan if "AUTOMATIC" in line)
+    return sorted(scanned), plan
+
+
+def registry():
+    return [(name, Queries.sql(name)) for name in Queries.QUERIES]
+
+
+# Statements recorded while one scripted session walks every page, as
+# ("Module.function", query). Needs streamlit.
+def traced(path, students):
+    import Tracing
+    from tools import loadtest
+    import streamlit_option_menu
+    username = loadtest.create_database(path, students, 1, 40)[0]
+    streamlit_option_menu.option_menu = loadtest.scripted_menu
+    Tracing.enabled = True
+    Tracing.reset()
+    session = loadtest.Session(username, 300, 0, loadtest.new_results())
+    if not session.login():
+        raise RuntimeError("the scripted session could not log in")
+    session.iteration(2)
+    statements = []
+    for stat in Tracing.query_stats():
+        # Normalized shapes, literals are placeholders and IN lists are collapsed
+        query = stat["Query"].replace("IN (...)", "IN (?)")
+        if not query.upper().startswith(("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")):
+            continue
+        for caller in stat["Callers"].split(", "):
+            statements.append((caller, query))
+    return statements
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fail on named queries that scan the student tables")
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--trace", action="store_true", help="also lint the SQL of a scripted run of every page")
+    parser.add_argument("--verbose", action="store_true", help="print the plan of every statement")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="plan_lint_") as workdir:
+        path = os.path.join(workdir, "lint.db")
+        Database.DB_PATH = path
+        if args.trace:
+            statements = registry() + traced(path, args.students)
+        else:
+            datagen.create(path, args.students)
+            statements = registry()
+
+        conn = sqlite3.connect(path, factory=Database.TracingConnection)
+        Archive.attach(conn)
+        roots = root_pages(conn)
+        failed = 0
+        seen = set()
+        for name, query in statements:
+            if (name, query) in seen:
+                continue
+            seen.add((name, query))
+            try:
+                scanned, plan = lint(conn, query, roots)
+            except sqlite3.Error as e:
+                # Traced shapes are not always valid SQL again after normalization
+                print(f"skip  {name:<40} {str(e)}")
+                continue
+            if scanned and name in ALLOWED_SCANS:
+                status = "allow"
+            else:
+                status = "FAIL" if scanned else "ok"
+            failed += status == "FAIL"
+            if status != "ok" or args.verbose:
+                print(f"{status:<5} {name:<40} {', '.join(scanned) or '-'}")
+                if status == "FAIL" or args.verbose:
+                    print(f"        {' '.join(query.split())[:200]}")
+                    for line in plan:
+                        print(f"        {line}")
+        conn.close()
+    print(f"{len(seen)} statements, {failed} scanning {', '.join(LINTED_TABLES)}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())